@@ -143,8 +143,76 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
+# Analytics sync
+
+ANALYTICS_SYNC_BATCH_SIZE = config("ANALYTICS_SYNC_BATCH_SIZE", default=1000, cast=int)
+# "copy" streams facts and link rows through COPY FROM STDIN (PostgreSQL only), "orm" uses bulk_create
+ANALYTICS_SYNC_LOADER = config("ANALYTICS_SYNC_LOADER", default="copy")
+# Worker processes for the partitioned parallel sync of the SyncOrdersAnalytics
+# command (1 keeps the serial sync); sync jobs always run serially
+ANALYTICS_SYNC_WORKERS = config("ANALYTICS_SYNC_WORKERS", default=1, cast=int)
+# Max natural key -> surrogate id entries kept per dimension by the ETL's LRU resolvers
+ANALYTICS_DIMENSION_CACHE_SIZE = config("ANALYTICS_DIMENSION_CACHE_SIZE", default=100000, cast=int)
+# Change capture only scans orders older than this many seconds, so rows from
+# transactions that commit late are not skipped by the watermark
+ANALYTICS_CDC_SAFETY_LAG = config("ANALYTICS_CDC_SAFETY_LAG", default=5, cast=int)
+# Order.save() patches existing facts inline; turn off when the CDC sync owns updates
+ANALYTICS_INLINE_ORDER_SYNC = config("ANALYTICS_INLINE_ORDER_SYNC", default=True, cast=bool)
+# Trace Python allocations with tracemalloc during a sync to report per-stage peak
+# memory; tracing slows the sync down several times, so it is off by default
+ANALYTICS_SYNC_TRACE_MEMORY = config("ANALYTICS_SYNC_TRACE_MEMORY", default=False, cast=bool)
+
+# Rows fetched per round trip by the server-side cursors of the streaming fact
+# export and of columnar snapshots (also the snapshot record batch size)
+ANALYTICS_EXPORT_CHUNK_SIZE = config("ANALYTICS_EXPORT_CHUNK_SIZE", default=2000, cast=int)
+# Where SnapshotWarehouse writes Parquet / Arrow snapshots (needs the optional pyarrow)
+ANALYTICS_SNAPSHOT_DIR = config("ANALYTICS_SNAPSHOT_DIR", default=str(BASE_DIR / "snapshots"))
+
+
+# Analytics result cache
+# Aggregation endpoints cache their responses per filter set and warehouse data
+# version (bumped by every sync batch), so entries never need explicit invalidation.
+# "locmem" keeps an LRU dict per process, "django" goes through CACHES[alias];
+# its keys are namespaced by a generation counter in that cache, so clearing the
+# result cache bumps the counter and leaves other entries of a shared alias alone.
+ANALYTICS_RESULT_CACHE_BACKEND = config("ANALYTICS_RESULT_CACHE_BACKEND", default="locmem")
+ANALYTICS_RESULT_CACHE_SIZE = config("ANALYTICS_RESULT_CACHE_SIZE", default=512, cast=int)
+ANALYTICS_RESULT_CACHE_ALIAS = config("ANALYTICS_RESULT_CACHE_ALIAS", default="default")
+# Seconds an entry lives in the "django" backend (old versions are never read again)
+ANALYTICS_RESULT_CACHE_TIMEOUT = config("ANALYTICS_RESULT_CACHE_TIMEOUT", default=3600, cast=int)
+# Cache-Control max-age for analytics responses whose `end` filter is before the
+# latest synced date; other responses must revalidate their ETag on every use
+ANALYTICS_HISTORICAL_MAX_AGE = config("ANALYTICS_HISTORICAL_MAX_AGE", default=86400, cast=int)
+
+
+# Analytics cube
+# Keep the fact measures and dimension keys in NumPy arrays inside each web
+# process and answer most-sold / top-users / top-suppliers / orders-by-status
+# from them. The cube reloads only the days that changed when the warehouse
+# version moves; distinct user counts from the cube are always exact.
+ANALYTICS_CUBE_ENABLED = config("ANALYTICS_CUBE_ENABLED", default=False, cast=bool)
+
+# Slice-and-dice query endpoint: largest page (`limit`) a request may ask for,
+# and how many compiled SQL statements (one per request shape) each process keeps
+ANALYTICS_QUERY_MAX_LIMIT = config("ANALYTICS_QUERY_MAX_LIMIT", default=1000, cast=int)
+ANALYTICS_QUERY_PLAN_CACHE_SIZE = config("ANALYTICS_QUERY_PLAN_CACHE_SIZE", default=256, cast=int)
+
+
+# Celery
+# Sync, verify and simple analysis run as background jobs on a worker. Nothing
+# consumes the default in-memory broker: with DEBUG on, jobs sent to it run
+# inline in the request (development only); otherwise enqueueing fails until
+# CELERY_BROKER_URL points at a real queue. Eager mode always runs jobs inline.
+
+CELERY_BROKER_URL = config("CELERY_BROKER_URL", default="memory://")
+CELERY_TASK_ALWAYS_EAGER = config("CELERY_TASK_ALWAYS_EAGER", default=False, cast=bool)
+CELERY_TASK_IGNORE_RESULT = True
+CELERY_TIMEZONE = TIME_ZONE
+
+
 if DEBUG:
     INTERNAL_IPS = [
         "127.0.0.1",
         "localhost",
     ]
+
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import DimDate, DimProductBase, DimVariantOrder, DimUser, FactSales, FactAnalytics
+from .models import DimDate, DimProductBase, DimVariantOrder, DimUser, FactSales, FactSalesLine, FactAnalytics, SyncJob, SyncRun
 
 class EditableAdmin(admin.ModelAdmin):
     readonly_fields = []
@@ -11,13 +11,13 @@ class DimDateAdmin(EditableAdmin):
 
 @admin.register(DimProductBase)
 class DimProductBaseAdmin(EditableAdmin):
-    list_display = ('product_id', 'name', 'brand', 'price', 'is_available', 'created_at', 'updated_at', 'supplier')
+    list_display = ('product_id', 'name', 'brand', 'price', 'is_available', 'created_at', 'updated_at', 'supplier', 'is_current', 'valid_from', 'valid_to')
     search_fields = ('name', 'brand')
-    list_filter = ('is_available', 'is_exciting', 'free_shipping', 'has_gift', 'is_budget_friendly')
+    list_filter = ('is_current', 'is_available', 'is_exciting', 'free_shipping', 'has_gift', 'is_budget_friendly')
 
 @admin.register(DimVariantOrder)
 class DimVariantOrderAdmin(EditableAdmin):
-    list_display = ('variant_sku', 'product_id', 'color', 'size', 'quantity', 'unit_price', 'discount_percent', 'total_price', 'total_after_discount', 'created_at', 'updated_at')
+    list_display = ('variant_sku', 'product_id', 'color', 'size', 'created_at', 'updated_at')
     search_fields = ('variant_sku',)
     list_filter = ('color', 'size')
 
@@ -30,7 +30,13 @@ class DimUserAdmin(EditableAdmin):
 class FactSalesAdmin(EditableAdmin):
     list_display = ('id', 'date', 'user', 'total_price', 'total_price_after_discount')
     search_fields = ('user__username', 'date__full_date')
-    filter_horizontal = ('variants',)
+
+@admin.register(FactSalesLine)
+class FactSalesLineAdmin(EditableAdmin):
+    list_display = ('order_item_id', 'order_id', 'date', 'user', 'product_id', 'variant', 'status', 'quantity', 'unit_price', 'discount_percent', 'total_after_discount')
+    search_fields = ('order_id', 'user__username', 'date__full_date')
+    list_filter = ('status',)
+    raw_id_fields = ('date', 'user', 'product_version', 'variant')
 
 @admin.register(FactAnalytics)
 class FactAnalyticsAdmin(admin.ModelAdmin):
@@ -47,3 +53,17 @@ class FactAnalyticsAdmin(admin.ModelAdmin):
     list_filter = ('date',)
     search_fields = ('date__full_date',)
     ordering = ('-date',)
+
+@admin.register(SyncJob)
+class SyncJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'stage', 'rows_processed', 'created_at', 'started_at', 'finished_at')
+    list_filter = ('kind', 'status')
+    readonly_fields = ('id', 'created_at')
+    ordering = ('-created_at',)
+
+@admin.register(SyncRun)
+class SyncRunAdmin(admin.ModelAdmin):
+    list_display = ('id', 'mode', 'status', 'orders_processed', 'duration_seconds', 'started_at', 'finished_at')
+    list_filter = ('mode', 'status')
+    readonly_fields = ('started_at',)
+    ordering = ('-started_at',)
@@ -0,0 +1,101 @@
+from django.db import connection
+
+from orders.constants import ORDER_STATUS_CHOICES
+from .models import FactSales, FactAnalytics
+
+
+# FactAnalytics column holding the daily total of each order status
+STATUS_TOTAL_FIELDS = {status: f"{status}_order_quantity" for status, _ in ORDER_STATUS_CHOICES}
+TOTAL_FIELDS = ("total_order_quantity", *STATUS_TOTAL_FIELDS.values())
+
+
+def _in_clause(column, values):
+    return f"{column} IN ({', '.join(['%s'] * len(values))})", list(values)
+
+def _delete_days_without_sales(cursor, where, params):
+    qn = connection.ops.quote_name
+    analytics_table = qn(FactAnalytics._meta.db_table)
+    sales_table = qn(FactSales._meta.db_table)
+    cursor.execute(
+        f"""
+        DELETE FROM {analytics_table}
+        WHERE {where} AND NOT EXISTS (
+            SELECT 1 FROM {sales_table}
+            WHERE {sales_table}.{qn("date_id")} = {analytics_table}.{qn("date_id")}
+        )
+        """,
+        params,
+    )
+
+def refresh_fact_analytics(date_ids=None):
+    """
+    Recompute the ``FactAnalytics`` rows of ``date_ids`` (every date when
+    ``None``) from ``FactSales`` and upsert them on ``date``; dates left
+    without sales lose their row. Recomputing from the facts keeps replays
+    and status changes exact. Returns the number of dates written.
+
+    The rollup is a single ``INSERT ... SELECT ... GROUP BY date_id`` with a
+    ``FILTER (WHERE status = ...)`` sum per status, merged with ``ON CONFLICT``.
+    """
+    if date_ids is not None and not date_ids:
+        return 0
+    qn = connection.ops.quote_name
+    analytics_table = qn(FactAnalytics._meta.db_table)
+    sales_table = qn(FactSales._meta.db_table)
+    amount = qn("total_price_after_discount")
+
+    # SQLite needs an explicit WHERE before ON CONFLICT in INSERT ... SELECT.
+    where, params = ("1 = 1", [])
+    if date_ids is not None:
+        where, params = _in_clause(qn("date_id"), date_ids)
+    status_sums = ", ".join(f"COALESCE(SUM({amount}) FILTER (WHERE {qn('status')} = %s), 0)" for _ in STATUS_TOTAL_FIELDS)
+    updates = ", ".join(f"{qn(f)} = EXCLUDED.{qn(f)}" for f in TOTAL_FIELDS)
+
+    with connection.cursor() as cursor:
+        _delete_days_without_sales(cursor, where, params)
+        cursor.execute(
+            f"""
+            INSERT INTO {analytics_table} ({qn("date_id")}, {", ".join(qn(f) for f in TOTAL_FIELDS)})
+            SELECT {qn("date_id")}, COALESCE(SUM({amount}), 0), {status_sums}
+            FROM {sales_table}
+            WHERE {where}
+            GROUP BY {qn("date_id")}
+            ON CONFLICT ({qn("date_id")}) DO UPDATE SET {updates}
+            """,
+            [*STATUS_TOTAL_FIELDS, *params],
+        )
+        return cursor.rowcount
+
+def apply_fact_analytics_deltas(changes):
+    """
+    Add signed ``(date_id, status, amount)`` changes to the daily totals
+    without recomputing them, e.g. ``-old`` on the old day/status and ``+new``
+    on the new one when a counted sale changes. Missing days are created and
+    days left without sales lose their row, as in a full rebuild.
+    """
+    deltas = {}
+    for date_id, status, amount in changes:
+        if date_id is None:
+            continue
+        row = deltas.setdefault(date_id, dict.fromkeys(TOTAL_FIELDS, 0))
+        row["total_order_quantity"] += amount
+        if status in STATUS_TOTAL_FIELDS:
+            row[STATUS_TOTAL_FIELDS[status]] += amount
+    if not deltas:
+        return
+
+    qn = connection.ops.quote_name
+    table = qn(FactAnalytics._meta.db_table)
+    placeholders = ", ".join(["(" + ", ".join(["%s"] * (len(TOTAL_FIELDS) + 1)) + ")"] * len(deltas))
+    params = [value for date_id in sorted(deltas) for value in (date_id, *deltas[date_id].values())]
+    updates = ", ".join(f"{qn(f)} = {table}.{qn(f)} + EXCLUDED.{qn(f)}" for f in TOTAL_FIELDS)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {table} ({qn("date_id")}, {", ".join(qn(f) for f in TOTAL_FIELDS)})
+            VALUES {placeholders}
+            ON CONFLICT ({qn("date_id")}) DO UPDATE SET {updates}
+            """,
+            params,
+        )
+        _delete_days_without_sales(cursor, *_in_clause(qn("date_id"), sorted(deltas)))
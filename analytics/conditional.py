@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.db.models import Max
+from django.utils.dateparse import parse_date
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import FactAnalytics
+from .result_cache import get_warehouse_state, request_fingerprint, result_cache
+
+
+def _etag_matches(etag, if_none_match):
+    # Weak comparison, as RFC 9110 requires for If-None-Match.
+    tags = parse_etags(if_none_match)
+    return "*" in tags or etag.removeprefix("W/") in [tag.removeprefix("W/") for tag in tags]
+
+def _not_modified(request, etag, last_modified):
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match:
+        return _etag_matches(etag, if_none_match)
+    if_modified_since = parse_http_date_safe(request.headers.get("If-Modified-Since", ""))
+    return bool(last_modified and if_modified_since and int(last_modified.timestamp()) <= if_modified_since)
+
+def _cache_control(request):
+    # A range that ends before the newest synced day no longer grows with
+    # each sync, so clients may keep it; anything else revalidates.
+    end = parse_date(request.query_params.get("end") or "")
+    if end:
+        latest = FactAnalytics.objects.aggregate(latest=Max("date__full_date"))["latest"]
+        if latest and end < latest:
+            return f"public, max-age={settings.ANALYTICS_HISTORICAL_MAX_AGE}"
+    return "no-cache"
+
+def conditional_response(request, endpoint, compute, use_cache=True):
+    """
+    Answer a GET with ETag/Last-Modified validators derived from the warehouse
+    version and the request's filters. A matching ``If-None-Match`` (or a
+    fresh ``If-Modified-Since``) returns 304 before ``compute()`` runs; other
+    requests get ``compute()``'s data, through the result cache if ``use_cache``.
+    """
+    version, last_modified = get_warehouse_state()
+    etag = quote_etag(f"{endpoint}-v{version}-{request_fingerprint(request)}")
+
+    if _not_modified(request, etag, last_modified):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    elif use_cache:
+        data, hit = result_cache.get_or_compute(endpoint, request, compute, version=version)
+        response = Response(data, status=status.HTTP_200_OK)
+        response["X-Cache"] = "HIT" if hit else "MISS"
+    else:
+        response = Response(compute(), status=status.HTTP_200_OK)
+
+    response["ETag"] = etag
+    if last_modified:
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+    response["Cache-Control"] = _cache_control(request)
+    return response
@@ -0,0 +1,18 @@
+SYNC_JOB_KIND_CHOICES = [
+    ("sync", "Sync orders analytics"),
+    ("verify", "Verify fact sales totals"),
+    ("simple_analysis", "Simple analysis"),
+]
+
+SYNC_RUN_MODE_CHOICES = [
+    ("flag", "Unsynced flag"),
+    ("cdc", "Change capture"),
+    ("parallel", "Parallel"),
+]
+
+SYNC_JOB_STATUS_CHOICES = [
+    ("pending", "Pending"),
+    ("running", "Running"),
+    ("success", "Success"),
+    ("failed", "Failed"),
+]
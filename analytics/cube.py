@@ -0,0 +1,471 @@
+"""
+In-process columnar cube of the sales facts (ANALYTICS_CUBE_ENABLED).
+
+Fact measures and dimension keys are held as NumPy column arrays; dimension
+attributes live in arrays indexed by surrogate id, so a filter on a
+dimension is a boolean mask over that dimension gathered onto the facts.
+Group-bys are ``bincount`` over the group codes and top-N pages are picked
+with ``argpartition`` on a composite ``(measure, tie-break)`` key, following
+the same order as the SQL endpoints.
+
+The cube refreshes when the warehouse version moves: only the days whose
+facts changed since the loaded version (recorded in DateVersion by every
+version bump) are reloaded; dimensions only gain rows.
+"""
+import threading
+from dataclasses import dataclass, field, replace
+
+import numpy as np
+from django.conf import settings
+
+from orders.constants import ORDER_STATUS_CHOICES
+from .models import FactSales, FactSalesLine, DimDate, DimUser, DimProductBase
+from .result_cache import get_changed_date_ids, get_warehouse_version
+
+
+STATUSES = [status for status, _ in ORDER_STATUS_CHOICES] + [None]
+_STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+
+# Fact table -> cube array prefix and {array name: column}
+FACT_TABLES = (
+    (FactSalesLine, "line", {
+        "date": "date_id", "user": "user_id", "product": "product_id", "quantity": "quantity", "price": "total_price",
+    }),
+    (FactSales, "sale", {
+        "date": "date_id", "user": "user_id", "status": "status", "amount": "total_price_after_discount",
+    }),
+)
+DATE_COLUMNS = ("id", "full_date", "day_of_week", "month_name", "is_holiday")
+USER_COLUMNS = ("id", "user_id", "username", "gender", "city", "registration_date", "age_range")
+
+
+def _upper(values):
+    # Case-folded copy for iexact / icontains (SQL compares UPPER() of both sides).
+    return np.array([v.upper() if v is not None else None for v in values], dtype=object)
+
+def _grow(array, size, fill):
+    if len(array) >= size:
+        return array
+    grown = np.full(size, fill, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+def _group_sums(codes, weights_by_name, minlength):
+    # Per group code: row count and int sums of each weight column.
+    counts = np.bincount(codes, minlength=minlength)
+    sums = {
+        name: np.rint(np.bincount(codes, weights=weights, minlength=minlength)).astype(np.int64)
+        for name, weights in weights_by_name.items()
+    }
+    return counts, sums
+
+def _distinct_per_group(codes, users, minlength):
+    # COUNT(DISTINCT user) per group code.
+    if not len(codes):
+        return np.zeros(minlength, dtype=np.int64)
+    span = int(users.max()) + 1
+    pairs = np.unique(codes.astype(np.int64) * span + users)
+    return np.bincount(pairs // span, minlength=minlength)
+
+
+class RankedGroups:
+    """
+    Lazily ordered sequence of group rows for the paginator: ``len()`` is the
+    number of groups and slicing ``[a:b]`` partitions out the top ``b`` keys
+    with ``argpartition`` and only sorts those.
+    """
+
+    def __init__(self, groups, sort_key, build_row):
+        self.groups = groups
+        self.sort_key = sort_key  # larger comes first, unique per group
+        self.build_row = build_row
+
+    def __len__(self):
+        return len(self.groups)
+
+    def count(self):
+        return len(self.groups)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop, _ = index.indices(len(self.groups))
+        if stop <= start:
+            return []
+        if stop < len(self.groups):
+            top = np.argpartition(-self.sort_key, stop - 1)[:stop]
+        else:
+            top = np.arange(len(self.groups))
+        top = top[np.argsort(-self.sort_key[top])][start:stop]
+        return [self.build_row(position) for position in top]
+
+    def __iter__(self):
+        return iter(self[:])
+
+def _sort_key(primary, secondary_rank):
+    # Orders by primary descending, then secondary rank ascending.
+    span = int(secondary_rank.max()) + 1 if len(secondary_rank) else 1
+    return primary.astype(np.int64) * span + (span - 1 - secondary_rank.astype(np.int64))
+
+
+@dataclass(frozen=True)
+class _CubeState:
+    version: int = None
+    # Facts, one entry per row
+    line_date: np.ndarray = field(default_factory=lambda: np.zeros(0, np.int64))
+    line_user: np.ndarray = field(default_factory=lambda: np.zeros(0, np.int64))
+    line_product: np.ndarray = field(default_factory=lambda: np.zeros(0, np.int64))
+    line_quantity: np.ndarray = field(default_factory=lambda: np.zeros(0, np.int64))
+    line_price: np.ndarray = field(default_factory=lambda: np.zeros(0, np.int64))
+    sale_date: np.ndarray = field(default_factory=lambda: np.zeros(0, np.int64))
+    sale_user: np.ndarray = field(default_factory=lambda: np.zeros(0, np.int64))
+    sale_status: np.ndarray = field(default_factory=lambda: np.zeros(0, np.int64))
+    sale_amount: np.ndarray = field(default_factory=lambda: np.zeros(0, np.int64))
+    # Dimensions, indexed by surrogate id (product_id for products)
+    dates: dict = field(default_factory=dict)
+    users: dict = field(default_factory=dict)
+    product_supplier: np.ndarray = field(default_factory=lambda: np.zeros(0, object))
+    product_supplier_upper: np.ndarray = field(default_factory=lambda: np.zeros(0, object))
+    # Current suppliers sorted, and each product's position in that list
+    # (len(supplier_names) for none)
+    supplier_names: list = field(default_factory=list)
+    product_supplier_code: np.ndarray = field(default_factory=lambda: np.zeros(0, np.int64))
+    max_date_id: int = 0
+    max_user_id: int = 0
+    max_product_version_id: int = 0
+
+
+def _load_columns(queryset, columns, chunk_size):
+    rows = list(queryset.values_list(*columns).iterator(chunk_size=chunk_size))
+    return [list(values) for values in zip(*rows)] if rows else [[] for _ in columns]
+
+def _replace_days(old, changed_days, fresh):
+    # Drop the rows of changed days (the first array holds the day) and
+    # append their reloaded rows.
+    keep = ~np.isin(old[0], changed_days)
+    return [np.concatenate([array[keep], np.asarray(new, dtype=array.dtype)]) for array, new in zip(old, fresh)]
+
+
+class SalesCube:
+    def __init__(self):
+        self._state = None
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.days_reloaded = 0
+
+    @property
+    def loaded(self):
+        return self._state is not None
+
+    def clear(self):
+        with self._lock:
+            self._state = None
+
+    def current(self):
+        """The cube at the current warehouse version, refreshing it if needed."""
+        version = get_warehouse_version()
+        state = self._state
+        if state is None or state.version != version:
+            state = self.refresh()
+        return state
+
+    def refresh(self):
+        with self._lock:
+            state = self._state or _CubeState()
+            version = get_warehouse_version()
+            if state.version == version:
+                return state
+            chunk_size = settings.ANALYTICS_EXPORT_CHUNK_SIZE
+            changes = {"version": version}
+            # Every day on the first load; afterwards the days changed since.
+            changed = None if state.version is None else sorted(get_changed_date_ids(state.version))
+
+            # Facts first: their dimension rows were committed before them.
+            for model, prefix, columns in FACT_TABLES:
+                if changed == []:
+                    continue
+                rows = model.objects.all() if changed is None else model.objects.filter(date_id__in=changed)
+                fresh = _load_columns(rows, columns.values(), chunk_size)
+                if model is FactSales:
+                    fresh[2] = [_STATUS_CODES.get(status, _STATUS_CODES[None]) for status in fresh[2]]
+                    fresh[3] = [amount or 0 for amount in fresh[3]]
+                names = [f"{prefix}_{name}" for name in columns]
+                changes.update(zip(names, _replace_days([getattr(state, name) for name in names], changed or [], fresh)))
+                if changed is not None:
+                    self.days_reloaded += len(changed)
+
+            changes.update(self._load_dimensions(state, chunk_size))
+            self._state = replace(state, **changes)
+            self.loads += 1
+            return self._state
+
+    @staticmethod
+    def _load_dimensions(state, chunk_size):
+        # Dimensions are append-only (new SCD versions get new ids), so only
+        # rows past the last loaded id are read.
+        changes = {}
+
+        ids, full_date, day_of_week, month_name, is_holiday = _load_columns(
+            DimDate.objects.filter(id__gt=state.max_date_id), DATE_COLUMNS, chunk_size
+        )
+        if ids:
+            size = max(ids) + 1
+            dates = {
+                "full_date": _grow(state.dates.get("full_date", np.zeros(0, object)), size, None),
+                "ordinal": _grow(state.dates.get("ordinal", np.zeros(0, np.int64)), size, -1),
+                "day_of_week": _grow(state.dates.get("day_of_week", np.zeros(0, object)), size, None),
+                "month_name": _grow(state.dates.get("month_name", np.zeros(0, object)), size, None),
+                "is_holiday": _grow(state.dates.get("is_holiday", np.zeros(0, object)), size, None),
+            }
+            ids = np.asarray(ids)
+            dates["full_date"][ids] = full_date
+            dates["ordinal"][ids] = [d.toordinal() for d in full_date]
+            dates["day_of_week"][ids] = _upper(day_of_week)
+            dates["month_name"][ids] = _upper(month_name)
+            dates["is_holiday"][ids] = is_holiday
+            changes.update(dates=dates, max_date_id=int(ids.max()))
+
+        columns = _load_columns(DimUser.objects.filter(id__gt=state.max_user_id), USER_COLUMNS, chunk_size)
+        if columns[0]:
+            ids = np.asarray(columns[0])
+            size = int(ids.max()) + 1
+            users = {}
+            for name, values in zip(USER_COLUMNS[1:], columns[1:]):
+                users[name] = _grow(state.users.get(name, np.zeros(0, object)), size, None)
+                users[name][ids] = values
+                if name in ("username", "gender", "city", "age_range"):
+                    upper = f"{name}_upper"
+                    users[upper] = _grow(state.users.get(upper, np.zeros(0, object)), size, None)
+                    users[upper][ids] = _upper(values)
+            changes.update(users=users, max_user_id=int(ids.max()))
+
+        versions = list(
+            DimProductBase.objects.filter(id__gt=state.max_product_version_id)
+            .order_by('id').values_list('id', 'product_id', 'supplier', 'is_current')
+        )
+        if versions:
+            size = max(product_id for _, product_id, _, _ in versions) + 1
+            supplier = _grow(state.product_supplier, size, None).copy()
+            supplier_upper = _grow(state.product_supplier_upper, size, None).copy()
+            for _, product_id, name, is_current in versions:
+                # A later version always supersedes; closed ones only matter
+                # on the first load, where the current row comes after them.
+                if is_current or state.max_product_version_id == 0:
+                    supplier[product_id] = name
+                    supplier_upper[product_id] = name.upper() if name is not None else None
+            names = sorted({name for name in supplier if name is not None})
+            codes = {name: code for code, name in enumerate(names)}
+            changes.update(
+                product_supplier=supplier,
+                product_supplier_upper=supplier_upper,
+                supplier_names=names,
+                product_supplier_code=np.array([codes.get(name, len(names)) for name in supplier], dtype=np.int64),
+                max_product_version_id=versions[-1][0],
+            )
+        return changes
+
+
+    # ----------------------
+    # Filters
+    # ----------------------
+
+    @staticmethod
+    def _date_mask(state, filters):
+        dates = state.dates
+        mask = np.ones(len(dates.get("ordinal", [])), dtype=bool)
+        if not len(mask):
+            return mask
+        if filters.get("start"):
+            mask &= dates["ordinal"] >= filters["start"].toordinal()
+        if filters.get("end"):
+            mask &= (dates["ordinal"] <= filters["end"].toordinal()) & (dates["ordinal"] >= 0)
+        for name in ("day_of_week", "month_name"):
+            if filters.get(name):
+                mask &= dates[name] == filters[name].upper()
+        if filters.get("is_holiday") is not None:
+            mask &= dates["is_holiday"] == filters["is_holiday"]
+        return mask
+
+    @staticmethod
+    def _contains(values_upper, needle):
+        needle = needle.upper()
+        return np.array([v is not None and needle in v for v in values_upper], dtype=bool)
+
+    def _product_mask(self, state, supplier):
+        if not supplier:
+            return None
+        return self._contains(state.product_supplier_upper, supplier)
+
+    def _user_mask(self, state, filters):
+        mask = None
+        for name in ("city", "gender", "age_range"):
+            if filters.get(name):
+                matches = state.users[f"{name}_upper"] == filters[name].upper()
+                mask = matches if mask is None else mask & matches
+        if filters.get("username"):
+            matches = self._contains(state.users["username_upper"], filters["username"])
+            mask = matches if mask is None else mask & matches
+        return mask
+
+    def _line_mask(self, state, filters, supplier=None):
+        mask = self._date_mask(state, filters)[state.line_date]
+        products = self._product_mask(state, supplier)
+        if products is not None:
+            in_range = state.line_product < len(products)
+            mask &= in_range & products[np.where(in_range, state.line_product, 0)]
+        return mask
+
+    def _sale_mask(self, state, filters):
+        mask = self._date_mask(state, filters)[state.sale_date]
+        users = self._user_mask(state, filters)
+        if users is not None:
+            mask &= users[state.sale_user]
+        return mask
+
+    # ----------------------
+    # Endpoint queries
+    # ----------------------
+    # Each returns rows shaped like the matching SQL queryset's values().
+
+    def product_sales(self, filters):
+        # most-sold: lines grouped by product_id, ordered (-quantity, product_id).
+        state = self.current()
+        mask = self._line_mask(state, filters, filters.get("supplier"))
+        products = state.line_product[mask]
+        size = int(products.max()) + 1 if len(products) else 0
+        counts, sums = _group_sums(products, {
+            "quantity": state.line_quantity[mask],
+            "price": state.line_price[mask],
+        }, size)
+        users = _distinct_per_group(products, state.line_user[mask], size)
+        groups = np.flatnonzero(counts)
+        sort_key = _sort_key(sums["quantity"][groups], groups)
+
+        def build_row(position):
+            product_id = groups[position]
+            return {
+                "product_id": int(product_id),
+                "total_quantity_sold": int(sums["quantity"][product_id]),
+                "total_sold_price": int(sums["price"][product_id]),
+                "users": int(users[product_id]),
+            }
+        return RankedGroups(groups, sort_key, build_row)
+
+    def product_dates(self, filters, product_ids):
+        # most-sold per-date breakdown of ``product_ids``, ordered by date.
+        state = self.current()
+        mask = self._line_mask(state, filters, filters.get("supplier")) & np.isin(state.line_product, product_ids)
+        days = state.line_date[mask]
+        products = state.line_product[mask]
+        span = int(days.max()) + 1 if len(days) else 1
+        codes = products * span + days
+        keys, inverse = np.unique(codes, return_inverse=True)
+        quantity = np.rint(np.bincount(inverse, weights=state.line_quantity[mask], minlength=len(keys))).astype(np.int64)
+        users = _distinct_per_group(inverse, state.line_user[mask], len(keys))
+        full_date = state.dates["full_date"]
+        order = np.argsort(state.dates["ordinal"][keys % span], kind="stable")
+        return [
+            {
+                "product_id": int(keys[i] // span),
+                "date__full_date": full_date[keys[i] % span],
+                "quantity": int(quantity[i]),
+                "users": int(users[i]),
+            }
+            for i in order
+        ]
+
+    def top_users(self, filters):
+        # top-users: sales grouped by user, ranked by order count, ordered
+        # (-total_orders, user__user_id).
+        state = self.current()
+        mask = self._sale_mask(state, filters)
+        sale_users = state.sale_user[mask]
+        size = int(sale_users.max()) + 1 if len(sale_users) else 0
+        counts, sums = _group_sums(sale_users, {"amount": state.sale_amount[mask]}, size)
+        groups = np.flatnonzero(counts)
+        orders = counts[groups]
+        ascending = np.sort(orders)
+        ranks = len(orders) - np.searchsorted(ascending, orders, side="right") + 1
+        users = state.users
+        sort_key = _sort_key(orders, users["user_id"][groups].astype(np.int64))
+
+        def build_row(position):
+            user = groups[position]
+            return {
+                "user__user_id": users["user_id"][user],
+                "user__username": users["username"][user],
+                "user__gender": users["gender"][user],
+                "user__city": users["city"][user],
+                "user__registration_date": users["registration_date"][user],
+                "user__age_range": users["age_range"][user],
+                "total_orders": int(orders[position]),
+                "total_spent": int(sums["amount"][user]),
+                "rank": int(ranks[position]),
+            }
+        return RankedGroups(groups, sort_key, build_row)
+
+    def top_suppliers(self, filters):
+        # top-suppliers: lines grouped by the product's current supplier,
+        # ordered (-quantity, supplier) with no supplier last. Names sort by
+        # code point, i.e. like the database under the "C" collation.
+        state = self.current()
+        mask = self._line_mask(state, filters, filters.get("supplier_name"))
+        names = state.supplier_names
+        supplier_code = state.product_supplier_code
+        products = state.line_product[mask]
+        in_range = products < len(supplier_code)
+        line_codes = np.where(in_range, supplier_code[np.where(in_range, products, 0)], len(names))
+        counts, sums = _group_sums(line_codes, {
+            "quantity": state.line_quantity[mask],
+            "price": state.line_price[mask],
+        }, len(names) + 1)
+        users = _distinct_per_group(line_codes, state.line_user[mask], len(names) + 1)
+        groups = np.flatnonzero(counts)
+        sort_key = _sort_key(sums["quantity"][groups], groups)
+
+        def build_row(position):
+            code = groups[position]
+            return {
+                "supplier": names[code] if code < len(names) else None,
+                "total_quantity_sold": int(sums["quantity"][code]),
+                "total_sold_price": int(sums["price"][code]),
+                "user_quantity": int(users[code]),
+            }
+        return RankedGroups(groups, sort_key, build_row)
+
+    def orders_by_status(self, filters):
+        state = self.current()
+        mask = self._sale_mask(state, filters)
+        counts, sums = _group_sums(state.sale_status[mask], {"amount": state.sale_amount[mask]}, len(STATUSES))
+        return [
+            {"status": STATUSES[code], "total": int(sums["amount"][code])}
+            for code in np.flatnonzero(counts)
+        ]
+
+    def stats(self):
+        state = self._state
+        return {
+            "enabled": settings.ANALYTICS_CUBE_ENABLED,
+            "loaded": state is not None,
+            "version": state.version if state else None,
+            "lines": len(state.line_date) if state else 0,
+            "sales": len(state.sale_date) if state else 0,
+            "loads": self.loads,
+            "days_reloaded": self.days_reloaded,
+        }
+
+
+sales_cube = SalesCube()
+
+
+def cube_filters(filterset_class, request):
+    """
+    The cleaned filters of ``request`` when the cube should answer it (cube
+    enabled and filters valid), else ``None`` for the SQL path.
+    """
+    if not settings.ANALYTICS_CUBE_ENABLED:
+        return None
+    filterset = filterset_class(request.query_params, queryset=filterset_class._meta.model.objects.none())
+    if not filterset.is_valid():
+        return None
+    return filterset.form.cleaned_data
@@ -0,0 +1,74 @@
+from datetime import timedelta
+
+import jdatetime
+from django.db import transaction
+
+from .models import DimDate
+from .resolvers import date_resolver
+
+
+def _jalali_month_length(year, month):
+    if month == 12:
+        return 30 if jdatetime.date(year, 1, 1).isleap() else 29
+    return jdatetime.j_days_in_month[month - 1]
+
+def build_dim_dates(start, end):
+    # Only ``start`` goes through jdatetime; the remaining Jalali dates are
+    # produced by stepping day/month/year counters, so a 30 year calendar
+    # costs one conversion instead of ~11k.
+    if end < start:
+        return []
+    j = jdatetime.date.fromgregorian(date=start)
+    year, month, day = j.year, j.month, j.day
+    weekday = j.weekday()
+    month_length = _jalali_month_length(year, month)
+
+    rows = []
+    for offset in range((end - start).days + 1):
+        rows.append(DimDate(
+            full_date=start + timedelta(days=offset),
+            jalali_date=f"{year}-{month:02d}-{day:02d}",
+            day_of_week=jdatetime.date.j_weekdays_en[weekday],
+            month_name=jdatetime.date.j_months_en[month - 1],
+            quarter=(month - 1) // 3 + 1,
+            is_holiday=(weekday == 6)
+        ))
+
+        weekday = (weekday + 1) % 7
+        day += 1
+        if day > month_length:
+            day = 1
+            month += 1
+            if month > 12:
+                month = 1
+                year += 1
+            month_length = _jalali_month_length(year, month)
+    return rows
+
+def jalali_year_range(start_year, end_year):
+    start = jdatetime.date(start_year, 1, 1).togregorian()
+    end = jdatetime.date(end_year + 1, 1, 1).togregorian() - timedelta(days=1)
+    return start, end
+
+def generate_dim_dates(start, end, batch_size=2000):
+    """
+    Pre-generate every calendar row between ``start`` and ``end`` (inclusive)
+    in one bulk insert. Existing dates are left untouched. Returns the number
+    of dates that were missing.
+    """
+    before = DimDate.objects.filter(full_date__gte=start, full_date__lte=end).count()
+    DimDate.objects.bulk_create(build_dim_dates(start, end), batch_size=batch_size, ignore_conflicts=True)
+    dates = dict(DimDate.objects.filter(full_date__gte=start, full_date__lte=end).values_list('full_date', 'id'))
+    transaction.on_commit(lambda: date_resolver.remember(dates))
+    return (end - start).days + 1 - before
+
+def resolve_date_ids(dates, stats=None):
+    # Map each date to its DimDate id through the shared resolver cache,
+    # creating rows for dates outside the pre-generated calendar.
+    return date_resolver.resolve(set(dates), lambda d: build_dim_dates(d, d)[0], stats=stats)
+
+def get_date_id(full_date):
+    date_id = date_resolver.get(full_date)
+    if date_id is None:
+        date_id = resolve_date_ids([full_date])[full_date]
+    return date_id
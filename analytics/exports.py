@@ -0,0 +1,119 @@
+import csv
+import json
+import zlib
+
+from django.conf import settings
+
+from .models import FactSalesLine
+from .services import with_current_product
+
+
+EXPORT_FORMAT_NDJSON = "ndjson"
+EXPORT_FORMAT_CSV = "csv"
+EXPORT_CONTENT_TYPES = {
+    EXPORT_FORMAT_NDJSON: "application/x-ndjson",
+    EXPORT_FORMAT_CSV: "text/csv",
+}
+
+# Output column -> FactSalesLine lookup. One row per order line, joined to the
+# date, the user, the variant and the product's current version, like the other
+# endpoints; the ``*_at_sale`` columns come from the version current at sale time.
+EXPORT_COLUMNS = {
+    "order_id": "order_id",
+    "order_item_id": "order_item_id",
+    "date": "date__full_date",
+    "jalali_date": "date__jalali_date",
+    "day_of_week": "date__day_of_week",
+    "month_name": "date__month_name",
+    "quarter": "date__quarter",
+    "is_holiday": "date__is_holiday",
+    "user_id": "user__user_id",
+    "username": "user__username",
+    "gender": "user__gender",
+    "city": "user__city",
+    "age_range": "user__age_range",
+    "product_id": "product_id",
+    "product_name": "current_product__name",
+    "brand": "current_product__brand",
+    "supplier": "current_product__supplier",
+    "category_level_1": "current_product__category_level_1",
+    "category_level_2": "current_product__category_level_2",
+    "category_level_3": "current_product__category_level_3",
+    "brand_at_sale": "product_version__brand",
+    "supplier_at_sale": "product_version__supplier",
+    "category_level_1_at_sale": "product_version__category_level_1",
+    "category_level_2_at_sale": "product_version__category_level_2",
+    "category_level_3_at_sale": "product_version__category_level_3",
+    "variant_sku": "variant__variant_sku",
+    "color": "variant__color",
+    "size": "variant__size",
+    "status": "status",
+    "quantity": "quantity",
+    "unit_price": "unit_price",
+    "discount_percent": "discount_percent",
+    "total_price": "total_price",
+    "total_after_discount": "total_after_discount",
+}
+
+# Rows are buffered into blocks of about this many bytes before being yielded
+# (and compressed), so the stream is not one tiny write per row.
+_BLOCK_SIZE = 64 * 1024
+
+
+class _Echo:
+    # File-like object csv.writer writes into; each write returns the line.
+    def write(self, value):
+        return value
+
+def export_rows(queryset=None, chunk_size=None):
+    """
+    Yield the export rows of ``queryset`` (all fact lines by default) as
+    tuples in ``EXPORT_COLUMNS`` order. On PostgreSQL ``iterator()`` reads
+    through a server-side cursor ``chunk_size`` rows at a time, so memory
+    stays flat whatever the size of the warehouse.
+    """
+    if queryset is None:
+        queryset = FactSalesLine.objects.all()
+    return (
+        with_current_product(queryset).order_by('date_id', 'id')
+        .values_list(*EXPORT_COLUMNS.values())
+        .iterator(chunk_size=chunk_size or settings.ANALYTICS_EXPORT_CHUNK_SIZE)
+    )
+
+def _encode_lines(rows, export_format):
+    names = list(EXPORT_COLUMNS)
+    if export_format == EXPORT_FORMAT_CSV:
+        writer = csv.writer(_Echo())
+        yield writer.writerow(names)
+        for row in rows:
+            yield writer.writerow(row)
+    elif export_format == EXPORT_FORMAT_NDJSON:
+        for row in rows:
+            yield json.dumps(dict(zip(names, row)), default=str) + "\n"
+    else:
+        raise ValueError(f"Unknown export format '{export_format}', expected '{EXPORT_FORMAT_NDJSON}' or '{EXPORT_FORMAT_CSV}'.")
+
+def stream_export(queryset=None, export_format=EXPORT_FORMAT_NDJSON, compress=False, chunk_size=None):
+    """
+    Yield the export as encoded byte blocks, gzip-compressed on the fly when
+    ``compress`` is set.
+    """
+    compressor = zlib.compressobj(wbits=31) if compress else None  # 31: gzip container
+    block = []
+    size = 0
+    for line in _encode_lines(export_rows(queryset, chunk_size), export_format):
+        data = line.encode()
+        block.append(data)
+        size += len(data)
+        if size >= _BLOCK_SIZE:
+            data = b"".join(block)
+            block, size = [], 0
+            if compressor:
+                data = compressor.compress(data)
+            if data:
+                yield data
+    data = b"".join(block)
+    if compressor:
+        data = compressor.compress(data) + compressor.flush()
+    if data:
+        yield data
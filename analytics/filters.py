@@ -1,5 +1,12 @@
 import django_filters
-from .models import FactAnalytics, FactSales
+from .models import FactAnalytics, FactSales, FactSalesLine, DimProductBase, DailySupplierUserSketch
+
+
+def filter_current_supplier(queryset, name, value):
+    # Lines whose product's current version has a matching supplier.
+    products = DimProductBase.objects.filter(is_current=True, supplier__icontains=value).values('product_id')
+    return queryset.filter(product_id__in=products)
+
 
 class FactAnalyticsFilter(django_filters.FilterSet):
     start = django_filters.DateFilter(field_name="date__full_date", lookup_expr="gte")
@@ -19,9 +26,26 @@ class MostSoldProductsFilter(django_filters.FilterSet):
     day_of_week = django_filters.CharFilter(field_name="date__day_of_week", lookup_expr="iexact")
     month_name = django_filters.CharFilter(field_name="date__month_name", lookup_expr="iexact")
     is_holiday = django_filters.BooleanFilter(field_name="date__is_holiday")
-    supplier = django_filters.CharFilter(field_name="variants__product__supplier", lookup_expr="icontains")
+    supplier = django_filters.CharFilter(method=filter_current_supplier)
     class Meta:
-        model = FactSales
+        model = FactSalesLine
+        fields = []
+
+class SalesExportFilter(django_filters.FilterSet):
+    start = django_filters.DateFilter(field_name="date__full_date", lookup_expr="gte")
+    end = django_filters.DateFilter(field_name="date__full_date", lookup_expr="lte")
+    status = django_filters.CharFilter(field_name="status", lookup_expr="iexact")
+    supplier = django_filters.CharFilter(method=filter_current_supplier)
+    class Meta:
+        model = FactSalesLine
+        fields = []
+
+class CategoryRollupFilter(django_filters.FilterSet):
+    start = django_filters.DateFilter(field_name="date__full_date", lookup_expr="gte")
+    end = django_filters.DateFilter(field_name="date__full_date", lookup_expr="lte")
+    status = django_filters.CharFilter(field_name="status", lookup_expr="iexact")
+    class Meta:
+        model = FactSalesLine
         fields = []
 
 class OrdersByStatusFilter(django_filters.FilterSet):
@@ -49,8 +73,15 @@ class TopUsersFilter(django_filters.FilterSet):
 class TopSuppliersFilter(django_filters.FilterSet):
     start = django_filters.DateFilter(field_name="date__full_date", lookup_expr="gte", required=False)
     end = django_filters.DateFilter(field_name="date__full_date", lookup_expr="lte", required=False)
-    supplier_name = django_filters.CharFilter(field_name="variants__product__supplier", lookup_expr="icontains")
+    supplier_name = django_filters.CharFilter(method=filter_current_supplier)
 
     class Meta:
-        model = FactSales
-        fields = []
\ No newline at end of file
+        model = FactSalesLine
+        fields = []
+class SupplierUserSketchFilter(django_filters.FilterSet):
+    start = django_filters.DateFilter(field_name="date__full_date", lookup_expr="gte", required=False)
+    end = django_filters.DateFilter(field_name="date__full_date", lookup_expr="lte", required=False)
+
+    class Meta:
+        model = DailySupplierUserSketch
+        fields = []
@@ -0,0 +1,94 @@
+"""
+HyperLogLog distinct counting over integer ids.
+
+Sketches use 2**12 one-byte registers (4 KiB). The relative standard error of
+an estimate is 1.04 / sqrt(4096) ~= 1.6%, so about 95% of estimates fall
+within +-3.3% of the true count (99.7% within +-4.9%). Below ~10k distinct ids
+the small-range (linear counting) correction is tighter still: a few dozen
+ids typically come back exact or one or two short. Merging sketches (register-wise max) gives
+the sketch of the union, so counts over any set of days/products are
+answered from stored sketches without touching the facts.
+"""
+import math
+import zlib
+
+import numpy as np
+
+
+PRECISION = 12
+REGISTERS = 1 << PRECISION
+STANDARD_ERROR = 1.04 / math.sqrt(REGISTERS)
+
+# Leading byte of stored sketches: the registers as is, or zlib-compressed.
+FORMAT_RAW = 0
+FORMAT_ZLIB = 1
+
+_ALPHA = 0.7213 / (1 + 1.079 / REGISTERS)
+_RANK_BITS = 64 - PRECISION
+
+
+def _hash(ids):
+    # splitmix64 finalizer: spreads sequential ids over all 64 bits.
+    x = np.asarray(ids, dtype=np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+def empty():
+    return np.zeros(REGISTERS, dtype=np.uint8)
+
+def add(registers, ids):
+    """Add integer ``ids`` to ``registers`` in place."""
+    if len(ids) == 0:
+        return registers
+    hashed = _hash(ids)
+    index = (hashed >> np.uint64(_RANK_BITS)).astype(np.intp)
+    rest = hashed & np.uint64((1 << _RANK_BITS) - 1)
+    # frexp's exponent is the bit length; exact since rest < 2**53.
+    bit_length = np.frexp(rest.astype(np.float64))[1]
+    rank = (_RANK_BITS - bit_length + 1).astype(np.uint8)
+    np.maximum.at(registers, index, rank)
+    return registers
+
+def sketch(ids):
+    return add(empty(), ids)
+
+def from_bytes(data):
+    data = bytes(data)
+    if not data:
+        raise ValueError("Empty sketch.")
+    encoding, payload = data[0], data[1:]
+    if encoding == FORMAT_ZLIB:
+        payload = zlib.decompress(payload)
+    elif encoding != FORMAT_RAW:
+        raise ValueError(f"Unknown sketch format {encoding}.")
+    if len(payload) != REGISTERS:
+        raise ValueError(f"Sketch has {len(payload)} registers, expected {REGISTERS}.")
+    return np.frombuffer(payload, dtype=np.uint8)
+
+def to_bytes(registers, encoding=FORMAT_ZLIB):
+    # Sketches of a few users are almost all zero registers and compress to
+    # a few dozen bytes. The leading byte names the encoding.
+    payload = registers.tobytes()
+    if encoding == FORMAT_ZLIB:
+        payload = zlib.compress(payload, 1)
+    elif encoding != FORMAT_RAW:
+        raise ValueError(f"Unknown sketch format {encoding}.")
+    return bytes([encoding]) + payload
+
+def merge(sketches):
+    """Union of sketches (arrays or stored bytes)."""
+    sketches = [s if isinstance(s, np.ndarray) else from_bytes(s) for s in sketches]
+    if not sketches:
+        return empty()
+    return np.maximum.reduce(sketches)
+
+def estimate(registers):
+    raw = _ALPHA * REGISTERS * REGISTERS / np.sum(np.ldexp(1.0, -registers.astype(np.int64)))
+    zeros = int(np.count_nonzero(registers == 0))
+    if raw <= 2.5 * REGISTERS and zeros:
+        return REGISTERS * math.log(REGISTERS / zeros)
+    return float(raw)
+
+def count(registers):
+    return int(round(estimate(registers)))
@@ -0,0 +1,114 @@
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .models import SyncRun
+
+
+def _empty_stage():
+    return {
+        "seconds": 0.0,
+        "queries": 0,
+        "sql_seconds": 0.0,
+        "rows": 0,
+        "rows_per_second": None,
+        "peak_memory_kb": None,
+    }
+
+def _finish_stage(stats):
+    stats["seconds"] = round(stats["seconds"], 4)
+    stats["sql_seconds"] = round(stats["sql_seconds"], 4)
+    stats["rows_per_second"] = round(stats["rows"] / stats["seconds"], 1) if stats["seconds"] > 0 else None
+
+def merge_stages(stages, other):
+    # Times, queries and rows add up; peak memory is the largest peak seen.
+    for name, stats in other.items():
+        merged = stages.setdefault(name, _empty_stage())
+        for field in ("seconds", "queries", "sql_seconds", "rows"):
+            merged[field] += stats[field]
+        if stats["peak_memory_kb"] is not None:
+            merged["peak_memory_kb"] = max(merged["peak_memory_kb"] or 0, stats["peak_memory_kb"])
+        _finish_stage(merged)
+
+@contextmanager
+def measure_stage(report, name):
+    """
+    Time the enclosed block as stage ``name`` of ``report``: wall time, the
+    number and duration of SQL statements run through the default connection
+    and, while tracemalloc is tracing, the peak memory allocated in the block.
+    The caller sets ``rows`` on the yielded dict to get rows per second.
+    COPY streams do not go through Django's execute wrappers and are only
+    counted in wall time.
+    """
+    stats = report["stages"].setdefault(name, _empty_stage())
+    measured = {"rows": 0, "queries": 0, "sql_seconds": 0.0}
+
+    def count_query(execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            measured["queries"] += 1
+            measured["sql_seconds"] += time.perf_counter() - start
+
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    try:
+        with connection.execute_wrapper(count_query):
+            yield measured
+    finally:
+        stats["seconds"] += time.perf_counter() - start
+        stats["queries"] += measured["queries"]
+        stats["sql_seconds"] += measured["sql_seconds"]
+        stats["rows"] += measured["rows"]
+        if tracing:
+            peak_kb = max(tracemalloc.get_traced_memory()[1] - baseline, 0) // 1024
+            stats["peak_memory_kb"] = max(stats["peak_memory_kb"] or 0, peak_kb)
+        _finish_stage(stats)
+
+@contextmanager
+def trace_memory():
+    # Starts tracemalloc for the duration of a sync unless it is disabled or
+    # something else is already tracing.
+    started = settings.ANALYTICS_SYNC_TRACE_MEMORY and not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    try:
+        yield
+    finally:
+        if started:
+            tracemalloc.stop()
+
+def record_sync_run(mode, params, run):
+    """
+    Call ``run()`` and keep its report, duration and outcome as a
+    ``SyncRun`` history row. Returns the report.
+    """
+    sync_run = SyncRun.objects.create(mode=mode, params=params or {})
+    start = time.perf_counter()
+    try:
+        report = run()
+    except Exception as e:
+        SyncRun.objects.filter(pk=sync_run.pk).update(
+            status="failed",
+            error=str(e),
+            duration_seconds=round(time.perf_counter() - start, 4),
+            finished_at=timezone.now(),
+        )
+        raise
+    report["sync_run_id"] = sync_run.pk
+    SyncRun.objects.filter(pk=sync_run.pk).update(
+        status="success",
+        orders_processed=report["orders"],
+        report=report,
+        duration_seconds=round(time.perf_counter() - start, 4),
+        finished_at=timezone.now(),
+    )
+    return report
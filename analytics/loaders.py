@@ -0,0 +1,136 @@
+from django.conf import settings
+from django.db import connection
+
+from .models import FactSales, FactSalesLine
+
+
+FACT_SALES_UPSERT_COLUMNS = (
+    "order_id",
+    "date_id",
+    "user_id",
+    "status",
+    "total_price",
+    "total_price_after_discount",
+)
+FACT_SALES_LINE_UPSERT_COLUMNS = (
+    "order_item_id",
+    "order_id",
+    "date_id",
+    "user_id",
+    "product_id",
+    "product_version_id",
+    "variant_id",
+    "status",
+    "quantity",
+    "unit_price",
+    "discount_percent",
+    "total_price",
+    "total_after_discount",
+)
+# Written when a line is first loaded and never updated: a re-sync must not
+# move old sales onto the product version that is current now.
+FACT_SALES_LINE_INSERT_ONLY_COLUMNS = ("product_version_id",)
+
+
+def use_copy_loader():
+    return settings.ANALYTICS_SYNC_LOADER == "copy" and connection.vendor == "postgresql"
+
+def copy_rows(table, columns, rows):
+    qn = connection.ops.quote_name
+    sql = f"COPY {qn(table)} ({', '.join(qn(c) for c in columns)}) FROM STDIN"
+    written = 0
+    with connection.cursor() as cursor:
+        with cursor.copy(sql) as copy:
+            for row in rows:
+                copy.write_row(row)
+                written += 1
+    return written
+
+def upsert_fact_sales(facts):
+    """
+    Insert-or-update unsaved ``FactSales`` objects keyed by ``order_id``.
+    Replaying the same orders is a no-op.
+    Returns ``({order_id: fact_id}, created_count, updated_count)``.
+    """
+    if not facts:
+        return {}, 0, 0
+    order_ids = [f.order_id for f in facts]
+    if use_copy_loader():
+        created, updated = _copy_upsert(
+            FactSales, FACT_SALES_UPSERT_COLUMNS, (_row(f, FACT_SALES_UPSERT_COLUMNS) for f in facts)
+        )
+    else:
+        created, updated = _orm_upsert(FactSales, FACT_SALES_UPSERT_COLUMNS, facts)
+    fact_ids = dict(FactSales.objects.filter(order_id__in=order_ids).values_list('order_id', 'id'))
+    return fact_ids, created, updated
+
+def upsert_fact_sales_lines(order_ids, lines):
+    """
+    Make the stored ``FactSalesLine`` rows of ``order_ids`` match ``lines``
+    (unsaved, keyed by ``order_item_id``): lines of removed order items are
+    deleted, the rest are upserted. Returns ``(created, updated, deleted)``.
+    """
+    item_ids = [line.order_item_id for line in lines]
+    deleted, _ = FactSalesLine.objects.filter(order_id__in=order_ids).exclude(order_item_id__in=item_ids).delete()
+    if not lines:
+        return 0, 0, deleted
+    columns, insert_only = FACT_SALES_LINE_UPSERT_COLUMNS, FACT_SALES_LINE_INSERT_ONLY_COLUMNS
+    if use_copy_loader():
+        created, updated = _copy_upsert(FactSalesLine, columns, (_row(line, columns) for line in lines), insert_only)
+    else:
+        created, updated = _orm_upsert(FactSalesLine, columns, lines, insert_only)
+    return created, updated, deleted
+
+def _row(obj, columns):
+    return tuple(getattr(obj, column) for column in columns)
+
+def _copy_upsert(model, columns, rows, insert_only=()):
+    # COPY the rows into a temp staging table, then merge them with one
+    # INSERT ... ON CONFLICT on the first column (the natural key).
+    # ``insert_only`` columns are written on insert and left alone on update.
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    stage_table = f"{model._meta.db_table.lower()}_stage"
+    key = columns[0]
+    tracked = [c for c in columns[1:] if c not in insert_only]
+    column_list = ", ".join(qn(c) for c in columns)
+    updates = ", ".join(f"{qn(c)} = EXCLUDED.{qn(c)}" for c in tracked)
+    current = ", ".join(f"{table}.{qn(c)}" for c in tracked)
+    incoming = ", ".join(f"EXCLUDED.{qn(c)}" for c in tracked)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {stage_table}")
+        cursor.execute(f"CREATE TEMP TABLE {stage_table} ON COMMIT DROP AS SELECT {column_list} FROM {table} WITH NO DATA")
+    copy_rows(stage_table, columns, rows)
+
+    with connection.cursor() as cursor:
+        # Unchanged rows are skipped by the WHERE clause and never rewritten;
+        # xmax = 0 marks rows that were freshly inserted.
+        cursor.execute(
+            f"""
+            INSERT INTO {table} ({column_list})
+            SELECT {column_list} FROM {stage_table}
+            ON CONFLICT ({qn(key)}) DO UPDATE SET {updates}
+            WHERE ({current}) IS DISTINCT FROM ({incoming})
+            RETURNING (xmax = 0)
+            """
+        )
+        inserted = [row[0] for row in cursor.fetchall()]
+    created = sum(inserted)
+    return created, len(inserted) - created
+
+def _orm_upsert(model, columns, objs, insert_only=()):
+    # Same contract as _copy_upsert for other databases or loaders: rows whose
+    # tracked columns already match are left alone, and only rows that really
+    # changed count as updated.
+    key = columns[0]
+    tracked = [c for c in columns[1:] if c not in insert_only]
+    stored = {
+        row[0]: row[1:]
+        for row in model.objects.filter(**{f"{key}__in": [getattr(obj, key) for obj in objs]}).values_list(key, *tracked)
+    }
+    changed = [obj for obj in objs if stored.get(getattr(obj, key)) != _row(obj, tracked)]
+    if changed:
+        model.objects.bulk_create(changed, update_conflicts=True, unique_fields=[key], update_fields=list(tracked))
+    created = sum(1 for obj in changed if getattr(obj, key) not in stored)
+    return created, len(changed) - created
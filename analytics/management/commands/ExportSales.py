@@ -0,0 +1,41 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from analytics.exports import EXPORT_FORMAT_NDJSON, EXPORT_CONTENT_TYPES, stream_export
+from analytics.models import FactSalesLine
+
+
+class Command(BaseCommand):
+    help = "Streams the denormalized fact lines to a file (or stdout) as NDJSON or CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--file-format", choices=list(EXPORT_CONTENT_TYPES), default=EXPORT_FORMAT_NDJSON)
+        parser.add_argument("--output", help="File to write (defaults to stdout)")
+        parser.add_argument("--gzip", action="store_true", help="Gzip the output while writing")
+        parser.add_argument("--start", help="First sale date, YYYY-MM-DD")
+        parser.add_argument("--end", help="Last sale date, YYYY-MM-DD")
+        parser.add_argument("--chunk-size", type=int, default=None, help="Rows per cursor fetch (defaults to ANALYTICS_EXPORT_CHUNK_SIZE)")
+
+    def handle(self, *args, **options):
+        queryset = FactSalesLine.objects.all()
+        for option, lookup in (("start", "date__full_date__gte"), ("end", "date__full_date__lte")):
+            if options[option]:
+                day = parse_date(options[option])
+                if not day:
+                    raise CommandError(f"Invalid --{option} date.")
+                queryset = queryset.filter(**{lookup: day})
+
+        blocks = stream_export(queryset, options["file_format"], compress=options["gzip"], chunk_size=options["chunk_size"])
+        output = open(options["output"], "wb") if options["output"] else sys.stdout.buffer
+        try:
+            written = 0
+            for block in blocks:
+                output.write(block)
+                written += len(block)
+        finally:
+            if options["output"]:
+                output.close()
+        if options["output"]:
+            self.stdout.write(self.style.SUCCESS(f"Exported {written} bytes to {options['output']}."))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from analytics.dim_dates import generate_dim_dates, jalali_year_range
+
+
+class Command(BaseCommand):
+    help = "Pre-generates the DimDate calendar for a Jalali year range (or explicit Gregorian dates) in one bulk insert"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start-year", type=int, default=1390, help="First Jalali year (inclusive)")
+        parser.add_argument("--end-year", type=int, default=1420, help="Last Jalali year (inclusive)")
+        parser.add_argument("--start", help="First Gregorian date, YYYY-MM-DD (overrides --start-year)")
+        parser.add_argument("--end", help="Last Gregorian date, YYYY-MM-DD (overrides --end-year)")
+
+    def handle(self, *args, **options):
+        start, end = jalali_year_range(options["start_year"], options["end_year"])
+        if options["start"]:
+            start = parse_date(options["start"])
+        if options["end"]:
+            end = parse_date(options["end"])
+        if not start or not end or end < start:
+            raise CommandError("Invalid date range.")
+
+        self.stdout.write(self.style.WARNING(f"Generating DimDate rows from {start} to {end}..."))
+        created = generate_dim_dates(start, end)
+        self.stdout.write(self.style.SUCCESS(f"DimDate calendar ready: {created} dates created."))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from analytics.sketches import refresh_user_sketches
+from analytics.result_cache import bump_warehouse_version
+
+
+class Command(BaseCommand):
+    help = "Rebuilds every per-day product and supplier distinct-user sketch from FactSalesLine"
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.WARNING("Rebuilding distinct-user sketches..."))
+        with transaction.atomic():
+            products, suppliers = refresh_user_sketches()
+            bump_warehouse_version()
+        self.stdout.write(self.style.SUCCESS(f"Sketches rebuilt: {products} product-days, {suppliers} supplier-days."))
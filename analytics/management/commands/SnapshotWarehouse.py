@@ -0,0 +1,36 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from analytics.snapshots import SNAPSHOT_FORMAT_PARQUET, SNAPSHOT_FORMATS, write_snapshot
+
+
+class Command(BaseCommand):
+    help = "Writes or refreshes a month-partitioned Parquet / Arrow snapshot of the star schema (needs pyarrow)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output-dir", help="Snapshot directory (defaults to ANALYTICS_SNAPSHOT_DIR)")
+        parser.add_argument("--file-format", choices=SNAPSHOT_FORMATS, default=SNAPSHOT_FORMAT_PARQUET)
+        parser.add_argument("--full", action="store_true", help="Rewrite every partition instead of only the changed ones")
+        parser.add_argument("--chunk-size", type=int, default=None, help="Rows per record batch (defaults to ANALYTICS_EXPORT_CHUNK_SIZE)")
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.WARNING("Writing warehouse snapshot..."))
+        try:
+            report = write_snapshot(
+                directory=options["output_dir"],
+                snapshot_format=options["file_format"],
+                full=options["full"],
+                chunk_size=options["chunk_size"],
+            )
+        except ImproperlyConfigured as e:
+            raise CommandError(str(e))
+
+        if report["up_to_date"]:
+            self.stdout.write(self.style.SUCCESS(f"Snapshot already at warehouse version {report['version']}."))
+            return
+        for table, table_report in report["tables"].items():
+            self.stdout.write(
+                f"{table}: {len(table_report['written'])}/{table_report['partitions']} partitions written "
+                f"({table_report['rows']} rows), {len(table_report['removed'])} removed"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Snapshot at warehouse version {report['version']}."))
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from analytics.sync_orders_analytics import SYNC_MODE_FLAG, SYNC_MODE_CDC
+from analytics.parallel_sync import PARTITION_BY_ID, PARTITION_BY_DAY
+from analytics.tasks import run_sync
+
+
+class Command(BaseCommand):
+    help = "Syncs unsynced orders into the analytics warehouse in committed batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--mode",
+            choices=[SYNC_MODE_FLAG, SYNC_MODE_CDC],
+            default=SYNC_MODE_FLAG,
+            help="flag: orders with is_synced_analytics=False; cdc: new and edited orders past the updated_at watermark",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="Orders per batch/transaction (defaults to ANALYTICS_SYNC_BATCH_SIZE)",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Worker processes; more than 1 runs the partitioned parallel sync (defaults to ANALYTICS_SYNC_WORKERS)",
+        )
+        parser.add_argument(
+            "--partition-by",
+            choices=[PARTITION_BY_ID, PARTITION_BY_DAY],
+            default=PARTITION_BY_ID,
+            help="How the parallel sync splits the backlog: order id ranges or created_at days",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.WARNING("Starting analytics sync..."))
+        report = run_sync(
+            mode=options["mode"],
+            batch_size=options["batch_size"],
+            workers=options["workers"],
+            partition_by=options["partition_by"],
+        )
+        stages = report.pop("stages")
+        for key, value in report.items():
+            self.stdout.write(f"{key}: {value}")
+        self.stdout.write(f"{'stage':<16}{'seconds':>10}{'queries':>9}{'sql s':>9}{'rows':>9}{'rows/s':>11}{'peak KiB':>10}")
+        for name, stats in stages.items():
+            peak = stats["peak_memory_kb"] if stats["peak_memory_kb"] is not None else "-"
+            self.stdout.write(
+                f"{name:<16}{stats['seconds']:>10.3f}{stats['queries']:>9}{stats['sql_seconds']:>9.3f}"
+                f"{stats['rows']:>9}{stats['rows_per_second'] or 0:>11.1f}{peak:>10}"
+            )
+        self.stdout.write(self.style.SUCCESS("Analytics sync completed!"))
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:52
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0010_dimproductbase_supplier'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('sync', 'Sync orders analytics'), ('verify', 'Verify fact sales totals'), ('simple_analysis', 'Simple analysis')], max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('success', 'Success'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('stage', models.CharField(blank=True, max_length=50, null=True)),
+                ('rows_processed', models.PositiveBigIntegerField(default=0)),
+                ('params', models.JSONField(blank=True, default=dict)),
+                ('result', models.JSONField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'SyncJob',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0011_syncjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('watermark_updated_at', models.DateTimeField(blank=True, null=True)),
+                ('watermark_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'SyncState',
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:55
+
+from django.db import migrations
+from django.db.models import Count, Max
+
+
+def remove_duplicate_facts(apps, schema_editor):
+    # Re-synced orders left several facts behind; keep the newest one per order.
+    FactSales = apps.get_model('analytics', 'FactSales')
+    duplicated = (
+        FactSales.objects.exclude(order_id=None)
+        .values('order_id')
+        .annotate(rows=Count('id'), keep_id=Max('id'))
+        .filter(rows__gt=1)
+    )
+    for row in duplicated:
+        FactSales.objects.filter(order_id=row['order_id']).exclude(id=row['keep_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0012_syncstate'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_facts, migrations.RunPython.noop),
+    ]
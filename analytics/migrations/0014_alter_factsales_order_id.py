@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0013_remove_duplicate_factsales'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='factsales',
+            name='order_id',
+            field=models.IntegerField(null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:01
+
+import hashlib
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+TRACKED_FIELDS = (
+    "name", "rating", "expire_date", "is_available", "is_exciting", "free_shipping", "has_gift",
+    "is_budget_friendly", "price", "brand", "supplier", "category_level_1", "category_level_2", "category_level_3",
+)
+
+
+def version_existing_products(apps, schema_editor):
+    # Hash every row and keep only the newest row per product current; older
+    # duplicates written by earlier syncs become closed history versions.
+    DimProductBase = apps.get_model('analytics', 'DimProductBase')
+    now = django.utils.timezone.now()
+    latest_ids = set()
+    seen = set()
+    for row in DimProductBase.objects.order_by('product_id', '-id').iterator():
+        if row.product_id not in seen:
+            seen.add(row.product_id)
+            latest_ids.add(row.id)
+        payload = "\x1f".join(repr(getattr(row, field)) for field in TRACKED_FIELDS)
+        row.row_hash = hashlib.md5(payload.encode("utf-8")).hexdigest()
+        row.is_current = row.id in latest_ids
+        row.valid_to = None if row.is_current else now
+        row.save(update_fields=['row_hash', 'is_current', 'valid_to'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0014_alter_factsales_order_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dimproductbase',
+            name='is_current',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='dimproductbase',
+            name='row_hash',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='dimproductbase',
+            name='valid_from',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='dimproductbase',
+            name='valid_to',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(version_existing_products, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='dimproductbase',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_current', True)), fields=('product_id',), name='dimproductbase_current_product_uniq'),
+        ),
+    ]
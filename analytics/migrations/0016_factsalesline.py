@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0015_dimproductbase_scd'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='dimvariantorder',
+            name='discount_percent',
+        ),
+        migrations.RemoveField(
+            model_name='dimvariantorder',
+            name='quantity',
+        ),
+        migrations.RemoveField(
+            model_name='dimvariantorder',
+            name='total_after_discount',
+        ),
+        migrations.RemoveField(
+            model_name='dimvariantorder',
+            name='total_price',
+        ),
+        migrations.RemoveField(
+            model_name='dimvariantorder',
+            name='unit_price',
+        ),
+        migrations.RemoveField(
+            model_name='factsales',
+            name='variants',
+        ),
+        migrations.CreateModel(
+            name='FactSalesLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_item_id', models.IntegerField(unique=True)),
+                ('order_id', models.IntegerField(db_index=True)),
+                ('product_id', models.IntegerField()),
+                ('status', models.CharField(choices=[('initial', 'ثبت اولیه'), ('process', 'در حال پردازش'), ('sent', 'ارسال شده'), ('done', 'تکمیل شده'), ('cancel', 'لغو شده'), ('rejected', 'مرجوع شده')], max_length=20, null=True)),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('unit_price', models.PositiveIntegerField(help_text='Price of one unit')),
+                ('discount_percent', models.PositiveSmallIntegerField(default=0, help_text='0-100%')),
+                ('total_price', models.PositiveIntegerField()),
+                ('total_after_discount', models.PositiveIntegerField()),
+                ('date', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='analytics.dimdate')),
+                ('product_version', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='analytics.dimproductbase')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='analytics.dimuser')),
+                ('variant', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='analytics.dimvariantorder')),
+            ],
+            options={
+                'db_table': 'FactSalesLine',
+                'indexes': [models.Index(fields=['product_id', 'date'], name='factsalesline_product_date_idx')],
+            },
+        ),
+    ]
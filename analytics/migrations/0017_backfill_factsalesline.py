@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def queue_orders_for_resync(apps, schema_editor):
+    # Order lines are rebuilt from OrderItem by the next sync; fact upserts
+    # are idempotent, so replaying every order only fills FactSalesLine.
+    Order = apps.get_model('orders', 'Order')
+    SyncState = apps.get_model('analytics', 'SyncState')
+    Order.objects.filter(is_synced_analytics=True).update(is_synced_analytics=False)
+    SyncState.objects.filter(name='orders_cdc').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0016_factsalesline'),
+        ('orders', '0015_order_order_updated_at_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(queue_orders_for_resync, migrations.RunPython.noop),
+    ]
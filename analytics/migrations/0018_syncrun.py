@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:07
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0017_backfill_factsalesline'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mode', models.CharField(choices=[('flag', 'Unsynced flag'), ('cdc', 'Change capture'), ('parallel', 'Parallel')], max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('success', 'Success'), ('failed', 'Failed')], default='running', max_length=20)),
+                ('params', models.JSONField(blank=True, default=dict)),
+                ('orders_processed', models.PositiveBigIntegerField(default=0)),
+                ('duration_seconds', models.FloatField(blank=True, null=True)),
+                ('report', models.JSONField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'SyncRun',
+                'ordering': ['-started_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations
+from django.db.models import Q, Sum
+
+
+STATUSES = ["initial", "process", "sent", "done", "cancel", "rejected"]
+
+
+def rebuild_fact_analytics(apps, schema_editor):
+    # simple_analysis() could add the same sales twice, leaving several rows
+    # per date; rebuild one row per date straight from FactSales.
+    FactSales = apps.get_model('analytics', 'FactSales')
+    FactAnalytics = apps.get_model('analytics', 'FactAnalytics')
+    FactAnalytics.objects.all().delete()
+    totals = (
+        FactSales.objects.values('date_id')
+        .annotate(
+            total_order_quantity=Sum('total_price_after_discount', default=0),
+            **{
+                f"{status}_order_quantity": Sum('total_price_after_discount', filter=Q(status=status), default=0)
+                for status in STATUSES
+            }
+        )
+        .order_by('date_id')
+    )
+    FactAnalytics.objects.bulk_create([FactAnalytics(**row) for row in totals], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0018_syncrun'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_fact_analytics, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0019_rebuild_factanalytics'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='factanalytics',
+            constraint=models.UniqueConstraint(fields=('date',), name='factanalytics_date_uniq'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:10
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0020_factanalytics_date_uniq'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='factsales',
+            name='exclude_from_analytics',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0021_remove_factsales_exclude_from_analytics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='syncstate',
+            name='version',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
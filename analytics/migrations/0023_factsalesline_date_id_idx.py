@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0022_syncstate_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='factsalesline',
+            index=models.Index(fields=['date', 'id'], name='factsalesline_date_id_idx'),
+        ),
+    ]
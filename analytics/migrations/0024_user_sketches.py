@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0023_factsalesline_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyProductUserSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_id', models.IntegerField()),
+                ('registers', models.BinaryField()),
+                ('date', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='analytics.dimdate')),
+            ],
+            options={
+                'db_table': 'DailyProductUserSketch',
+                'constraints': [models.UniqueConstraint(fields=('product_id', 'date'), name='dailyproductusersketch_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailySupplierUserSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('supplier', models.CharField(blank=True, max_length=255, null=True)),
+                ('registers', models.BinaryField()),
+                ('date', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='analytics.dimdate')),
+            ],
+            options={
+                'db_table': 'DailySupplierUserSketch',
+                'constraints': [models.UniqueConstraint(fields=('supplier', 'date'), name='dailysupplierusersketch_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:41
+
+import analytics.models
+import django.db.models.deletion
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0024_user_sketches'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='factsalesline',
+            name='product_versions',
+            field=analytics.models.ProductVersions(from_fields=['product_id'], on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='analytics.dimproductbase', to_fields=['product_id']),
+        ),
+    ]
@@ -0,0 +1,51 @@
+from itertools import groupby
+
+import numpy as np
+from django.db import migrations
+
+from analytics import hll
+
+
+def backfill_user_sketches(apps, schema_editor):
+    # Sketches only cover days synced after 0024, so earlier days read as
+    # zero users; build every product and supplier sketch from the lines.
+    # Lines stream in (day, product) order, so one day is held at a time.
+    FactSalesLine = apps.get_model('analytics', 'FactSalesLine')
+    DimProductBase = apps.get_model('analytics', 'DimProductBase')
+    DailyProductUserSketch = apps.get_model('analytics', 'DailyProductUserSketch')
+    DailySupplierUserSketch = apps.get_model('analytics', 'DailySupplierUserSketch')
+    DailyProductUserSketch.objects.all().delete()
+    DailySupplierUserSketch.objects.all().delete()
+
+    supplier_of = dict(DimProductBase.objects.filter(is_current=True).values_list('product_id', 'supplier'))
+    lines = (
+        FactSalesLine.objects.order_by('date_id', 'product_id')
+        .values_list('date_id', 'product_id', 'user_id')
+        .iterator(chunk_size=5000)
+    )
+    for date_id, day_lines in groupby(lines, key=lambda line: line[0]):
+        product_sketches, supplier_sketches = [], {}
+        for product_id, product_lines in groupby(day_lines, key=lambda line: line[1]):
+            registers = hll.sketch([user_id for _, _, user_id in product_lines])
+            product_sketches.append(
+                DailyProductUserSketch(date_id=date_id, product_id=product_id, registers=hll.to_bytes(registers))
+            )
+            if product_id in supplier_of:
+                merged = supplier_sketches.setdefault(supplier_of[product_id], hll.empty())
+                np.maximum(merged, registers, out=merged)
+        DailyProductUserSketch.objects.bulk_create(product_sketches, batch_size=1000)
+        DailySupplierUserSketch.objects.bulk_create([
+            DailySupplierUserSketch(date_id=date_id, supplier=supplier, registers=hll.to_bytes(registers))
+            for supplier, registers in supplier_sketches.items()
+        ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0025_factsalesline_product_versions'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_user_sketches, migrations.RunPython.noop),
+    ]
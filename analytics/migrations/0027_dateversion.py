@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0026_backfill_user_sketches'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DateVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(db_index=True)),
+                ('date', models.OneToOneField(on_delete=django.db.models.deletion.PROTECT, to='analytics.dimdate')),
+            ],
+            options={
+                'db_table': 'DateVersion',
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+from importlib import import_module
+
+from django.db import migrations
+
+
+def rewrite_user_sketches(apps, schema_editor):
+    # Stored sketches gained a leading format byte; rebuilding them from the
+    # lines writes every row in the new encoding.
+    import_module('analytics.migrations.0026_backfill_user_sketches').backfill_user_sketches(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0027_dateversion'),
+    ]
+
+    operations = [
+        migrations.RunPython(rewrite_user_sketches, migrations.RunPython.noop),
+    ]
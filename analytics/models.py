@@ -1,5 +1,9 @@
+import uuid
+
 from django.db import models
+from django.utils import timezone
 from orders.constants import ORDER_STATUS_CHOICES
+from .constants import SYNC_JOB_KIND_CHOICES, SYNC_JOB_STATUS_CHOICES, SYNC_RUN_MODE_CHOICES
 
 # DIMENSIONS TABLES
 
@@ -50,9 +54,22 @@ class DimProductBase(models.Model):
     category_level_3 = models.CharField(max_length=255, blank=True, null=True)
     created_at = models.DateTimeField()
     updated_at = models.DateTimeField()
+    # Type-2 SCD: a new row is written whenever row_hash (over the tracked
+    # attributes) changes; exactly one version per product is current.
+    row_hash = models.CharField(max_length=32, blank=True, default="")
+    valid_from = models.DateTimeField(default=timezone.now)
+    valid_to = models.DateTimeField(null=True, blank=True)
+    is_current = models.BooleanField(default=True)
 
     class Meta:
         db_table = "DimProductBase"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product_id"],
+                condition=models.Q(is_current=True),
+                name="dimproductbase_current_product_uniq",
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -65,11 +82,6 @@ class DimVariantOrder(models.Model):
     size = models.CharField(max_length=50, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    quantity = models.PositiveIntegerField(default=1)
-    unit_price = models.PositiveIntegerField(help_text="Price of one unit")
-    discount_percent = models.PositiveSmallIntegerField(default=0, help_text="0-100%")
-    total_price = models.PositiveIntegerField(editable=False, null=True)
-    total_after_discount = models.PositiveIntegerField(editable=False, null=True)
 
     class Meta:
         db_table = "DimVariantOrder"
@@ -80,14 +92,12 @@ class DimVariantOrder(models.Model):
 # FACT TABLES
 
 class FactSales(models.Model):
-    order_id = models.IntegerField(null=True)
+    order_id = models.IntegerField(null=True, unique=True)
     date = models.ForeignKey(DimDate, on_delete=models.PROTECT)
-    variants = models.ManyToManyField(DimVariantOrder)
     user = models.ForeignKey(DimUser, on_delete=models.PROTECT)
     status = models.CharField(max_length=20, choices=ORDER_STATUS_CHOICES, null=True)
     total_price = models.PositiveIntegerField(null=True)
     total_price_after_discount = models.PositiveIntegerField(null=True)
-    exclude_from_analytics = models.BooleanField(default=False)
 
 
     class Meta:
@@ -95,45 +105,74 @@ class FactSales(models.Model):
 
     def __str__(self):
         return f"Order: Date:{self.date} - User:{self.user}"
-    
+
     def save(self, *args, **kwargs):
-        if self.exclude_from_analytics:
-            is_update = self.pk is not None
-
-            old_total = 0
-            old_status = None
-            old_date_id = None
-
-            if is_update:
-                old = FactSales.objects.get(pk=self.pk)
-                old_total = old.total_price_after_discount or 0
-                old_status = (old.status or "").lower()
-                old_date_id = old.date_id
-
-                try:
-                    fa_old = FactAnalytics.objects.get(date_id=old_date_id)
-                    fa_old.total_order_quantity -= old_total
-
-                    if old_status == "initial":
-                        fa_old.initial_order_quantity -= old_total
-                    elif old_status == "process":
-                        fa_old.process_order_quantity -= old_total
-                    elif old_status == "sent":
-                        fa_old.sent_order_quantity -= old_total
-                    elif old_status == "done":
-                        fa_old.done_order_quantity -= old_total
-                    elif old_status == "cancel":
-                        fa_old.cancel_order_quantity -= old_total
-                    elif old_status == "rejected":
-                        fa_old.rejected_order_quantity -= old_total
-
-                    self.exclude_from_analytics = False
-                    fa_old.save()
-                except FactAnalytics.DoesNotExist:
-                    pass
+        # Keep FactAnalytics in step with single-row edits: the old amount is
+        # taken back from its day/status and the new one added as signed deltas.
+        from .aggregates import apply_fact_analytics_deltas
+        from .result_cache import bump_warehouse_version
+
+        old = None
+        if self.pk is not None:
+            old = FactSales.objects.filter(pk=self.pk).values('date_id', 'status', 'total_price_after_discount').first()
 
         super().save(*args, **kwargs)
 
+        changes = [(self.date_id, self.status, self.total_price_after_discount or 0)]
+        if old:
+            changes.append((old['date_id'], old['status'], -(old['total_price_after_discount'] or 0)))
+        apply_fact_analytics_deltas(changes)
+        bump_warehouse_version({date_id for date_id, _, _ in changes})
+
+    def delete(self, *args, **kwargs):
+        from .aggregates import apply_fact_analytics_deltas
+        from .result_cache import bump_warehouse_version
+
+        deleted = super().delete(*args, **kwargs)
+        apply_fact_analytics_deltas([(self.date_id, self.status, -(self.total_price_after_discount or 0))])
+        bump_warehouse_version({self.date_id})
+        return deleted
+
+class ProductVersions(models.ForeignObject):
+    """
+    Joins a row's ``product_id`` to every ``DimProductBase`` version of that
+    product. Only for queries: narrow it to one version with a
+    ``FilteredRelation`` (e.g. on ``is_current``) before reading through it.
+    """
+    requires_unique_target = False
+
+class FactSalesLine(models.Model):
+    # One row per order line. product_id is the source product id, so product
+    # rollups group on this table alone; product_version is the DimProductBase
+    # version that was current when the line was loaded.
+    order_item_id = models.IntegerField(unique=True)
+    order_id = models.IntegerField(db_index=True)
+    date = models.ForeignKey(DimDate, on_delete=models.PROTECT)
+    user = models.ForeignKey(DimUser, on_delete=models.PROTECT)
+    product_id = models.IntegerField()
+    product_version = models.ForeignKey(DimProductBase, on_delete=models.PROTECT)
+    product_versions = ProductVersions(
+        DimProductBase, from_fields=["product_id"], to_fields=["product_id"],
+        on_delete=models.DO_NOTHING, related_name="+",
+    )
+    variant = models.ForeignKey(DimVariantOrder, on_delete=models.PROTECT)
+    status = models.CharField(max_length=20, choices=ORDER_STATUS_CHOICES, null=True)
+    quantity = models.PositiveIntegerField(default=1)
+    unit_price = models.PositiveIntegerField(help_text="Price of one unit")
+    discount_percent = models.PositiveSmallIntegerField(default=0, help_text="0-100%")
+    total_price = models.PositiveIntegerField()
+    total_after_discount = models.PositiveIntegerField()
+
+    class Meta:
+        db_table = "FactSalesLine"
+        indexes = [
+            models.Index(fields=["product_id", "date"], name="factsalesline_product_date_idx"),
+            models.Index(fields=["date", "id"], name="factsalesline_date_id_idx"),
+        ]
+
+    def __str__(self):
+        return f"Order #{self.order_id} line {self.order_item_id}"
+
 class FactAnalytics(models.Model):
     date = models.ForeignKey(DimDate, on_delete=models.PROTECT)
     total_order_quantity = models.IntegerField(default=0)
@@ -146,7 +185,118 @@ class FactAnalytics(models.Model):
 
     class Meta:
         db_table = "FactAnalytics"
+        constraints = [
+            models.UniqueConstraint(fields=["date"], name="factanalytics_date_uniq"),
+        ]
 
     def __str__(self):
         return f"Analytics for {self.date.full_date} (Total: {self.total_order_quantity})"
-    
\ No newline at end of file
+
+# SKETCHES
+
+class DailyProductUserSketch(models.Model):
+    # HyperLogLog registers (analytics.hll) of the users who bought a product on a day.
+    date = models.ForeignKey(DimDate, on_delete=models.PROTECT)
+    product_id = models.IntegerField()
+    registers = models.BinaryField()
+
+    class Meta:
+        db_table = "DailyProductUserSketch"
+        constraints = [
+            models.UniqueConstraint(fields=["product_id", "date"], name="dailyproductusersketch_uniq"),
+        ]
+
+    def __str__(self):
+        return f"Users of product {self.product_id} on {self.date_id}"
+
+class DailySupplierUserSketch(models.Model):
+    # Same, per current supplier of the products bought on a day.
+    date = models.ForeignKey(DimDate, on_delete=models.PROTECT)
+    supplier = models.CharField(max_length=255, null=True, blank=True)
+    registers = models.BinaryField()
+
+    class Meta:
+        db_table = "DailySupplierUserSketch"
+        constraints = [
+            models.UniqueConstraint(fields=["supplier", "date"], name="dailysupplierusersketch_uniq"),
+        ]
+
+    def __str__(self):
+        return f"Users of supplier {self.supplier} on {self.date_id}"
+
+# JOBS
+
+class SyncJob(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=20, choices=SYNC_JOB_KIND_CHOICES)
+    status = models.CharField(max_length=20, choices=SYNC_JOB_STATUS_CHOICES, default="pending")
+    stage = models.CharField(max_length=50, blank=True, null=True)
+    rows_processed = models.PositiveBigIntegerField(default=0)
+    params = models.JSONField(default=dict, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "SyncJob"
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.kind} job {self.id} ({self.status})"
+
+    @property
+    def throughput(self):
+        if not self.started_at:
+            return None
+        end = self.finished_at or timezone.now()
+        elapsed = (end - self.started_at).total_seconds()
+        return round(self.rows_processed / elapsed, 2) if elapsed > 0 else None
+
+class SyncRun(models.Model):
+    mode = models.CharField(max_length=20, choices=SYNC_RUN_MODE_CHOICES)
+    status = models.CharField(max_length=20, choices=SYNC_JOB_STATUS_CHOICES, default="running")
+    params = models.JSONField(default=dict, blank=True)
+    orders_processed = models.PositiveBigIntegerField(default=0)
+    duration_seconds = models.FloatField(null=True, blank=True)
+    # Full sync report, including per-stage timings under "stages".
+    report = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, null=True)
+    started_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "SyncRun"
+        ordering = ["-started_at"]
+
+    def __str__(self):
+        return f"{self.mode} sync at {self.started_at} ({self.status})"
+
+# SYNC STATE
+
+class SyncState(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    watermark_updated_at = models.DateTimeField(null=True, blank=True)
+    watermark_id = models.BigIntegerField(default=0)
+    # Bumped whenever synced data changes; part of every result cache key.
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "SyncState"
+
+    def __str__(self):
+        return f"{self.name} @ ({self.watermark_updated_at}, {self.watermark_id})"
+
+class DateVersion(models.Model):
+    # Warehouse version at which the facts of a day last changed, so readers
+    # holding an older version know which days to reread.
+    date = models.OneToOneField(DimDate, on_delete=models.PROTECT)
+    version = models.BigIntegerField(db_index=True)
+
+    class Meta:
+        db_table = "DateVersion"
+
+    def __str__(self):
+        return f"{self.date_id} @ v{self.version}"
@@ -0,0 +1,80 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.db import connection, connections
+
+from orders.models import Order
+from .sync_orders_analytics import _empty_report, _merge_report, sync_orders_analytics
+
+
+SYNC_MODE_PARALLEL = "parallel"
+PARTITION_BY_ID = "id"
+PARTITION_BY_DAY = "day"
+
+
+def _id_partitions(count):
+    # Equal-sized id ranges over the unsynced backlog.
+    order_table = connection.ops.quote_name(Order._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT MIN(id), MAX(id)
+            FROM (
+                SELECT id, NTILE(%s) OVER (ORDER BY id) AS bucket
+                FROM {order_table}
+                WHERE NOT is_synced_analytics
+            ) buckets
+            GROUP BY bucket
+            ORDER BY bucket
+            """,
+            [count],
+        )
+        return [{"id__gte": low, "id__lte": high} for low, high in cursor.fetchall()]
+
+def _day_partitions():
+    days = Order.objects.filter(is_synced_analytics=False).dates("created_at", "day")
+    return [{"created_at__date": day} for day in days]
+
+def get_partitions(partition_by, count):
+    if partition_by == PARTITION_BY_DAY:
+        return _day_partitions()
+    if partition_by == PARTITION_BY_ID:
+        return _id_partitions(count)
+    raise ValueError(f"Unknown partition_by '{partition_by}', expected '{PARTITION_BY_ID}' or '{PARTITION_BY_DAY}'.")
+
+def _sync_partition(filters, batch_size):
+    # Runs in a forked worker, which opens its own database connection lazily.
+    try:
+        return sync_orders_analytics(batch_size=batch_size, filters=filters)
+    finally:
+        connections.close_all()
+
+def sync_orders_analytics_parallel(workers=None, partition_by=PARTITION_BY_ID, batch_size=None, progress=None):
+    # Forking needs a process that may have children: the SyncOrdersAnalytics
+    # command, not a Celery prefork worker (daemonic) or a web server.
+    if multiprocessing.current_process().daemon:
+        raise RuntimeError("The parallel sync forks worker processes; run it from the SyncOrdersAnalytics command.")
+    workers = workers or settings.ANALYTICS_SYNC_WORKERS
+    start = time.perf_counter()
+    partitions = get_partitions(partition_by, workers)
+
+    report = _empty_report()
+    report["partitions"] = len(partitions)
+    if not partitions:
+        return report
+
+    # Forked children must not share the parent's connection sockets.
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork")) as pool:
+        futures = [pool.submit(_sync_partition, filters, batch_size) for filters in partitions]
+        for future in futures:
+            _merge_report(report, future.result())
+            if progress:
+                progress("partitions", report["orders"])
+    # Stage timings are summed across workers; "seconds" is the wall time.
+    report["seconds"] = round(time.perf_counter() - start, 4)
+    if progress:
+        progress("done", report["orders"])
+    return report
@@ -0,0 +1,300 @@
+import threading
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import connection
+from django.utils.dateparse import parse_date
+
+from .models import FactSalesLine
+from .result_cache import LocMemResultCache
+
+
+class QueryError(ValueError):
+    """A malformed slice-and-dice request (answered with 400)."""
+
+
+def _to_int(value):
+    return int(value)
+
+def _to_bool(value):
+    if value.lower() in ("true", "1", "yes"):
+        return True
+    if value.lower() in ("false", "0", "no"):
+        return False
+    raise ValueError(value)
+
+def _to_date(value):
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError(value)
+    return parsed
+
+# Dimension -> (FactSalesLine relation or None for the fact row, field, parser).
+# Product attributes come from the product's current version (CURRENT_PRODUCT),
+# like every other analytics endpoint; the ``*_at_sale`` dimensions read the
+# version that was current when the line was sold (product_version).
+CURRENT_PRODUCT = "current_product"
+DIMENSIONS = {
+    "date": ("date", "full_date", _to_date),
+    "jalali_date": ("date", "jalali_date", str),
+    "day_of_week": ("date", "day_of_week", str),
+    "month_name": ("date", "month_name", str),
+    "quarter": ("date", "quarter", _to_int),
+    "is_holiday": ("date", "is_holiday", _to_bool),
+    "city": ("user", "city", str),
+    "gender": ("user", "gender", str),
+    "age_range": ("user", "age_range", str),
+    "product_id": (None, "product_id", _to_int),
+    "brand": (CURRENT_PRODUCT, "brand", str),
+    "supplier": (CURRENT_PRODUCT, "supplier", str),
+    "category_level_1": (CURRENT_PRODUCT, "category_level_1", str),
+    "category_level_2": (CURRENT_PRODUCT, "category_level_2", str),
+    "category_level_3": (CURRENT_PRODUCT, "category_level_3", str),
+    "brand_at_sale": ("product_version", "brand", str),
+    "supplier_at_sale": ("product_version", "supplier", str),
+    "category_level_1_at_sale": ("product_version", "category_level_1", str),
+    "category_level_2_at_sale": ("product_version", "category_level_2", str),
+    "category_level_3_at_sale": ("product_version", "category_level_3", str),
+    "status": (None, "status", str),
+}
+
+# Measure -> (aggregate, FactSalesLine field or "*", distinct).
+MEASURES = {
+    "revenue": ("SUM", "total_after_discount", False),
+    "gross_revenue": ("SUM", "total_price", False),
+    "quantity": ("SUM", "quantity", False),
+    "lines": ("COUNT", "*", False),
+    "orders": ("COUNT", "order_id", True),
+    "distinct_users": ("COUNT", "user", True),
+}
+
+RESERVED_PARAMS = {"dimensions", "measures", "order_by", "limit", "offset", "start", "end", "format"}
+
+
+@dataclass(frozen=True)
+class SliceQuery:
+    dimensions: tuple
+    measures: tuple
+    filters: tuple  # ((dimension, [values]), ...) sorted by dimension
+    start: object
+    end: object
+    order_by: tuple  # ((name, descending), ...)
+    limit: int
+    offset: int
+
+    @property
+    def shape(self):
+        # Everything that changes the SQL text; values only change parameters.
+        return (
+            self.dimensions, self.measures, tuple(name for name, _ in self.filters),
+            self.start is not None, self.end is not None, self.order_by,
+        )
+
+    @property
+    def params(self):
+        params = [values for _, values in self.filters]
+        params += [value for value in (self.start, self.end) if value is not None]
+        return params + [self.limit, self.offset]
+
+
+def _names(value, known, kind):
+    names = []
+    for name in (part.strip() for part in value.split(",")):
+        if not name:
+            continue
+        if name not in known:
+            raise QueryError(f"Unknown {kind} '{name}', expected one of: {', '.join(known)}.")
+        if name not in names:
+            names.append(name)
+    return tuple(names)
+
+def _parse_value(name, value):
+    try:
+        return DIMENSIONS[name][2](value)
+    except ValueError:
+        raise QueryError(f"Invalid value '{value}' for '{name}'.")
+
+def _parse_count(params, name, default, maximum=None):
+    try:
+        value = int(params.get(name, default))
+    except ValueError:
+        raise QueryError(f"'{name}' must be an integer.")
+    if value < 0 or (maximum is not None and value > maximum):
+        raise QueryError(f"'{name}' must be between 0 and {maximum}." if maximum else f"'{name}' must not be negative.")
+    return value
+
+def parse_query(params):
+    """
+    Normalize query parameters into a ``SliceQuery``::
+
+        ?dimensions=month_name,supplier&measures=revenue,orders
+        &status=done,sent&start=2026-01-01&order_by=-revenue&limit=20
+
+    Any dimension is also a filter taking comma-separated values; ``start`` /
+    ``end`` bound the sale date. ``order_by`` defaults to the first measure,
+    descending; the remaining dimensions break ties so pages are stable.
+    """
+    unknown = sorted(set(params) - RESERVED_PARAMS - DIMENSIONS.keys())
+    if unknown:
+        raise QueryError(f"Unknown parameter(s): {', '.join(unknown)}.")
+    dimensions = _names(params.get("dimensions", ""), DIMENSIONS, "dimension")
+    measures = _names(params.get("measures", ""), MEASURES, "measure")
+    if not measures:
+        raise QueryError(f"At least one measure is required: {', '.join(MEASURES)}.")
+
+    filters = []
+    for name in sorted(DIMENSIONS.keys() & set(params)):
+        values = sorted({_parse_value(name, v.strip()) for v in params.get(name).split(",") if v.strip()})
+        if not values:
+            raise QueryError(f"'{name}' needs at least one value.")
+        filters.append((name, values))
+
+    order_by = []
+    for key in (part.strip() for part in params.get("order_by", "").split(",")):
+        if not key:
+            continue
+        name = key.lstrip("-")
+        if name not in dimensions and name not in measures:
+            raise QueryError(f"Cannot order by '{name}': it is not a selected dimension or measure.")
+        order_by.append((name, key.startswith("-")))
+    if not order_by:
+        order_by.append((measures[0], True))
+    ordered = {name for name, _ in order_by}
+    order_by += [(name, False) for name in dimensions if name not in ordered]
+
+    return SliceQuery(
+        dimensions=dimensions,
+        measures=measures,
+        filters=tuple(filters),
+        start=_parse_value("date", params["start"]) if params.get("start") else None,
+        end=_parse_value("date", params["end"]) if params.get("end") else None,
+        order_by=tuple(order_by),
+        limit=_parse_count(params, "limit", 100, maximum=settings.ANALYTICS_QUERY_MAX_LIMIT),
+        offset=_parse_count(params, "offset", 0),
+    )
+
+
+def compile_query(shape):
+    """
+    SQL for a ``SliceQuery.shape``: one statement that filters the fact lines,
+    joins only the dimensions it touches, groups, orders and pages, and also
+    returns the number of groups. Filters bind whole value lists
+    (``= ANY(%s)``), so the text only depends on the shape.
+    """
+    dimensions, measures, filter_names, has_start, has_end, order_by = shape
+    quote = connection.ops.quote_name
+    fact = FactSalesLine._meta
+    joins = {}
+
+    def column(relation, field):
+        if relation is None:
+            return f"f.{quote(fact.get_field(field).column)}"
+        if relation == CURRENT_PRODUCT:
+            # At most one current version per product; the LEFT JOIN keeps
+            # lines of a product without one, under NULL attributes.
+            versions = fact.get_field("product_versions")
+            target = versions.related_model._meta
+            (source, remote), = versions.related_fields
+            joins.setdefault(relation, (
+                f"LEFT JOIN {quote(target.db_table)} {quote(relation)} "
+                f"ON {quote(relation)}.{quote(remote.column)} = f.{quote(source.column)} "
+                f"AND {quote(relation)}.{quote(target.get_field('is_current').column)}"
+            ))
+            return f"{quote(relation)}.{quote(target.get_field(field).column)}"
+        foreign_key = fact.get_field(relation)
+        target = foreign_key.related_model._meta
+        joins.setdefault(relation, (
+            f"JOIN {quote(target.db_table)} {quote(relation)} "
+            f"ON {quote(relation)}.{quote(target.pk.column)} = f.{quote(foreign_key.column)}"
+        ))
+        return f"{quote(relation)}.{quote(target.get_field(field).column)}"
+
+    def measure(name):
+        aggregate, field, distinct = MEASURES[name]
+        argument = "*" if field == "*" else column(None, field)
+        return f"{aggregate}({'DISTINCT ' if distinct else ''}{argument})"
+
+    select = [f"{column(*DIMENSIONS[name][:2])} AS {quote(name)}" for name in dimensions]
+    select += [f"{measure(name)} AS {quote(name)}" for name in measures]
+    where = [f"{column(*DIMENSIONS[name][:2])} = ANY(%s)" for name in filter_names]
+    if has_start:
+        where.append(f"{column('date', 'full_date')} >= %s")
+    if has_end:
+        where.append(f"{column('date', 'full_date')} <= %s")
+
+    grouped = f"SELECT {', '.join(select)} FROM {quote(fact.db_table)} f"
+    if joins:
+        grouped += " " + " ".join(joins.values())
+    if where:
+        grouped += " WHERE " + " AND ".join(where)
+    if dimensions:
+        grouped += " GROUP BY " + ", ".join(str(position) for position in range(1, len(dimensions) + 1))
+    else:
+        # An aggregate without GROUP BY returns one row even over no lines.
+        grouped += " HAVING COUNT(*) > 0"
+    order = ", ".join(f"{quote(name)} {'DESC' if descending else 'ASC'}" for name, descending in order_by)
+
+    # The LEFT JOIN keeps the count row when the page is past the last group.
+    return (
+        f"WITH grouped AS ({grouped}) "
+        f"SELECT total.groups, page.* FROM (SELECT COUNT(*) AS groups FROM grouped) total "
+        f"LEFT JOIN LATERAL (SELECT * FROM grouped ORDER BY {order} LIMIT %s OFFSET %s) page ON TRUE"
+    )
+
+
+class QueryPlanCache:
+    """Compiled SQL per request shape, in a per-process LRU."""
+
+    def __init__(self):
+        self._plans = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def plans(self):
+        with self._lock:
+            if self._plans is None:
+                self._plans = LocMemResultCache(settings.ANALYTICS_QUERY_PLAN_CACHE_SIZE)
+        return self._plans
+
+    def get(self, shape):
+        sql = self.plans.get(shape)
+        if sql is not None:
+            self.hits += 1
+            return sql
+        self.misses += 1
+        sql = compile_query(shape)
+        self.plans.set(shape, sql)
+        return sql
+
+    def clear(self):
+        self.plans.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": self.plans.size(), "evictions": self.plans.evictions}
+
+
+query_plans = QueryPlanCache()
+
+
+def run_query(query):
+    """``{"count", "dimensions", "measures", "results"}`` of a ``SliceQuery``."""
+    sql = query_plans.get(query.shape)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, query.params)
+        rows = cursor.fetchall()
+
+    names = query.dimensions + query.measures
+    # Measures of a real group are never NULL (they aggregate NOT NULL
+    # columns), so a NULL first measure is the empty page's placeholder row.
+    first_measure = 1 + len(query.dimensions)
+    results = [dict(zip(names, row[1:])) for row in rows if row[first_measure] is not None]
+    return {
+        "count": rows[0][0] if rows else 0,
+        "dimensions": list(query.dimensions),
+        "measures": list(query.measures),
+        "results": results,
+    }
@@ -0,0 +1,117 @@
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import DimDate, DimUser, DimVariantOrder
+
+
+class DimensionKeyResolver:
+    """
+    Maps a dimension's natural key to its surrogate id through a bounded LRU
+    cache that lives for the whole process, so consecutive batches and sync
+    runs only go to the database for keys they have not seen recently.
+
+    Missing rows are inserted with ``INSERT ... ON CONFLICT (unique_fields)
+    DO UPDATE ... RETURNING id``: new ids come straight back from the insert,
+    and rows a concurrent worker inserted first resolve in the same statement.
+    """
+
+    def __init__(self, model, key_field, unique_fields=None, max_size=None):
+        self.model = model
+        self.key_field = key_field
+        self.unique_fields = unique_fields or [key_field]
+        self.max_size = max_size or settings.ANALYTICS_DIMENSION_CACHE_SIZE
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+
+    @property
+    def name(self):
+        return self.model.__name__
+
+    def resolve(self, keys, build_row, stats=None):
+        """
+        Return ``{key: id}`` for ``keys``. ``build_row(key)`` returns the
+        unsaved row to insert for keys that do not exist yet. ``stats`` (a
+        report entry) gets created/existing and cache hit/miss counts added.
+        """
+        ids = {}
+        missing = []
+        for key in keys:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                ids[key] = self._cache[key]
+            else:
+                missing.append(key)
+        hits = len(ids)
+        self.hits += hits
+        self.misses += len(missing)
+
+        created = {}
+        if missing:
+            found = dict(
+                self.model.objects.filter(**{f"{self.key_field}__in": missing})
+                .values_list(self.key_field, 'id')
+            )
+            ids.update(found)
+
+            # Insert in key order so concurrent workers lock rows in the same order.
+            new_rows = [build_row(key) for key in sorted(set(missing) - found.keys())]
+            if new_rows:
+                self.model.objects.bulk_create(
+                    new_rows,
+                    update_conflicts=True,
+                    unique_fields=self.unique_fields,
+                    update_fields=self.unique_fields,
+                )
+                created = {getattr(row, self.key_field): row.pk for row in new_rows}
+                ids.update(created)
+            # Only cache ids once the transaction commits: rows found may have
+            # been inserted earlier in it and vanish on a rollback too.
+            resolved = {**found, **created}
+            transaction.on_commit(lambda: self.remember(resolved))
+
+        if stats is not None:
+            stats["created"] += len(created)
+            stats["existing"] += len(ids) - len(created)
+            stats["cache_hits"] += hits
+            stats["cache_misses"] += len(missing)
+        return ids
+
+    def remember(self, ids):
+        self._cache.update(ids)
+        for key in ids:
+            self._cache.move_to_end(key)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+
+    def get(self, key):
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        return None
+
+    def clear(self):
+        self._cache.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {"size": len(self._cache), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
+
+
+date_resolver = DimensionKeyResolver(DimDate, 'full_date')
+user_resolver = DimensionKeyResolver(DimUser, 'user_id')
+# variant_id maps 1:1 to the unique variant_sku, which is the conflict target.
+variant_resolver = DimensionKeyResolver(DimVariantOrder, 'variant_id', unique_fields=['variant_sku'])
+
+RESOLVERS = [date_resolver, user_resolver, variant_resolver]
+
+
+def resolver_stats():
+    return {resolver.name: resolver.stats() for resolver in RESOLVERS}
+
+def clear_resolver_caches():
+    for resolver in RESOLVERS:
+        resolver.clear()
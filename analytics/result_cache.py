@@ -0,0 +1,212 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import DateVersion, SyncState
+
+
+WAREHOUSE_STATE_NAME = "warehouse"
+
+
+def get_warehouse_state():
+    # (version, time of the last change) of the synced data.
+    state = SyncState.objects.filter(name=WAREHOUSE_STATE_NAME).values_list('version', 'updated_at').first()
+    return state or (0, None)
+
+def get_warehouse_version():
+    return get_warehouse_state()[0]
+
+class _VersionBump:
+    # The pending bump of one transaction, with the days whose facts it
+    # changed. A bump that already ran (e.g. executed by a test) covers no
+    # new writes.
+    done = False
+
+    def __init__(self):
+        self.date_ids = set()
+
+    def __call__(self):
+        self.done = True
+        with transaction.atomic():
+            SyncState.objects.get_or_create(name=WAREHOUSE_STATE_NAME)
+            SyncState.objects.filter(name=WAREHOUSE_STATE_NAME).update(version=F('version') + 1, updated_at=timezone.now())
+            if self.date_ids:
+                version = get_warehouse_version()
+                DateVersion.objects.bulk_create(
+                    [DateVersion(date_id=date_id, version=version) for date_id in sorted(self.date_ids)],
+                    update_conflicts=True, unique_fields=['date'], update_fields=['version'], batch_size=1000,
+                )
+
+def bump_warehouse_version(date_ids=()):
+    """
+    Move the warehouse version once the writer's transaction commits, and
+    record it as the version of ``date_ids`` (the days whose facts the
+    transaction changed). Every bump of one transaction shares a single
+    pending callback, so a transaction saving many facts writes the
+    SyncState row once.
+
+    Readers key results by the version they read before computing, so a
+    result computed between the commit and the bump is only ever stored
+    under the old version.
+    """
+    date_ids = {date_id for date_id in date_ids if date_id is not None}
+    connection = transaction.get_connection()
+    for _, func, _ in connection.run_on_commit:
+        if isinstance(func, _VersionBump) and not func.done:
+            func.date_ids |= date_ids
+            return
+    bump = _VersionBump()
+    bump.date_ids |= date_ids
+    transaction.on_commit(bump)
+
+def get_changed_date_ids(since_version):
+    # Days whose facts changed after warehouse version ``since_version``.
+    return set(DateVersion.objects.filter(version__gt=since_version).values_list('date_id', flat=True))
+
+
+def request_fingerprint(request, ignore=()):
+    # Parameter order and repeated values do not change the fingerprint;
+    # parameters named in ``ignore`` are left out.
+    params = sorted((name, sorted(request.query_params.getlist(name))) for name in request.query_params if name not in ignore)
+    return hashlib.md5(repr((request.get_host(), params)).encode()).hexdigest()
+
+
+class LocMemResultCache:
+    """Per-process LRU dict bounded to ``max_entries`` results."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def size(self):
+        return len(self._entries)
+
+
+class DjangoResultCache:
+    """
+    Stores results in a Django cache; its own MAX_ENTRIES bounds the size.
+    The alias may be shared with the rest of the project, so keys carry a
+    generation kept in the cache itself and ``clear()`` bumps it instead of
+    wiping the alias; entries of old generations expire with their timeout.
+    """
+
+    GENERATION_KEY = "analytics:result-cache:generation"
+
+    def __init__(self, alias, timeout):
+        self.cache = caches[alias]
+        self.timeout = timeout
+        self.evictions = None
+
+    def _generation(self):
+        generation = self.cache.get(self.GENERATION_KEY)
+        if generation is None:
+            # Seeded from the clock so an evicted counter never comes back
+            # to a generation that was cleared before.
+            self.cache.add(self.GENERATION_KEY, time.time_ns(), None)
+            generation = self.cache.get(self.GENERATION_KEY)
+        return generation
+
+    def _key(self, key):
+        return f"{key}:g{self._generation()}"
+
+    def get(self, key):
+        return self.cache.get(self._key(key))
+
+    def set(self, key, value):
+        self.cache.set(self._key(key), value, self.timeout)
+
+    def clear(self):
+        try:
+            self.cache.incr(self.GENERATION_KEY)
+        except ValueError:
+            self.cache.add(self.GENERATION_KEY, time.time_ns(), None)
+
+    def size(self):
+        return None
+
+
+class ResultCache:
+    def __init__(self):
+        self._backend = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            if settings.ANALYTICS_RESULT_CACHE_BACKEND == "django":
+                self._backend = DjangoResultCache(settings.ANALYTICS_RESULT_CACHE_ALIAS, settings.ANALYTICS_RESULT_CACHE_TIMEOUT)
+            elif settings.ANALYTICS_RESULT_CACHE_BACKEND == "locmem":
+                self._backend = LocMemResultCache(settings.ANALYTICS_RESULT_CACHE_SIZE)
+            else:
+                raise ValueError(f"Unknown ANALYTICS_RESULT_CACHE_BACKEND '{settings.ANALYTICS_RESULT_CACHE_BACKEND}'.")
+        return self._backend
+
+    def make_key(self, endpoint, request, version, ignore=()):
+        return f"analytics:{endpoint}:v{version}:{request_fingerprint(request, ignore)}"
+
+    def get_or_compute(self, endpoint, request, compute, version=None, ignore=()):
+        """
+        Return ``(data, hit)`` for ``endpoint`` under the request's filters and
+        the warehouse ``version`` (the current one by default), calling
+        ``compute()`` on a miss. Requests differing only in the ``ignore``
+        parameters share one entry.
+        """
+        if version is None:
+            version = get_warehouse_version()
+        key = self.make_key(endpoint, request, version, ignore)
+        data = self.backend.get(key)
+        if data is not None:
+            self.hits += 1
+            return data, True
+        self.misses += 1
+        data = compute()
+        self.backend.set(key, data)
+        return data, False
+
+    def clear(self):
+        self.backend.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": settings.ANALYTICS_RESULT_CACHE_BACKEND,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "size": self.backend.size(),
+            "evictions": self.backend.evictions,
+        }
+
+
+result_cache = ResultCache()
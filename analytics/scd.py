@@ -0,0 +1,28 @@
+import hashlib
+
+
+# Attributes whose change opens a new DimProductBase version.
+PRODUCT_TRACKED_FIELDS = (
+    "name",
+    "rating",
+    "expire_date",
+    "is_available",
+    "is_exciting",
+    "free_shipping",
+    "has_gift",
+    "is_budget_friendly",
+    "price",
+    "brand",
+    "supplier",
+    "category_level_1",
+    "category_level_2",
+    "category_level_3",
+)
+
+
+def row_hash(row, fields):
+    payload = "\x1f".join(repr(getattr(row, field)) for field in fields)
+    return hashlib.md5(payload.encode("utf-8")).hexdigest()
+
+def product_row_hash(row):
+    return row_hash(row, PRODUCT_TRACKED_FIELDS)
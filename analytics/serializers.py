@@ -1,51 +1,57 @@
 from rest_framework import serializers
-from .models import FactAnalytics
+from .models import FactAnalytics, SyncJob, SyncRun
 
-class FactSalesVariantSerializer(serializers.Serializer):
-    def to_representation(self, variant):
-        fact = self.context.get('fact')
-
-        product = getattr(variant, 'product', None)
+class FactSalesLineSerializer(serializers.Serializer):
+    def to_representation(self, line):
+        date = line.date
+        user = line.user
+        variant = line.variant
+        # The product as it was when the line was loaded.
+        product = line.product_version
 
         return {
             # DimDate fields
-            "jalali_date": fact.date.jalali_date if fact else None,
-            "day_of_week": fact.date.day_of_week if fact else None, 
-            "month_name": fact.date.month_name if fact else None,
-            "quarter": fact.date.quarter if fact else None,
-            "is_holiday": fact.date.is_holiday if fact else None,
+            "jalali_date": date.jalali_date,
+            "day_of_week": date.day_of_week,
+            "month_name": date.month_name,
+            "quarter": date.quarter,
+            "is_holiday": date.is_holiday,
 
             # DimUser fields
-            "username": fact.user.username if fact else None,
-            "gender": fact.user.gender if fact else None,
-            "city": fact.user.city if fact else None,
-            "registration_date": fact.user.registration_date if fact else None,
-            "age_range": fact.user.age_range if fact else None,
+            "username": user.username,
+            "gender": user.gender,
+            "city": user.city,
+            "registration_date": user.registration_date,
+            "age_range": user.age_range,
 
             # DimVariantOrder fields
             "color": variant.color,
             "size": variant.size,
-            "quantity": variant.quantity,
-            "unit_price": variant.unit_price,
-            "discount_percent": variant.discount_percent,
-            "total_price": variant.total_price,
-            "total_after_discount": variant.total_after_discount,
+
+            # FactSalesLine measures
+            "order_id": line.order_id,
+            "status": line.status,
+            "quantity": line.quantity,
+            "unit_price": line.unit_price,
+            "discount_percent": line.discount_percent,
+            "total_price": line.total_price,
+            "total_after_discount": line.total_after_discount,
 
             # DimProductBase fields
-            "product_id": product.product_id if product else None,
-            "product_name": product.name if product else None,
-            "rating": product.rating if product else None,
-            "expire_date": product.expire_date if product else None,
-            "is_available": product.is_available if product else None,
-            "is_exciting": product.is_exciting if product else None,
-            "free_shipping": product.free_shipping if product else None,
-            "has_gift": product.has_gift if product else None,
-            "is_budget_friendly": product.is_budget_friendly if product else None,
-            "price": product.price if product else None,
-            "brand": product.brand if product else None,
-            "category_level_1": product.category_level_1 if product else None,
-            "category_level_2": product.category_level_2 if product else None,
-            "category_level_3": product.category_level_3 if product else None,
+            "product_id": line.product_id,
+            "product_name": product.name,
+            "rating": product.rating,
+            "expire_date": product.expire_date,
+            "is_available": product.is_available,
+            "is_exciting": product.is_exciting,
+            "free_shipping": product.free_shipping,
+            "has_gift": product.has_gift,
+            "is_budget_friendly": product.is_budget_friendly,
+            "price": product.price,
+            "brand": product.brand,
+            "category_level_1": product.category_level_1,
+            "category_level_2": product.category_level_2,
+            "category_level_3": product.category_level_3,
         }
 
 class FactAnalyticsSerializer(serializers.ModelSerializer):
@@ -75,6 +81,7 @@ class FactAnalyticsSerializer(serializers.ModelSerializer):
         }
 
 class TopUserSerializer(serializers.Serializer):
+    rank = serializers.IntegerField()
     user_id = serializers.IntegerField(allow_null=True)
     username = serializers.CharField(allow_null=True)
     gender = serializers.CharField(allow_null=True)
@@ -115,4 +122,41 @@ class TopSupplierSerializer(serializers.Serializer):
     supplier = serializers.CharField(allow_null=True)
     total_quantity_sold = serializers.IntegerField()
     total_sold_price = serializers.IntegerField()
-    user_quantity = serializers.IntegerField()
\ No newline at end of file
+    user_quantity = serializers.IntegerField()
+
+class SyncJobSerializer(serializers.ModelSerializer):
+    job_id = serializers.UUIDField(source="id", read_only=True)
+    throughput = serializers.FloatField(read_only=True, allow_null=True)
+
+    class Meta:
+        model = SyncJob
+        fields = [
+            "job_id",
+            "kind",
+            "status",
+            "stage",
+            "rows_processed",
+            "throughput",
+            "params",
+            "result",
+            "error",
+            "created_at",
+            "started_at",
+            "finished_at",
+        ]
+
+class SyncRunSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SyncRun
+        fields = [
+            "id",
+            "mode",
+            "status",
+            "params",
+            "orders_processed",
+            "duration_seconds",
+            "report",
+            "error",
+            "started_at",
+            "finished_at",
+        ]
@@ -1,18 +1,19 @@
-from collections import defaultdict
-from django.db.models import Sum, F, Count
-from .models import FactSales, DimVariantOrder, DimProductBase
+from django.db import connection
+from django.db.models import Sum, Count, F, FilteredRelation, Q, Window, Case, When
+from django.db.models.functions import Coalesce, Rank
+from .models import FactSales, FactSalesLine
 
 
 def get_most_sold_products(start=None, end=None, queryset=None):
     if queryset is None:
-        queryset = FactSales.objects.all()
+        queryset = FactSalesLine.objects.all()
         if start:
             queryset = queryset.filter(date__full_date__gte=start)
         if end:
             queryset = queryset.filter(date__full_date__lte=end)
     return (
-        queryset.values("variants__product_id")
-        .annotate(total_qty=Sum("variants__quantity"))
+        queryset.values("product_id")
+        .annotate(total_qty=Sum("quantity"))
         .order_by("-total_qty")
     )
 
@@ -32,6 +33,8 @@ def get_top_users(queryset=None, start=None, end=None):
             queryset = queryset.filter(date__full_date__gte=start)
         if end:
             queryset = queryset.filter(date__full_date__lte=end)
+    # Lazy: ranking happens in SQL, so slicing the queryset (as the paginator
+    # does) only brings the requested page out of the database.
     return queryset.values(
         "user__user_id",
         "user__username",
@@ -41,54 +44,114 @@ def get_top_users(queryset=None, start=None, end=None):
         "user__age_range"
     ).annotate(
         total_orders=Count("id"),
-        total_spent=Sum("total_price_after_discount")
-    ).order_by("-total_orders")
+        total_spent=Sum("total_price_after_discount"),
+        rank=Window(Rank(), order_by=F("total_orders").desc()),
+    ).order_by("-total_orders", "user__user_id")
+
+def with_current_product(queryset):
+    # Joins each fact line to the current DimProductBase version of its
+    # product (one row per product), readable as ``current_product__<field>``.
+    return queryset.alias(
+        current_product=FilteredRelation('product_versions', condition=Q(product_versions__is_current=True))
+    )
 
-def get_top_suppliers(start=None, end=None, queryset=None):
+def get_top_suppliers(start=None, end=None, queryset=None, distinct_users=True):
     if queryset is None:
-        queryset = FactSales.objects.all()
+        queryset = FactSalesLine.objects.all()
         if start:
             queryset = queryset.filter(date__full_date__gte=start)
         if end:
             queryset = queryset.filter(date__full_date__lte=end)
 
-    # Get all variant IDs in the filtered FactSales
-    variant_ids = DimVariantOrder.objects.filter(factsales__in=queryset).values_list('id', flat=True)
+    # One GROUP BY over the lines keyed by each product's current supplier;
+    # users are counted once per supplier however many of its products they bought.
+    # Without ``distinct_users`` the COUNT(DISTINCT) is left to the caller
+    # (e.g. merged from the supplier sketches).
+    measures = {'total_quantity_sold': Sum('quantity'), 'total_sold_price': Sum('total_price')}
+    if distinct_users:
+        measures['user_quantity'] = Count('user', distinct=True)
+    return (
+        with_current_product(queryset)
+        .annotate(supplier=F('current_product__supplier'))
+        .values('supplier')
+        .annotate(**measures)
+        .order_by('-total_quantity_sold', 'supplier')
+    )
 
-    # Join with DimProductBase manually
-    variant_sales = (
-        DimVariantOrder.objects
-        .filter(id__in=variant_ids)
-        .values('product_id')
-        .annotate(
-            total_quantity_sold=Sum('quantity'),
-            total_sold_price=Sum(F('quantity') * F('unit_price')),
-            user_quantity=Count('factsales__user', distinct=True)
-        )
+# category_level_1 is the product's own category and levels 2 / 3 its parent
+# and grandparent, so a product in a shallower category has NULL upper levels.
+# Rollups shift each path so it starts at its root category.
+_LEVEL_1 = 'current_product__category_level_1'
+_LEVEL_2 = 'current_product__category_level_2'
+_LEVEL_3 = 'current_product__category_level_3'
+CATEGORY_PATH = {
+    'category_root': Coalesce(_LEVEL_3, _LEVEL_2, _LEVEL_1),
+    'category_child': Case(
+        When(**{f'{_LEVEL_3}__isnull': False}, then=F(_LEVEL_2)),
+        When(**{f'{_LEVEL_2}__isnull': False}, then=F(_LEVEL_1)),
+    ),
+    'category_leaf': Case(When(**{f'{_LEVEL_3}__isnull': False}, then=F(_LEVEL_1))),
+}
+CATEGORY_MEASURES = ('total_quantity', 'total_sold_price', 'total_orders')
+
+def get_category_rollup(queryset=None):
+    """
+    Sales of the fact lines in ``queryset`` rolled up the category tree of
+    each line's current product version, like top-suppliers: one
+    ``GROUP BY ROLLUP`` returns every leaf, child and root category and the
+    grand total. Returns the grand total node; each node has ``category``,
+    ``depth`` (0 for the total), the measures and ``children`` sorted by
+    sales. ``total_sold_price`` sums the lines' ``total_price`` like the
+    other endpoints.
+    """
+    if queryset is None:
+        queryset = FactSalesLine.objects.all()
+    lines_sql, params = (
+        with_current_product(queryset)
+        .annotate(**CATEGORY_PATH, line_quantity=F('quantity'), line_price=F('total_price'), line_order=F('order_id'))
+        .values('category_root', 'category_child', 'category_leaf', 'line_quantity', 'line_price', 'line_order')
+        .order_by()
+        .query.sql_with_params()
     )
+    sql = f"""
+        SELECT category_root, category_child, category_leaf,
+               GROUPING(category_root, category_child, category_leaf),
+               SUM(line_quantity), SUM(line_price), COUNT(DISTINCT line_order)
+        FROM ({lines_sql}) lines
+        GROUP BY ROLLUP(category_root, category_child, category_leaf)
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
 
-    # Map product_id → supplier
-    product_ids = [v['product_id'] for v in variant_sales if v['product_id'] is not None]
-    products_map = {p.product_id: p for p in DimProductBase.objects.filter(product_id__in=product_ids)}
+    # GROUPING() sets one bit per rolled-up column: 0 leaf, 1 child, 3 root, 7 total.
+    depth_of = {0: 3, 1: 2, 3: 1, 7: 0}
+    total = {'category': None, 'depth': 0, **dict.fromkeys(CATEGORY_MEASURES, 0), 'children': []}
+    nodes = {}
+    for *path, grouping, quantity, price, orders in sorted(rows, key=lambda row: -row[3]):
+        depth = depth_of[grouping]
+        path = tuple(path[:depth])
+        # A NULL below the root is a product sold directly in its parent
+        # category, already inside the parent's totals.
+        if depth > 1 and path[-1] is None:
+            continue
+        node = total if depth == 0 else {'category': path[-1], 'depth': depth}
+        node.update(zip(CATEGORY_MEASURES, (quantity or 0, price or 0, orders)))
+        node.setdefault('children', [])
+        if depth:
+            nodes[path] = node
+            (nodes[path[:-1]] if depth > 1 else total)['children'].append(node)
 
-    # Aggregate by supplier
-    supplier_agg = defaultdict(lambda: {'total_quantity_sold': 0, 'total_sold_price': 0, 'user_quantity': 0})
-    for v in variant_sales:
-        product = products_map.get(v['product_id'])
-        supplier_name = product.supplier if product else "Unknown"
-        supplier_agg[supplier_name]['total_quantity_sold'] += v['total_quantity_sold']
-        supplier_agg[supplier_name]['total_sold_price'] += v['total_sold_price']
-        supplier_agg[supplier_name]['user_quantity'] += v['user_quantity']
+    for node in [total, *nodes.values()]:
+        node['children'].sort(key=lambda child: (-child['total_sold_price'], child['category'] or ''))
+    return total
 
-    # Convert to list and sort by total_quantity_sold
-    result = [
-        {
-            'supplier': k,
-            'total_quantity_sold': v['total_quantity_sold'],
-            'total_sold_price': v['total_sold_price'],
-            'user_quantity': v['user_quantity'],
-        }
-        for k, v in supplier_agg.items()
-    ]
-    result.sort(key=lambda x: x['total_quantity_sold'], reverse=True)
-    return result
\ No newline at end of file
+def find_category(node, category):
+    # Category names are unique, so the first match is the only one.
+    if node['depth'] and node['category'] == category:
+        return node
+    for child in node['children']:
+        found = find_category(child, category)
+        if found is not None:
+            return found
+    return None
@@ -0,0 +1,137 @@
+import operator
+from collections import defaultdict
+from functools import reduce
+
+from django.db.models import Q
+
+from . import hll
+from .models import DimProductBase, FactSalesLine, DailyProductUserSketch, DailySupplierUserSketch
+
+
+def supplier_q(suppliers):
+    suppliers = set(suppliers)
+    q = Q(supplier__in=[s for s in suppliers if s is not None])
+    if None in suppliers:
+        q |= Q(supplier__isnull=True)
+    return q
+
+def _current_suppliers(*filters):
+    return dict(DimProductBase.objects.filter(*filters, is_current=True).values_list('product_id', 'supplier'))
+
+def _by_day(pairs):
+    days = defaultdict(set)
+    for date_id, key in pairs:
+        days[date_id].add(key)
+    return days
+
+def _days_q(days, keys_q):
+    # One (day AND keys) condition per day, OR-ed together.
+    return reduce(operator.or_, (Q(date_id=date_id) & keys_q(keys) for date_id, keys in days.items()))
+
+def refresh_user_sketches(pairs=None):
+    """
+    Recompute the distinct-user sketches of the ``(date_id, product_id)``
+    ``pairs`` (all of them when ``None``) from ``FactSalesLine``, then
+    rebuild the sketches of the same days for the products' suppliers by
+    merging product sketches. Recomputing instead of adding users keeps
+    removed lines and reassigned orders exact. Returns
+    ``(product_sketches, supplier_sketches)`` written.
+    """
+    product_scope = Q()
+    if pairs is not None:
+        pairs = set(pairs)
+        if not pairs:
+            return 0, 0
+        product_days = _by_day(pairs)
+        product_scope = _days_q(product_days, lambda product_ids: Q(product_id__in=product_ids))
+
+    # ----------------------
+    # Per day and product
+    # ----------------------
+    users = defaultdict(list)
+    lines = FactSalesLine.objects.filter(product_scope).values_list('date_id', 'product_id', 'user_id')
+    for date_id, product_id, user_id in lines.iterator(chunk_size=5000):
+        users[(date_id, product_id)].append(user_id)
+
+    DailyProductUserSketch.objects.filter(product_scope).delete()
+    DailyProductUserSketch.objects.bulk_create([
+        DailyProductUserSketch(date_id=date_id, product_id=product_id, registers=hll.to_bytes(hll.sketch(ids)))
+        for (date_id, product_id), ids in users.items()
+    ], batch_size=1000)
+
+    return len(users), _refresh_supplier_sketches(product_days if pairs is not None else None)
+
+def realign_supplier_sketches(product_ids):
+    """
+    Rebuild the supplier sketches of every day ``product_ids`` sold on, after
+    their current version moved to another supplier: the product sketches
+    are unchanged, but their users now count for the new supplier instead of
+    the old one. Returns ``(date_ids, supplier_sketches)``.
+    """
+    pairs = set(DailyProductUserSketch.objects.filter(product_id__in=product_ids).values_list('date_id', 'product_id'))
+    if not pairs:
+        return set(), 0
+    product_days = _by_day(pairs)
+    return set(product_days), _refresh_supplier_sketches(product_days)
+
+def _refresh_supplier_sketches(product_days=None):
+    # Sketches of the products' suppliers on each day of ``product_days``
+    # ({date_id: product_ids}; every day when None), merged from the product
+    # sketches. Returns the number written.
+    if product_days is None:
+        supplier_of = _current_suppliers()
+        supplier_scope = Q()
+        sketch_ids = None
+    else:
+        # Earlier versions' suppliers too, so a product that changed supplier
+        # leaves its old supplier's sketches of these days.
+        product_suppliers = defaultdict(set)
+        versions = DimProductBase.objects.filter(product_id__in=set().union(*product_days.values()))
+        for product_id, supplier in versions.values_list('product_id', 'supplier'):
+            product_suppliers[product_id].add(supplier)
+        supplier_days = {
+            date_id: set().union(*(product_suppliers[product_id] for product_id in product_ids))
+            for date_id, product_ids in product_days.items()
+        }
+        supplier_of = _current_suppliers(supplier_q(set().union(*supplier_days.values())))
+        supplier_scope = _days_q(supplier_days, supplier_q)
+        # Registers are only read for the sketches feeding a rebuilt (day, supplier).
+        candidates = DailyProductUserSketch.objects.filter(
+            date_id__in=supplier_days.keys(), product_id__in=supplier_of.keys()
+        ).values_list('id', 'date_id', 'product_id')
+        sketch_ids = [
+            sketch_id for sketch_id, date_id, product_id in candidates
+            if supplier_of[product_id] in supplier_days[date_id]
+        ]
+
+    merged = defaultdict(list)
+    for date_id, product_id, registers in _product_sketches(sketch_ids):
+        if product_id in supplier_of:
+            merged[(date_id, supplier_of[product_id])].append(registers)
+
+    DailySupplierUserSketch.objects.filter(supplier_scope).delete()
+    DailySupplierUserSketch.objects.bulk_create([
+        DailySupplierUserSketch(date_id=date_id, supplier=supplier, registers=hll.to_bytes(hll.merge(registers)))
+        for (date_id, supplier), registers in merged.items()
+    ], batch_size=1000)
+    return len(merged)
+
+def _product_sketches(sketch_ids=None, chunk_size=5000):
+    # (date_id, product_id, registers) of the given sketches (all when None).
+    fields = ('date_id', 'product_id', 'registers')
+    if sketch_ids is None:
+        yield from DailyProductUserSketch.objects.values_list(*fields).iterator(chunk_size=1000)
+        return
+    for start in range(0, len(sketch_ids), chunk_size):
+        yield from DailyProductUserSketch.objects.filter(id__in=sketch_ids[start:start + chunk_size]).values_list(*fields)
+
+def sketch_user_counts(queryset, *fields):
+    """
+    Estimated distinct users per value of ``fields`` (a tuple when several),
+    merging every sketch of ``queryset`` that shares the value.
+    """
+    groups = defaultdict(list)
+    for row in queryset.values_list(*fields, 'registers'):
+        key = row[0] if len(fields) == 1 else row[:-1]
+        groups[key].append(row[-1])
+    return {key: hll.count(hll.merge(registers)) for key, registers in groups.items()}
@@ -0,0 +1,251 @@
+import json
+import os
+import shutil
+from datetime import date
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import FactSales, FactSalesLine, DimDate, DimUser, DimProductBase, DimVariantOrder
+from .result_cache import get_warehouse_version
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # optional: pip install "datawarehouse[snapshot]"
+    pa = None
+
+
+SNAPSHOT_FORMAT_PARQUET = "parquet"
+SNAPSHOT_FORMAT_ARROW = "arrow"
+SNAPSHOT_FORMATS = (SNAPSHOT_FORMAT_PARQUET, SNAPSHOT_FORMAT_ARROW)
+MANIFEST_NAME = "_manifest.json"
+# Bumped when the manifest's contents change meaning; older manifests are rebuilt.
+MANIFEST_LAYOUT = 2
+WHOLE_TABLE = "all"
+
+# Snapshot table -> (model, date lookup partitioned by month, or None for one file)
+SNAPSHOT_TABLES = {
+    "fact_sales": (FactSales, "date__full_date"),
+    "fact_sales_line": (FactSalesLine, "date__full_date"),
+    "dim_date": (DimDate, "full_date"),
+    "dim_user": (DimUser, None),
+    "dim_product": (DimProductBase, None),
+    "dim_variant": (DimVariantOrder, None),
+}
+FACT_MODELS = (FactSales, FactSalesLine)
+
+
+def _arrow_type(field):
+    if isinstance(field, (models.CharField, models.TextField)):
+        # Low-cardinality labels (status, city, brand, ...) compress to small ints.
+        return pa.dictionary(pa.int32(), pa.string())
+    if isinstance(field, models.BooleanField):
+        return pa.bool_()
+    if isinstance(field, models.DateTimeField):
+        return pa.timestamp("us", tz="UTC")
+    if isinstance(field, models.DateField):
+        return pa.date32()
+    if isinstance(field, models.FloatField):
+        return pa.float64()
+    if isinstance(field, models.DecimalField):
+        return pa.decimal128(field.max_digits, field.decimal_places)
+    # Integer columns and foreign keys (exported as their surrogate ids).
+    return pa.int64()
+
+def _schema(model):
+    return pa.schema([pa.field(f.attname, _arrow_type(f)) for f in model._meta.concrete_fields])
+
+
+class _DictionaryColumn:
+    # Keeps one growing dictionary per column for a whole file, so every
+    # batch's dictionary extends the previous one (written as IPC deltas).
+    def __init__(self):
+        self.index = {}
+        self.values = []
+
+    def encode(self, values):
+        indices = []
+        for value in values:
+            if value is None:
+                indices.append(None)
+                continue
+            position = self.index.get(value)
+            if position is None:
+                position = self.index[value] = len(self.values)
+                self.values.append(value)
+            indices.append(position)
+        return pa.DictionaryArray.from_arrays(pa.array(indices, pa.int32()), pa.array(self.values, pa.string()))
+
+
+def _partition_key(partition):
+    return partition.strftime("%Y-%m") if isinstance(partition, date) else partition
+
+def partition_fingerprints(model, month_lookup):
+    """
+    ``{partition: [rows, max id]}`` of a dimension table, computed in SQL.
+    Dimensions only gain rows (new SCD versions get new ids), so a changed
+    partition always changes its count or largest id.
+    """
+    queryset = model.objects.all()
+    if month_lookup:
+        queryset = queryset.annotate(partition=TruncMonth(month_lookup)).values('partition')
+    else:
+        queryset = queryset.annotate(partition=models.Value(WHOLE_TABLE)).values('partition')
+    return {
+        _partition_key(row['partition']): [row['rows'], row['max_id']]
+        for row in queryset.annotate(rows=models.Count('pk'), max_id=models.Max('pk')).order_by()
+    }
+
+def fact_partitions(model, month_lookup, since_version=None):
+    """
+    Months of a fact table to rewrite: those holding a day whose facts
+    changed after ``since_version`` (read from DateVersion, so the facts
+    themselves are not scanned), or every month with rows when ``None``.
+    """
+    if since_version is None:
+        queryset = model.objects.annotate(partition=TruncMonth(month_lookup)).values_list('partition', flat=True)
+    else:
+        queryset = DimDate.objects.filter(dateversion__version__gt=since_version).annotate(
+            partition=TruncMonth('full_date')
+        ).values_list('partition', flat=True)
+    return {_partition_key(partition) for partition in queryset.distinct().order_by()}
+
+def _partition_path(directory, table, partition, snapshot_format):
+    if partition == WHOLE_TABLE:
+        return os.path.join(directory, table, f"part-0.{snapshot_format}")
+    return os.path.join(directory, table, f"month={partition}", f"part-0.{snapshot_format}")
+
+def _partition_queryset(model, month_lookup, partition):
+    queryset = model.objects.all()
+    if partition != WHOLE_TABLE:
+        year, month = map(int, partition.split("-"))
+        start = date(year, month, 1)
+        end = date(year + month // 12, month % 12 + 1, 1)
+        queryset = queryset.filter(**{f"{month_lookup}__gte": start, f"{month_lookup}__lt": end})
+    return queryset.order_by('pk')
+
+def write_partition(model, queryset, path, snapshot_format, chunk_size):
+    """
+    Write ``queryset`` to one Parquet / Arrow IPC file, ``chunk_size`` rows
+    per record batch (read through a server-side cursor). The file is
+    written next to ``path`` and moved into place once complete. Returns
+    the number of rows written.
+    """
+    schema = _schema(model)
+    fields = [f.attname for f in model._meta.concrete_fields]
+    dictionaries = {
+        name: _DictionaryColumn() for name in fields if pa.types.is_dictionary(schema.field(name).type)
+    }
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    if snapshot_format == SNAPSHOT_FORMAT_PARQUET:
+        writer = pa.parquet.ParquetWriter(tmp_path, schema, compression="zstd")
+    else:
+        options = pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+        writer = pa.ipc.new_file(tmp_path, schema, options=options)
+
+    written = 0
+    rows = queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+    with writer:
+        while True:
+            chunk = [row for _, row in zip(range(chunk_size), rows)]
+            if not chunk:
+                break
+            columns = []
+            for name, values in zip(fields, zip(*chunk)):
+                if name in dictionaries:
+                    columns.append(dictionaries[name].encode(values))
+                else:
+                    columns.append(pa.array(values, schema.field(name).type))
+            writer.write_batch(pa.RecordBatch.from_arrays(columns, schema=schema))
+            written += len(chunk)
+    os.replace(tmp_path, path)
+    return written
+
+def _load_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def write_snapshot(directory=None, snapshot_format=SNAPSHOT_FORMAT_PARQUET, full=False, chunk_size=None):
+    """
+    Write (or refresh) a columnar snapshot of the star schema under
+    ``directory``: facts and DimDate partitioned by month, the other
+    dimensions as one file each.
+
+    Refreshes are incremental. When the warehouse version (bumped by every
+    sync batch) still matches the manifest nothing is read; otherwise fact
+    months holding a day changed since the manifest's version (DateVersion)
+    and dimension partitions whose row count / largest id moved are
+    rewritten, and partitions that emptied are removed. ``full`` rewrites
+    everything.
+    Returns a report of what was written.
+    """
+    if pa is None:
+        raise ImproperlyConfigured('Snapshots need pyarrow: pip install "datawarehouse[snapshot]".')
+    if snapshot_format not in SNAPSHOT_FORMATS:
+        raise ValueError(f"Unknown snapshot format '{snapshot_format}', expected one of {', '.join(SNAPSHOT_FORMATS)}.")
+    directory = directory or settings.ANALYTICS_SNAPSHOT_DIR
+    chunk_size = chunk_size or settings.ANALYTICS_EXPORT_CHUNK_SIZE
+
+    version = get_warehouse_version()
+    manifest = _load_manifest(directory)
+    if full or not manifest or manifest.get("format") != snapshot_format or manifest.get("layout") != MANIFEST_LAYOUT:
+        manifest = {"format": snapshot_format, "layout": MANIFEST_LAYOUT, "version": None, "tables": {}}
+    report = {"version": version, "up_to_date": manifest["version"] == version, "tables": {}}
+    if report["up_to_date"]:
+        return report
+
+    for table, (model, month_lookup) in SNAPSHOT_TABLES.items():
+        previous = manifest["tables"].get(table, {})
+        table_report = report["tables"][table] = {"written": [], "removed": [], "rows": 0}
+
+        if model in FACT_MODELS:
+            # {partition: rows}; months without changed days are kept as they are.
+            current = dict(previous)
+            stale = fact_partitions(model, month_lookup, manifest["version"])
+            stale |= {p for p in previous if not os.path.exists(_partition_path(directory, table, p, snapshot_format))}
+            for partition in sorted(stale):
+                path = _partition_path(directory, table, partition, snapshot_format)
+                queryset = _partition_queryset(model, month_lookup, partition)
+                if queryset.exists():
+                    current[partition] = write_partition(model, queryset, path, snapshot_format, chunk_size)
+                    table_report["rows"] += current[partition]
+                    table_report["written"].append(partition)
+                else:
+                    current.pop(partition, None)
+        else:
+            current = partition_fingerprints(model, month_lookup)
+            for partition in sorted(current):
+                path = _partition_path(directory, table, partition, snapshot_format)
+                if previous.get(partition) == current[partition] and os.path.exists(path):
+                    continue
+                queryset = _partition_queryset(model, month_lookup, partition)
+                table_report["rows"] += write_partition(model, queryset, path, snapshot_format, chunk_size)
+                table_report["written"].append(partition)
+        table_report["partitions"] = len(current)
+
+        for partition in sorted(previous.keys() - current.keys()):
+            path = _partition_path(directory, table, partition, snapshot_format)
+            if partition == WHOLE_TABLE:
+                if os.path.exists(path):
+                    os.remove(path)
+            else:
+                shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+            table_report["removed"].append(partition)
+        manifest["tables"][table] = current
+
+    # The manifest only moves once every partition is on disk.
+    manifest.update(version=version, written_at=timezone.now().isoformat())
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, f"{MANIFEST_NAME}.tmp"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(os.path.join(directory, f"{MANIFEST_NAME}.tmp"), os.path.join(directory, MANIFEST_NAME))
+    return report
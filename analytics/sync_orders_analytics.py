@@ -1,11 +1,11 @@
-from collections import defaultdict
+import time
+from datetime import timedelta
 
 # Django
-from django.db import transaction
-from django.db.models import Sum
-
-# Third-party
-import jdatetime
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
 
 # App models
 from orders.models import Order, OrderItem
@@ -13,209 +13,381 @@ from .models import (
     DimUser,
     DimProductBase,
     DimVariantOrder,
-    DimDate,
     FactSales,
+    FactSalesLine,
     FactAnalytics,
+    DailyProductUserSketch,
+    SyncState,
 )
-
-def sync_orders_analytics():
-    unsynced_orders = list(
-        Order.objects.filter(is_synced_analytics=False)
-        .select_related('user')
-        .prefetch_related('items__variant__product__brand__supplier', 'items__variant__product__category__parent__parent')
-    )
-
-    if not unsynced_orders:
-        return {
-            "DimDate": {"created": 0, "existing": 0},
-            "DimUser": {"created": 0, "existing": 0},
-            "DimProductBase": {"created": 0, "existing": 0},
-            "DimVariantOrder": {"created": 0, "existing": 0},
-            "FactSales": {"created": 0, "existing": 0},
-        }
-
-    report = {
-        "DimDate": {"created": 0, "existing": 0},
-        "DimUser": {"created": 0, "existing": 0},
-        "DimProductBase": {"created": 0, "existing": 0},
-        "DimVariantOrder": {"created": 0, "existing": 0},
-        "FactSales": {"created": 0, "existing": 0},
+from .loaders import upsert_fact_sales, upsert_fact_sales_lines
+from .aggregates import refresh_fact_analytics
+from .sketches import realign_supplier_sketches, refresh_user_sketches
+from .result_cache import bump_warehouse_version
+from .dim_dates import resolve_date_ids
+from .resolvers import user_resolver, variant_resolver
+from .scd import product_row_hash
+from .instrumentation import measure_stage, merge_stages, trace_memory
+
+def _empty_report():
+    return {
+        "DimDate": {"created": 0, "existing": 0, "cache_hits": 0, "cache_misses": 0},
+        "DimUser": {"created": 0, "existing": 0, "cache_hits": 0, "cache_misses": 0},
+        "DimProductBase": {"created": 0, "versioned": 0, "existing": 0},
+        "DimVariantOrder": {"created": 0, "existing": 0, "cache_hits": 0, "cache_misses": 0},
+        "FactSales": {"created": 0, "updated": 0, "existing": 0},
+        "FactSalesLine": {"created": 0, "updated": 0, "deleted": 0},
+        "FactAnalytics": {"refreshed": 0},
+        "UserSketches": {"products": 0, "suppliers": 0},
+        "batches": 0,
+        "orders": 0,
+        "seconds": 0.0,
+        "stages": {},
     }
 
+def _merge_report(report, batch_report):
+    for key, value in batch_report.items():
+        if key == "stages":
+            merge_stages(report["stages"], value)
+        elif key == "sync_run_id":
+            continue
+        elif isinstance(value, dict):
+            for field, count in value.items():
+                report[key][field] += count
+        else:
+            report[key] += value
+
+def _load_orders(order_ids, report):
+    with measure_stage(report, "load_orders") as stage:
+        orders = list(
+            Order.objects.filter(id__in=order_ids)
+            .select_related('user', 'user__age_range')
+            .prefetch_related('items__variant__product__brand__supplier', 'items__variant__product__category__parent__parent')
+            .order_by('id')
+        )
+        stage["rows"] = len(orders)
+    return orders
+
+def _sync_batch(orders, report, progress, before_commit=None):
+    # Dimensions commit ahead of the facts so concurrent workers only
+    # serialize on the short dimension transaction; both stages are idempotent.
+    # ``before_commit`` runs inside the facts transaction (e.g. to move a watermark).
+    if progress:
+        progress("dimensions", report["orders"])
     with transaction.atomic():
-        # ----------------------
-        # DimDate
-        # ----------------------
-        needed_dates = {o.created_at.date() for o in unsynced_orders}
-        existing_dates = {d.full_date: d for d in DimDate.objects.filter(full_date__in=needed_dates)}
-        missing_dates = needed_dates - existing_dates.keys()
-        if missing_dates:
-            new_dates = []
-            for g_date in missing_dates:
-                j = jdatetime.date.fromgregorian(date=g_date)
-                new_dates.append(DimDate(
-                    full_date=g_date,
-                    jalali_date=f"{j.year}-{j.month:02d}-{j.day:02d}",
-                    day_of_week=j.strftime("%A"),
-                    month_name=j.strftime("%B"),
-                    quarter=(1 if j.month <= 3 else 2 if j.month <= 6 else 3 if j.month <= 9 else 4),
-                    is_holiday=(j.weekday() == 6)
-                ))
-            DimDate.objects.bulk_create(new_dates, ignore_conflicts=True)
-            report["DimDate"]["created"] = len(missing_dates)
-            existing_dates.update({d.full_date: d for d in DimDate.objects.filter(full_date__in=missing_dates)})
-        report["DimDate"]["existing"] = len(existing_dates) - report["DimDate"]["created"]
-
-        # ----------------------
-        # DimUser
-        # ----------------------
-        needed_user_ids = {o.user.id for o in unsynced_orders}
-        existing_users = {u.user_id: u for u in DimUser.objects.filter(user_id__in=needed_user_ids)}
-        missing_user_ids = needed_user_ids - existing_users.keys()
-        if missing_user_ids:
-            users_to_create = [o.user for o in unsynced_orders if o.user.id in missing_user_ids]
-            DimUser.objects.bulk_create([
-                DimUser(
-                    user_id=u.id,
-                    username=u.username,
-                    gender=u.gender,
-                    city=u.city,
-                    registration_date=u.registration_date,
-                    age_range=u.age_range.name if u.age_range else None
+        dimensions = _sync_dimensions(orders, report)
+    if progress:
+        progress("facts", report["orders"])
+    with transaction.atomic():
+        _sync_facts(orders, dimensions, report)
+        if before_commit:
+            before_commit()
+    report["batches"] += 1
+    report["orders"] += len(orders)
+
+def sync_orders_analytics(batch_size=None, filters=None, progress=None):
+    # Walk unsynced orders in keyset-ordered batches (by Order.id); each batch
+    # commits on its own so memory stays flat and a failure only loses that batch.
+    # ``progress(stage, rows_processed)`` is called as batches move through stages.
+    batch_size = batch_size or settings.ANALYTICS_SYNC_BATCH_SIZE
+    report = _empty_report()
+    last_id = 0
+    start = time.perf_counter()
+
+    with trace_memory():
+        while True:
+            batch_ids = list(
+                Order.objects.filter(is_synced_analytics=False, id__gt=last_id, **(filters or {}))
+                .order_by('id')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not batch_ids:
+                break
+
+            unsynced_orders = _load_orders(batch_ids, report)
+            _sync_batch(unsynced_orders, report, progress)
+            last_id = batch_ids[-1]
+
+    report["seconds"] = round(time.perf_counter() - start, 4)
+    if progress:
+        progress("done", report["orders"])
+    return report
+
+SYNC_MODE_FLAG = "flag"
+SYNC_MODE_CDC = "cdc"
+CDC_STATE_NAME = "orders_cdc"
+
+def sync_orders_changes(batch_size=None, progress=None):
+    # Change-data-capture sync: walks orders (new or edited, including item
+    # edits which bump Order.updated_at) past the (updated_at, id) watermark
+    # stored in SyncState. The watermark advances in the same transaction as
+    # each batch of facts.
+    batch_size = batch_size or settings.ANALYTICS_SYNC_BATCH_SIZE
+    state, _ = SyncState.objects.get_or_create(name=CDC_STATE_NAME)
+    upper_bound = timezone.now() - timedelta(seconds=settings.ANALYTICS_CDC_SAFETY_LAG)
+    report = _empty_report()
+    start = time.perf_counter()
+
+    with trace_memory():
+        while True:
+            changed = Order.objects.filter(updated_at__lte=upper_bound)
+            if state.watermark_updated_at:
+                changed = changed.filter(
+                    Q(updated_at__gt=state.watermark_updated_at)
+                    | Q(updated_at=state.watermark_updated_at, id__gt=state.watermark_id)
                 )
-                for u in users_to_create
-            ], ignore_conflicts=True)
-            report["DimUser"]["created"] = len(users_to_create)
-            existing_users.update({u.user_id: u for u in DimUser.objects.filter(user_id__in=missing_user_ids)})
-        report["DimUser"]["existing"] = len(existing_users) - report["DimUser"]["created"]
-
-        # ----------------------
-        # DimProductBase
-        # ----------------------
-        product_keys = set()
-        products_to_create = []
+            batch = list(changed.order_by('updated_at', 'id').values_list('id', 'updated_at')[:batch_size])
+            if not batch:
+                break
 
-        for o in unsynced_orders:
-            for item in o.items.all():
-                p = item.variant.product
-                key = (p.id, p.is_exciting, p.free_shipping, p.has_gift, p.is_budget_friendly)
-                if key not in product_keys:
-                    supplier_name = p.brand.supplier.name if p.brand and p.brand.supplier else None
-                    products_to_create.append(DimProductBase(
-                        product_id=p.id,
-                        name=p.name,
-                        rating=p.rating,
-                        expire_date=p.expire_date,
-                        is_available=p.is_available,
-                        is_exciting=p.is_exciting,
-                        free_shipping=p.free_shipping,
-                        has_gift=p.has_gift,
-                        is_budget_friendly=p.is_budget_friendly,
-                        price=p.price,
-                        brand=p.brand.name if p.brand else None,
-                        supplier=supplier_name,
-                        category_level_1=p.category.name if p.category else None,
-                        category_level_2=p.category.parent.name if p.category and p.category.parent else None,
-                        category_level_3=p.category.parent.parent.name if p.category and p.category.parent and p.category.parent.parent else None,
-                        created_at=p.created_at,
-                        updated_at=p.updated_at
-                    ))
-                    product_keys.add(key)
-
-        if products_to_create:
-            DimProductBase.objects.bulk_create(products_to_create, ignore_conflicts=True)
-            report["DimProductBase"]["created"] = len(products_to_create)
-        report["DimProductBase"]["existing"] = len(product_keys) - report["DimProductBase"]["created"]
-
-        # ----------------------
-        # DimVariantOrder
-        # ----------------------
-        variant_ids = [i.variant.id for o in unsynced_orders for i in o.items.all()]
-        existing_variants = {v.variant_id: v for v in DimVariantOrder.objects.filter(variant_id__in=variant_ids)}
-        variant_keys = set()
-        variants_to_create = []
-        variants_to_update = []
+            def advance_watermark():
+                state.watermark_id, state.watermark_updated_at = batch[-1]
+                state.save(update_fields=['watermark_id', 'watermark_updated_at', 'updated_at'])
 
-        for o in unsynced_orders:
-            for item in o.items.all():
-                v_obj = item.variant
-                key = (v_obj.id, v_obj.sku, v_obj.product.id, v_obj.color, v_obj.size, item.quantity, item.unit_price, item.discount_percent)
-                if key not in variant_keys:
-                    total_price = item.quantity * item.unit_price
-                    total_after_discount = total_price * (100 - item.discount_percent) // 100
-                    if v_obj.id in existing_variants:
-                        ev = existing_variants[v_obj.id]
-                        if ev.total_price != total_price or ev.total_after_discount != total_after_discount:
-                            ev.total_price = total_price
-                            ev.total_after_discount = total_after_discount
-                            variants_to_update.append(ev)
-                    else:
-                        variants_to_create.append(DimVariantOrder(
-                            variant_id=v_obj.id,
-                            variant_sku=v_obj.sku,
-                            product_id=v_obj.product.id,
-                            color=v_obj.color,
-                            size=v_obj.size,
-                            created_at=v_obj.created_at,
-                            updated_at=v_obj.updated_at,
-                            quantity=item.quantity,
-                            unit_price=item.unit_price,
-                            discount_percent=item.discount_percent,
-                            total_price=total_price,
-                            total_after_discount=total_after_discount
-                        ))
-                    variant_keys.add(key)
-
-        if variants_to_create:
-            DimVariantOrder.objects.bulk_create(variants_to_create, ignore_conflicts=True)
-            existing_variants.update({v.variant_id: v for v in DimVariantOrder.objects.filter(variant_id__in=[v.variant_id for v in variants_to_create])})
-            report["DimVariantOrder"]["created"] = len(variants_to_create)
-        if variants_to_update:
-            DimVariantOrder.objects.bulk_update(variants_to_update, ['total_price', 'total_after_discount'])
-        report["DimVariantOrder"]["existing"] = len(variant_keys) - report["DimVariantOrder"]["created"]
-
-        # ----------------------
-        # FactSales
-        # ----------------------
-        facts_to_create = []
-        m2m_relations = []
+            changed_orders = _load_orders([order_id for order_id, _ in batch], report)
+            _sync_batch(changed_orders, report, progress, before_commit=advance_watermark)
+
+    report["seconds"] = round(time.perf_counter() - start, 4)
+    if progress:
+        progress("done", report["orders"])
+    return report
+
+def _lock_table(model):
+    # Serializes check-then-insert on dimensions without a natural unique key,
+    # and recomputes of shared aggregates, across concurrent sync workers
+    # until the surrounding transaction ends.
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [model._meta.db_table])
+
+def _sync_dimensions(unsynced_orders, report):
+    # Rows are inserted in natural key order so concurrent ON CONFLICT inserts
+    # from other workers always take row locks in the same order.
+
+    # ----------------------
+    # DimDate
+    # ----------------------
+    # Dates normally come from the pre-generated calendar (GenerateDimDates);
+    # dates, users and variants all resolve through the process-wide key
+    # caches in analytics.resolvers, so only unseen keys hit the database.
+    with measure_stage(report, "DimDate") as stage:
+        existing_dates = resolve_date_ids({o.created_at.date() for o in unsynced_orders}, stats=report["DimDate"])
+        stage["rows"] = len(existing_dates)
+
+    # ----------------------
+    # DimUser
+    # ----------------------
+    with measure_stage(report, "DimUser") as stage:
+        order_users = {o.user.id: o.user for o in unsynced_orders}
+
+        def build_user(user_id):
+            u = order_users[user_id]
+            return DimUser(
+                user_id=u.id,
+                username=u.username,
+                gender=u.gender,
+                city=u.city,
+                registration_date=u.registration_date,
+                age_range=u.age_range.name if u.age_range else None
+            )
+
+        existing_users = user_resolver.resolve(order_users.keys(), build_user, stats=report["DimUser"])
+        stage["rows"] = len(existing_users)
+
+    # ----------------------
+    # DimProductBase
+    # ----------------------
+    # Type-2 SCD: a product gets a new version only when the hash of its
+    # tracked attributes differs from the current version's, which is then
+    # closed. Unchanged products cost nothing beyond the current-row read.
+    with measure_stage(report, "DimProductBase") as stage:
+        _lock_table(DimProductBase)
+        products = {i.variant.product.id: i.variant.product for o in unsynced_orders for i in o.items.all()}
+        current_versions = {
+            product_id: (version_id, version_hash, supplier)
+            for version_id, product_id, version_hash, supplier in DimProductBase.objects.filter(
+                product_id__in=products.keys(), is_current=True
+            ).values_list('id', 'product_id', 'row_hash', 'supplier')
+        }
+
+        now = timezone.now()
+        existing_products = {}
+        new_versions = []
+        closed_version_ids = []
+        changed_suppliers = []
+        for product_id in sorted(products):
+            p = products[product_id]
+            supplier_name = p.brand.supplier.name if p.brand and p.brand.supplier else None
+            version = DimProductBase(
+                product_id=p.id,
+                name=p.name,
+                rating=p.rating,
+                expire_date=p.expire_date,
+                is_available=p.is_available,
+                is_exciting=p.is_exciting,
+                free_shipping=p.free_shipping,
+                has_gift=p.has_gift,
+                is_budget_friendly=p.is_budget_friendly,
+                price=p.price,
+                brand=p.brand.name if p.brand else None,
+                supplier=supplier_name,
+                category_level_1=p.category.name if p.category else None,
+                category_level_2=p.category.parent.name if p.category and p.category.parent else None,
+                category_level_3=p.category.parent.parent.name if p.category and p.category.parent and p.category.parent.parent else None,
+                created_at=p.created_at,
+                updated_at=p.updated_at,
+                valid_from=now,
+                is_current=True
+            )
+            version.row_hash = product_row_hash(version)
+
+            current = current_versions.get(product_id)
+            if current and current[1] == version.row_hash:
+                existing_products[product_id] = current[0]
+                report["DimProductBase"]["existing"] += 1
+                continue
+            if current:
+                closed_version_ids.append(current[0])
+                if current[2] != version.supplier:
+                    changed_suppliers.append(product_id)
+            new_versions.append(version)
+
+        if closed_version_ids:
+            DimProductBase.objects.filter(id__in=closed_version_ids).update(is_current=False, valid_to=now)
+            report["DimProductBase"]["versioned"] += len(closed_version_ids)
+        if new_versions:
+            DimProductBase.objects.bulk_create(new_versions)
+            report["DimProductBase"]["created"] += len(new_versions) - len(closed_version_ids)
+            existing_products.update({v.product_id: v.pk for v in new_versions})
+        stage["rows"] = len(existing_products)
+
+    # Supplier sketches are keyed by each product's current supplier, so the
+    # days a product sold on before its supplier changed move to the new one
+    # together with the version change.
+    if changed_suppliers:
+        with measure_stage(report, "UserSketches") as stage:
+            _lock_table(DailyProductUserSketch)
+            _, supplier_sketches = realign_supplier_sketches(changed_suppliers)
+            report["UserSketches"]["suppliers"] += supplier_sketches
+            stage["rows"] = supplier_sketches
+            bump_warehouse_version()
+
+    # ----------------------
+    # DimVariantOrder
+    # ----------------------
+    with measure_stage(report, "DimVariantOrder") as stage:
+        variants = {i.variant.id: i.variant for o in unsynced_orders for i in o.items.all()}
+
+        def build_variant(variant_id):
+            v_obj = variants[variant_id]
+            return DimVariantOrder(
+                variant_id=v_obj.id,
+                variant_sku=v_obj.sku,
+                product_id=v_obj.product.id,
+                color=v_obj.color,
+                size=v_obj.size,
+                created_at=v_obj.created_at,
+                updated_at=v_obj.updated_at
+            )
 
+        existing_variants = variant_resolver.resolve(variants.keys(), build_variant, stats=report["DimVariantOrder"])
+        stage["rows"] = len(existing_variants)
+
+    return existing_dates, existing_users, existing_products, existing_variants
+
+def _sync_facts(unsynced_orders, dimensions, report):
+    existing_dates, existing_users, existing_products, existing_variants = dimensions
+
+    # ----------------------
+    # FactSales
+    # ----------------------
+    with measure_stage(report, "FactSales") as stage:
+        facts_to_create = []
         for o in unsynced_orders:
-            dim_date = existing_dates[o.created_at.date()]
-            dim_user = existing_users[o.user.id]
-            variant_objs = [existing_variants[i.variant.id] for i in o.items.all()]
             total_price = sum(i.quantity * i.unit_price for i in o.items.all())
             total_price_after_discount = sum((i.quantity * i.unit_price * (100 - i.discount_percent)) // 100 for i in o.items.all())
-
-            fact = FactSales(
+            facts_to_create.append(FactSales(
                 order_id=o.id,
                 status=o.status,
-                date=dim_date,
-                user=dim_user,
+                date_id=existing_dates[o.created_at.date()],
+                user_id=existing_users[o.user.id],
                 total_price=total_price,
                 total_price_after_discount=total_price_after_discount
-            )
-            facts_to_create.append(fact)
-            for v in variant_objs:
-                m2m_relations.append((o.id, v.id))
-
-        created_facts = FactSales.objects.bulk_create(facts_to_create)
-
-        m2m_objects = [
-            FactSales.variants.through(factsales_id=f.id, dimvariantorder_id=v_id)
-            for f in created_facts
-            for order_id, v_id in m2m_relations if f.order_id == order_id
-        ]
-        if m2m_objects:
-            FactSales.variants.through.objects.bulk_create(m2m_objects, ignore_conflicts=True)
-
-        report["FactSales"]["created"] = len(created_facts)
-        report["FactSales"]["existing"] = 0
+            ))
+
+        # Upserting on order_id / order_item_id makes full or partial replays safe.
+        fact_ids, created, updated = upsert_fact_sales(facts_to_create)
+        report["FactSales"]["created"] += created
+        report["FactSales"]["updated"] += updated
+        report["FactSales"]["existing"] += len(fact_ids) - created
+        stage["rows"] = len(facts_to_create)
+
+    # ----------------------
+    # FactSalesLine
+    # ----------------------
+    with measure_stage(report, "FactSalesLine") as stage:
+        lines_to_create = []
+        for o in unsynced_orders:
+            for i in o.items.all():
+                line_total = i.quantity * i.unit_price
+                lines_to_create.append(FactSalesLine(
+                    order_item_id=i.id,
+                    order_id=o.id,
+                    date_id=existing_dates[o.created_at.date()],
+                    user_id=existing_users[o.user.id],
+                    product_id=i.variant.product.id,
+                    product_version_id=existing_products[i.variant.product.id],
+                    variant_id=existing_variants[i.variant.id],
+                    status=o.status,
+                    quantity=i.quantity,
+                    unit_price=i.unit_price,
+                    discount_percent=i.discount_percent,
+                    total_price=line_total,
+                    total_after_discount=(line_total * (100 - i.discount_percent)) // 100
+                ))
 
-        # Mark orders as synced
+        order_ids = [o.id for o in unsynced_orders]
+        # (day, product) pairs of the orders before this load, whose lines may be deleted now.
+        touched_pairs = set(FactSalesLine.objects.filter(order_id__in=order_ids).values_list('date_id', 'product_id'))
+        touched_pairs.update((line.date_id, line.product_id) for line in lines_to_create)
+        created, updated, deleted = upsert_fact_sales_lines(order_ids, lines_to_create)
+        report["FactSalesLine"]["created"] += created
+        report["FactSalesLine"]["updated"] += updated
+        report["FactSalesLine"]["deleted"] += deleted
+        stage["rows"] = len(lines_to_create)
+
+    # ----------------------
+    # FactAnalytics
+    # ----------------------
+    # Only the days touched by this batch are recomputed. Workers take turns
+    # so each recompute sees the facts other workers have committed.
+    with measure_stage(report, "FactAnalytics") as stage:
+        _lock_table(FactAnalytics)
+        batch_date_ids = sorted({fact.date_id for fact in facts_to_create})
+        report["FactAnalytics"]["refreshed"] += refresh_fact_analytics(batch_date_ids)
+        stage["rows"] = len(batch_date_ids)
+        # Cached endpoint results of older versions stop matching on commit;
+        # snapshots and the cube reread the days whose facts this batch changed.
+        bump_warehouse_version(set(batch_date_ids) | {date_id for date_id, _ in touched_pairs})
+
+    # ----------------------
+    # Distinct-user sketches
+    # ----------------------
+    # The HyperLogLog sketches most-sold / top-suppliers merge user counts
+    # from are recomputed for the (day, product) pairs this batch touched and
+    # for those days' suppliers.
+    with measure_stage(report, "UserSketches") as stage:
+        _lock_table(DailyProductUserSketch)
+        product_sketches, supplier_sketches = refresh_user_sketches(touched_pairs)
+        report["UserSketches"]["products"] += product_sketches
+        report["UserSketches"]["suppliers"] += supplier_sketches
+        stage["rows"] = product_sketches + supplier_sketches
+
+    # ----------------------
+    # Mark orders as synced
+    # ----------------------
+    with measure_stage(report, "order_flags") as stage:
         Order.objects.filter(id__in=[o.id for o in unsynced_orders]).update(is_synced_analytics=True)
-
-    return report
+        stage["rows"] = len(unsynced_orders)
 
 def verify_fact_sales_totals():
     total_fact_sales = FactSales.objects.aggregate(total=Sum('total_price_after_discount'))['total'] or 0
@@ -223,73 +395,8 @@ def verify_fact_sales_totals():
     return total_fact_sales == total_order_items
 
 def simple_analysis():
-    try:
-        sales = (
-            FactSales.objects
-            .filter(exclude_from_analytics=False)
-            .select_related('date')
-        )
-
-
-        analytics_by_date = defaultdict(lambda: {
-            "total_order_quantity": 0,
-            "initial_order_quantity": 0,
-            "process_order_quantity": 0,
-            "sent_order_quantity": 0,
-            "done_order_quantity": 0,
-            "cancel_order_quantity": 0,
-            "rejected_order_quantity": 0,
-            "date": None,
-            "sale_ids": []
-        })
-
-        for sale in sales:
-            date_obj = sale.date
-            status = sale.status.lower() if sale.status else "unknown"
-            total_price_after_discount = sale.total_price_after_discount or 0
-
-            entry = analytics_by_date[date_obj.id]
-            entry["date"] = date_obj
-            entry["total_order_quantity"] += total_price_after_discount
-
-            if status == "initial":
-                entry["initial_order_quantity"] += total_price_after_discount
-            elif status == "process":
-                entry["process_order_quantity"] += total_price_after_discount
-            elif status == "sent":
-                entry["sent_order_quantity"] += total_price_after_discount
-            elif status == "done":
-                entry["done_order_quantity"] += total_price_after_discount
-            elif status == "cancel":
-                entry["cancel_order_quantity"] += total_price_after_discount
-            elif status == "rejected":
-                entry["rejected_order_quantity"] += total_price_after_discount
-
-            entry["sale_ids"].append(sale.id)
-
-        with transaction.atomic():
-            for data in analytics_by_date.values():
-
-                fa, created = FactAnalytics.objects.get_or_create(
-                    date=data["date"]
-                )
-
-                fa.total_order_quantity += data["total_order_quantity"]
-                fa.initial_order_quantity += data["initial_order_quantity"]
-                fa.process_order_quantity += data["process_order_quantity"]
-                fa.sent_order_quantity += data["sent_order_quantity"]
-                fa.done_order_quantity += data["done_order_quantity"]
-                fa.cancel_order_quantity += data["cancel_order_quantity"]
-                fa.rejected_order_quantity += data["rejected_order_quantity"]
-
-                fa.save()
-
-                FactSales.objects.filter(
-                    id__in=data["sale_ids"]
-                ).update(exclude_from_analytics=True)
-
-        return
-
-    except Exception as e:
-        raise e
-
+    # Full rebuild of FactAnalytics; the sync keeps it current incrementally.
+    with transaction.atomic():
+        dates = refresh_fact_analytics()
+        bump_warehouse_version()
+    return dates
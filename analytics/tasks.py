@@ -0,0 +1,115 @@
+import logging
+
+from celery import shared_task
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils import timezone
+
+from .models import SyncJob
+from .instrumentation import record_sync_run
+from .cube import sales_cube
+from .sync_orders_analytics import (
+    SYNC_MODE_FLAG,
+    SYNC_MODE_CDC,
+    sync_orders_analytics,
+    sync_orders_changes,
+    verify_fact_sales_totals,
+    simple_analysis,
+)
+from .parallel_sync import sync_orders_analytics_parallel, SYNC_MODE_PARALLEL, PARTITION_BY_ID
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_job(kind, params=None):
+    # Dispatched once the SyncJob row is committed, so a worker never looks
+    # for a job that does not exist yet.
+    in_memory_broker = settings.CELERY_BROKER_URL.startswith("memory://")
+    run_inline = settings.CELERY_TASK_ALWAYS_EAGER or (in_memory_broker and settings.DEBUG)
+    if in_memory_broker and not run_inline:
+        raise ImproperlyConfigured(
+            "Analytics jobs need a real CELERY_BROKER_URL: nothing consumes the in-memory broker."
+        )
+    job = SyncJob.objects.create(kind=kind, params=params or {})
+    task = JOB_TASKS[kind]
+    if run_inline:
+        transaction.on_commit(lambda: task.apply(args=[str(job.id)]))
+    else:
+        transaction.on_commit(lambda: task.delay(str(job.id)))
+    job.refresh_from_db()
+    return job
+
+def run_sync(mode=None, batch_size=None, workers=None, partition_by=None, progress=None):
+    # Picks the sync variant for a request and records it as a SyncRun.
+    workers = workers or settings.ANALYTICS_SYNC_WORKERS
+    params = {"batch_size": batch_size, "workers": workers, "partition_by": partition_by}
+    if mode == SYNC_MODE_CDC:
+        report = record_sync_run(
+            SYNC_MODE_CDC, params,
+            lambda: sync_orders_changes(batch_size=batch_size, progress=progress),
+        )
+    elif workers > 1:
+        report = record_sync_run(
+            SYNC_MODE_PARALLEL, params,
+            lambda: sync_orders_analytics_parallel(
+                workers=workers,
+                partition_by=partition_by or PARTITION_BY_ID,
+                batch_size=batch_size,
+                progress=progress,
+            ),
+        )
+    else:
+        report = record_sync_run(
+            SYNC_MODE_FLAG, params,
+            lambda: sync_orders_analytics(batch_size=batch_size, progress=progress),
+        )
+    # A cube living in this process (e.g. eager jobs in the web server) picks
+    # up the synced days now instead of on the next request.
+    if settings.ANALYTICS_CUBE_ENABLED and sales_cube.loaded:
+        sales_cube.refresh()
+    return report
+
+def _run_job(job_id, func):
+    SyncJob.objects.filter(pk=job_id).update(status="running", stage="started", started_at=timezone.now())
+
+    def progress(stage, rows_processed):
+        SyncJob.objects.filter(pk=job_id).update(stage=stage, rows_processed=rows_processed)
+
+    try:
+        result = func(progress)
+    except Exception as e:
+        logger.exception("Analytics job %s failed", job_id)
+        SyncJob.objects.filter(pk=job_id).update(status="failed", error=str(e), finished_at=timezone.now())
+        return
+    SyncJob.objects.filter(pk=job_id).update(status="success", stage="done", result=result, finished_at=timezone.now())
+
+@shared_task
+def run_sync_job(job_id):
+    params = SyncJob.objects.get(pk=job_id).params
+
+    def run(progress):
+        # Jobs sync serially: the parallel sync forks processes, which a Celery
+        # worker (or an eager web process) must not do.
+        return run_sync(
+            mode=params.get("mode"),
+            batch_size=params.get("batch_size"),
+            workers=1,
+            progress=progress,
+        )
+
+    _run_job(job_id, run)
+
+@shared_task
+def run_verify_job(job_id):
+    _run_job(job_id, lambda progress: {"totals_match": verify_fact_sales_totals()})
+
+@shared_task
+def run_simple_analysis_job(job_id):
+    _run_job(job_id, lambda progress: {"dates": simple_analysis()})
+
+JOB_TASKS = {
+    "sync": run_sync_job,
+    "verify": run_verify_job,
+    "simple_analysis": run_simple_analysis_job,
+}
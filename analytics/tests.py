@@ -1,3 +1,950 @@
-from django.test import TestCase
+import base64
+import csv
+import gzip
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+from importlib import import_module
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import jdatetime
+import numpy as np
+from django.apps import apps as django_apps
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models import Count, F, Sum
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import AgeRange, User
+from orders.models import Order, OrderItem
+from products.models import Brand, Category, Product, Variant
+from suppliers.models import Supplier
+
+from . import hll
+from .cube import sales_cube
+from .dim_dates import build_dim_dates
+from .exports import EXPORT_COLUMNS
+from .instrumentation import measure_stage
+from .models import (
+    SyncJob, SyncRun, SyncState, DailyProductUserSketch, DailySupplierUserSketch, DimDate, DimProductBase, DimUser, DimVariantOrder,
+    FactAnalytics, FactSales, FactSalesLine,
+)
+from .parallel_sync import sync_orders_analytics_parallel
+from .query import query_plans
+from .services import find_category, with_current_product
+from .sketches import refresh_user_sketches
+from .snapshots import pa, write_snapshot
+from .resolvers import DimensionKeyResolver, clear_resolver_caches
+from .result_cache import DjangoResultCache, get_warehouse_version, result_cache
+from .tasks import run_sync
+from .sync_orders_analytics import CDC_STATE_NAME, simple_analysis, sync_orders_analytics, sync_orders_changes
+
+
+FIRST_DAY = datetime(2026, 1, 1, 12, tzinfo=timezone.get_current_timezone())
+
+
+def _create_order(user, variants, day, status, rng):
+    order = Order.objects.create(user=user, status=status)
+    for variant in rng.sample(variants, rng.randint(1, 3)):
+        OrderItem.objects.create(
+            order=order, variant=variant, quantity=rng.randint(1, 4), discount_percent=rng.choice([0, 0, 10, 25])
+        )
+    Order.objects.filter(pk=order.pk).update(created_at=FIRST_DAY + timedelta(days=day))
+    return order
+
+
+def create_sales():
+    """Sixty unsynced orders of eight users over two months. Returns ``(users, variants)``."""
+    clear_resolver_caches()
+    rng = random.Random(23)
+    categories = []
+    for name in ("Home", "Sport"):
+        top = Category.objects.create(name=name)
+        middle = Category.objects.create(name=f"{name} Gear", parent=top)
+        categories += [top, middle, Category.objects.create(name=f"{name} Extras", parent=middle)]
+    brands = []
+    for name in ("Atlas Co", "Banner Trading", "Cobalt"):
+        supplier = Supplier.objects.create(name=name)
+        brands += [Brand.objects.create(name=f"{name} {n}", supplier=supplier) for n in (1, 2)]
+    brands.append(Brand.objects.create(name="Unsupplied"))
+
+    variants = []
+    for n in range(12):
+        product = Product.objects.create(
+            name=f"Product {n}", price=rng.randint(1, 50) * 1000,
+            brand=rng.choice(brands), category=rng.choice(categories + [None]),
+        )
+        variants += [Variant.objects.create(product=product, sku=f"SKU-{n}-{size}", size=size) for size in ("S", "L")]
+
+    age_ranges = [
+        AgeRange.objects.create(name="18-25", min_age=18, max_age=25),
+        AgeRange.objects.create(name="26-35", min_age=26, max_age=35),
+    ]
+    users = [
+        User.objects.create(
+            username=name, gender=rng.choice(["male", "female"]),
+            city=rng.choice(["Tehran", "Shiraz", None]), age_range=rng.choice(age_ranges + [None]),
+        )
+        for name in ("parisa", "omid", "peter", "sara", "reza", "esther", "nima", "hamed")
+    ]
+    statuses = ["initial", "process", "sent", "done", "done", "cancel", "rejected"]
+    for _ in range(60):
+        _create_order(rng.choice(users), variants, rng.randint(0, 59), rng.choice(statuses), rng)
+    return users, variants
+
+
+class SalesTestCase(TestCase):
+    """``create_sales()``, synced into the warehouse."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users, cls.variants = create_sales()
+        # The warehouse version moves when the sync's transactions commit.
+        with cls.captureOnCommitCallbacks(execute=True):
+            sync_orders_analytics()
+
+
+class BatchedSyncTests(TestCase):
+    def test_batches_sync_every_order_once(self):
+        create_sales()
+        report = sync_orders_analytics(batch_size=7)
+        self.assertEqual((report["batches"], report["orders"]), (9, 60))
+        self.assertFalse(Order.objects.filter(is_synced_analytics=False).exists())
+        self.assertEqual(FactSales.objects.count(), 60)
+        self.assertEqual(FactSalesLine.objects.count(), OrderItem.objects.count())
+
+
+class LoaderTests(TestCase):
+    def test_loaders_count_only_changed_rows(self):
+        create_sales()
+        sync_orders_analytics()
+        for loader in ("copy", "orm"):
+            with self.subTest(loader=loader), override_settings(ANALYTICS_SYNC_LOADER=loader):
+                item = OrderItem.objects.order_by("?").first()
+                OrderItem.objects.filter(pk=item.pk).update(quantity=item.quantity + 1)
+                Order.objects.update(is_synced_analytics=False)
+                report = sync_orders_analytics()
+                self.assertEqual(report["FactSales"], {"created": 0, "updated": 1, "existing": 60})
+                self.assertEqual(report["FactSalesLine"], {"created": 0, "updated": 1, "deleted": 0})
+
+
+class LoaderReplayTests(SalesTestCase):
+    def test_replay_splits_created_and_updated(self):
+        for loader in ("copy", "orm"):
+            with self.subTest(loader=loader), override_settings(ANALYTICS_SYNC_LOADER=loader):
+                order = Order.objects.filter(status="done").order_by("?").first()
+                OrderItem.objects.create(order=order, variant=self.variants[-1], quantity=1)
+                Order.objects.update(is_synced_analytics=False)
+                report = sync_orders_analytics()
+                self.assertEqual(report["FactSalesLine"], {"created": 1, "updated": 0, "deleted": 0})
+                self.assertEqual(report["FactSales"], {"created": 0, "updated": 1, "existing": 60})
+
+                Order.objects.update(is_synced_analytics=False)
+                report = sync_orders_analytics()
+                self.assertEqual(report["FactSalesLine"], {"created": 0, "updated": 0, "deleted": 0})
+                self.assertEqual(report["FactSales"], {"created": 0, "updated": 0, "existing": 60})
+
+
+class DimensionKeyResolverTests(TestCase):
+    def setUp(self):
+        self.resolver = DimensionKeyResolver(DimDate, "full_date", max_size=2)
+        self.days = [datetime(2026, 1, day).date() for day in (1, 2, 3)]
+
+    def resolve(self, days, stats=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.resolver.resolve(days, lambda day: build_dim_dates(day, day)[0], stats=stats)
+
+    def test_hits_misses_and_created_counts(self):
+        stats = {"created": 0, "existing": 0, "cache_hits": 0, "cache_misses": 0}
+        first = self.resolve(self.days[:2], stats)
+        self.assertEqual(stats, {"created": 2, "existing": 0, "cache_hits": 0, "cache_misses": 2})
+        self.assertEqual(first, dict(DimDate.objects.values_list("full_date", "id")))
+
+        self.resolver.clear()
+        self.resolve(self.days[:1])
+        stats = {"created": 0, "existing": 0, "cache_hits": 0, "cache_misses": 0}
+        self.resolve(self.days[:2], stats)
+        self.assertEqual(stats, {"created": 0, "existing": 2, "cache_hits": 1, "cache_misses": 1})
+        self.assertEqual((self.resolver.hits, self.resolver.misses), (1, 2))
+
+    def test_least_recently_used_key_is_evicted(self):
+        self.resolve(self.days[:2])
+        self.resolver.get(self.days[0])
+        self.resolve(self.days[2:])
+        self.assertEqual(self.resolver.stats()["size"], 2)
+        self.assertIsNotNone(self.resolver.get(self.days[0]))
+        self.assertIsNone(self.resolver.get(self.days[1]))
+        self.assertIsNotNone(self.resolver.get(self.days[2]))
+
+    def test_rolled_back_rows_are_not_cached(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                # Found (inserted earlier in the transaction) and created rows.
+                DimDate.objects.bulk_create(build_dim_dates(self.days[0], self.days[0]))
+                self.resolver.resolve(self.days[:2], lambda day: build_dim_dates(day, day)[0])
+                raise RuntimeError
+        self.assertFalse(DimDate.objects.exists())
+        self.assertEqual(self.resolver.stats()["size"], 0)
+
+
+class ParallelSyncTests(TransactionTestCase):
+    # Committed data, so the forked partition workers can read it.
+
+    def test_partitions_share_dimension_rows(self):
+        create_sales()
+        report = sync_orders_analytics_parallel(workers=2)
+        self.assertEqual((report["partitions"], report["orders"]), (2, 60))
+        self.assertEqual(FactSales.objects.count(), 60)
+        for model, key in ((DimUser, "user_id"), (DimVariantOrder, "variant_id"), (DimProductBase, "product_id")):
+            with self.subTest(model=model.__name__):
+                self.assertEqual(model.objects.count(), model.objects.values(key).distinct().count())
+
+    def test_jobs_refuse_parallel_sync(self):
+        response = APIClient().post("/api/analytics/sync-orders-analytics/", {"workers": 2}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(CELERY_TASK_ALWAYS_EAGER=True)
+class SyncJobTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def _enqueue(self, url="/api/analytics/sync-orders-analytics/"):
+        # Jobs are dispatched on commit; the returned callbacks run them.
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(url, {}, format="json")
+        self.assertEqual(response.status_code, 202, response.content)
+        return f"/api/analytics/jobs/{response.json()['job']['job_id']}/", callbacks
+
+    def test_sync_job_lifecycle(self):
+        create_sales()
+        job_url, callbacks = self._enqueue()
+        self.assertEqual(self.client.get(job_url).json()["status"], "pending")
+        for callback in callbacks:
+            callback()
+        job = self.client.get(job_url).json()
+        self.assertEqual((job["status"], job["stage"], job["rows_processed"]), ("success", "done", 60))
+        self.assertEqual(job["result"]["orders"], 60)
+        self.assertIsNotNone(job["finished_at"])
+
+    def test_failed_job_reports_its_error(self):
+        job_url, callbacks = self._enqueue()
+        with mock.patch("analytics.tasks.run_sync", side_effect=RuntimeError("broker lost")), self.assertLogs("analytics.tasks", "ERROR"):
+            for callback in callbacks:
+                callback()
+        job = self.client.get(job_url).json()
+        self.assertEqual((job["status"], job["error"]), ("failed", "broker lost"))
+
+    def test_unknown_job(self):
+        self.assertEqual(self.client.get(f"/api/analytics/jobs/{uuid.uuid4()}/").status_code, 404)
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=False, DEBUG=False)
+    def test_in_memory_broker_is_refused_outside_debug(self):
+        response = self.client.post("/api/analytics/verify-totals/", {}, format="json")
+        self.assertEqual(response.status_code, 500)
+        self.assertFalse(SyncJob.objects.exists())
+
+
+class SyncRunTests(TestCase):
+    def test_measure_stage_accumulates_rows_queries_and_time(self):
+        report = {"stages": {}}
+        for rows in (3, 4):
+            with measure_stage(report, "probe") as stage:
+                Order.objects.count()
+                stage["rows"] = rows
+        probe = report["stages"]["probe"]
+        self.assertEqual((probe["rows"], probe["queries"]), (7, 2))
+        self.assertGreater(probe["seconds"], 0)
+        self.assertGreaterEqual(probe["seconds"], probe["sql_seconds"])
+        self.assertEqual(probe["rows_per_second"], round(7 / probe["seconds"], 1))
+
+    def test_sync_run_keeps_report_and_stages(self):
+        create_sales()
+        report = run_sync()
+        stages = report["stages"]
+        for name, rows in (
+            ("load_orders", 60),
+            ("FactSales", 60),
+            ("FactSalesLine", OrderItem.objects.count()),
+            ("order_flags", 60),
+        ):
+            with self.subTest(stage=name):
+                self.assertEqual(stages[name]["rows"], rows)
+                self.assertGreater(stages[name]["seconds"], 0)
+        for name in ("DimDate", "DimUser", "DimProductBase", "DimVariantOrder", "FactAnalytics"):
+            self.assertIn(name, stages)
+
+        run = SyncRun.objects.get(pk=report["sync_run_id"])
+        self.assertEqual((run.mode, run.status, run.orders_processed), ("flag", "success", 60))
+        self.assertGreater(run.duration_seconds, 0)
+        self.assertIsNotNone(run.finished_at)
+        self.assertEqual(run.report["stages"]["FactSales"]["rows"], 60)
+
+    def test_failed_sync_run_records_its_error(self):
+        with mock.patch("analytics.tasks.sync_orders_analytics", side_effect=RuntimeError("connection lost")):
+            with self.assertRaises(RuntimeError):
+                run_sync()
+        run = SyncRun.objects.get()
+        self.assertEqual((run.status, run.error, run.orders_processed), ("failed", "connection lost", 0))
+        self.assertIsNotNone(run.duration_seconds)
+        self.assertIsNotNone(run.finished_at)
+        self.assertIsNone(run.report)
+
+
+class ChangeCaptureTests(TestCase):
+    def setUp(self):
+        create_sales()
+
+    @override_settings(ANALYTICS_CDC_SAFETY_LAG=0)
+    def test_watermark_follows_synced_changes(self):
+        self.assertEqual(sync_orders_changes(batch_size=25)["orders"], 60)
+        state = SyncState.objects.get(name=CDC_STATE_NAME)
+        last = Order.objects.order_by("updated_at", "id").last()
+        self.assertEqual((state.watermark_updated_at, state.watermark_id), (last.updated_at, last.id))
+        self.assertEqual(sync_orders_changes()["orders"], 0)
+
+        # Item edits bump their order past the watermark.
+        item = OrderItem.objects.order_by("id").first()
+        item.quantity += 1
+        item.save()
+        self.assertEqual(sync_orders_changes()["orders"], 1)
+        self.assertEqual(SyncState.objects.get(name=CDC_STATE_NAME).watermark_id, item.order_id)
+
+    @override_settings(ANALYTICS_CDC_SAFETY_LAG=3600)
+    def test_safety_lag_holds_back_recent_changes(self):
+        self.assertEqual(sync_orders_changes()["orders"], 0)
+        self.assertIsNone(SyncState.objects.get(name=CDC_STATE_NAME).watermark_updated_at)
+        self.assertFalse(FactSales.objects.exists())
+
+
+class IdempotentSyncTests(TestCase):
+    def test_resync_does_not_duplicate_facts(self):
+        create_sales()
+        sync_orders_analytics()
+        facts = list(FactSales.objects.order_by("order_id").values())
+        lines = list(FactSalesLine.objects.order_by("order_item_id").values())
+
+        Order.objects.update(is_synced_analytics=False)
+        report = sync_orders_analytics(batch_size=13)
+        self.assertEqual(report["FactSales"], {"created": 0, "updated": 0, "existing": 60})
+        self.assertEqual(list(FactSales.objects.order_by("order_id").values()), facts)
+        self.assertEqual(list(FactSalesLine.objects.order_by("order_item_id").values()), lines)
+
+
+class DimDateTests(TestCase):
+    def test_calendar_matches_jdatetime(self):
+        # Spans several Jalali leap years (1399, 1403, 1408) and month ends.
+        start, end = datetime(2019, 3, 1).date(), datetime(2031, 3, 31).date()
+        rows = build_dim_dates(start, end)
+        self.assertEqual(len(rows), (end - start).days + 1)
+        for row in rows:
+            j = jdatetime.date.fromgregorian(date=row.full_date)
+            self.assertEqual(
+                (row.jalali_date, row.day_of_week, row.month_name, row.quarter, row.is_holiday),
+                (j.strftime("%Y-%m-%d"), j.j_weekdays_en[j.weekday()], j.j_months_en[j.month - 1],
+                 (j.month - 1) // 3 + 1, j.weekday() == 6),
+                row.full_date,
+            )
+
+
+class SlowlyChangingProductTests(TestCase):
+    def test_attribute_change_closes_version_and_inserts_current(self):
+        users, variants = create_sales()
+        sync_orders_analytics()
+        product = variants[0].product
+        old = DimProductBase.objects.get(product_id=product.id)
+        old_lines = set(FactSalesLine.objects.filter(product_id=product.id).values_list("id", flat=True))
+
+        Product.objects.filter(pk=product.pk).update(price=product.price + 1000)
+        order = _create_order(users[0], variants[:1], 70, "done", random.Random(1))
+        sync_orders_analytics()
+
+        versions = DimProductBase.objects.filter(product_id=product.id).order_by("valid_from", "id")
+        self.assertEqual(versions.count(), 2)
+        closed, current = versions
+        self.assertEqual(closed.id, old.id)
+        self.assertFalse(closed.is_current)
+        self.assertIsNotNone(closed.valid_to)
+        self.assertTrue(current.is_current)
+        self.assertIsNone(current.valid_to)
+        self.assertEqual(current.price, product.price + 1000)
+        self.assertNotEqual(current.row_hash, closed.row_hash)
+        # History keeps pointing at the version that was current when it was sold.
+        self.assertEqual(
+            set(FactSalesLine.objects.filter(product_version=closed).values_list("id", flat=True)), old_lines
+        )
+        self.assertTrue(FactSalesLine.objects.filter(order_id=order.id, product_version=current).exists())
+
+    def test_resync_keeps_the_version_lines_were_loaded_with(self):
+        create_sales()
+        sync_orders_analytics()
+        lines = FactSalesLine.objects.order_by("product_id", "id").distinct("product_id")[:2]
+        for loader, line in zip(("copy", "orm"), lines):
+            with self.subTest(loader=loader), override_settings(ANALYTICS_SYNC_LOADER=loader):
+                original = line.product_version_id
+                Product.objects.filter(pk=line.product_id).update(price=F("price") + 1000)
+                Order.objects.filter(pk=line.order_id).update(status="rejected", is_synced_analytics=False)
+                report = sync_orders_analytics()
+
+                self.assertEqual(report["DimProductBase"]["versioned"], 1)
+                line.refresh_from_db()
+                self.assertEqual((line.product_version_id, line.status), (original, "rejected"))
+                self.assertFalse(DimProductBase.objects.get(pk=original).is_current)
+
+
+class ItemEditSyncTests(SalesTestCase):
+    def test_item_edit_flags_order_and_sync_reupserts_totals_and_lines(self):
+        order = Order.objects.annotate(items_count=Count("items")).filter(items_count__gt=1).first()
+        first, second = order.items.all()[:2]
+        with CaptureQueriesContext(connection) as queries:
+            first.quantity += 2
+            first.save()
+        order_updates = [q for q in queries.captured_queries if q["sql"].startswith('UPDATE "Order" ')]
+        self.assertEqual(len(order_updates), 1)
+        second.delete()
+        self.assertFalse(Order.objects.get(pk=order.pk).is_synced_analytics)
+
+        self.assertEqual(sync_orders_analytics()["orders"], 1)
+        fact = FactSales.objects.get(order_id=order.id)
+        lines = FactSalesLine.objects.filter(order_id=order.id)
+        totals = lines.aggregate(total_price=Sum("total_price"), total_after_discount=Sum("total_after_discount"))
+        self.assertEqual(fact.total_price, totals["total_price"])
+        self.assertEqual(fact.total_price_after_discount, totals["total_after_discount"])
+        self.assertEqual(
+            sorted(lines.values_list("order_item_id", "quantity")),
+            sorted(order.items.values_list("id", "quantity")),
+        )
+        self.assertTrue(Order.objects.get(pk=order.pk).is_synced_analytics)
+
+
+class WarehouseVersionTests(SalesTestCase):
+    def test_bumps_coalesce_per_transaction(self):
+        version = get_warehouse_version()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                for fact in FactSales.objects.order_by("id")[:5]:
+                    fact.status = "done"
+                    fact.save()
+            self.assertEqual(get_warehouse_version(), version)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(get_warehouse_version(), version + 1)
+
+
+class IncrementalAnalyticsTests(TestCase):
+    def test_incremental_rollup_equals_full_rebuild(self):
+        users, variants = create_sales()
+        sync_orders_analytics(batch_size=7)
+        # Inline status changes apply deltas; a late order re-touches an old day.
+        for order in Order.objects.exclude(status__in=["cancel", "rejected"]).order_by("id")[:10]:
+            order.status = "cancel" if order.status == "done" else "done"
+            order.save()
+        late = _create_order(users[0], variants, 3, "sent", random.Random(5))
+        sync_orders_analytics()
+        # Deleting a sale inline may leave its day without sales.
+        FactSales.objects.get(order_id=late.id).delete()
+
+        fields = [field.attname for field in FactAnalytics._meta.concrete_fields if field.name != "id"]
+        incremental = list(FactAnalytics.objects.order_by("date_id").values_list(*fields))
+        simple_analysis()
+        self.assertEqual(list(FactAnalytics.objects.order_by("date_id").values_list(*fields)), incremental)
+        expected = dict(FactSales.objects.values_list("date_id").annotate(Sum("total_price_after_discount")))
+        self.assertEqual({row[0]: row[1] for row in incremental}, expected)
+
+
+class ResultCacheTests(SalesTestCase):
+    URL = "/api/analytics/orders-by-status/"
+
+    def setUp(self):
+        self.client = APIClient()
+        result_cache.clear()
+
+    def test_hit_miss_and_invalidation(self):
+        first = self.client.get(self.URL, {"start": "2026-01-15", "end": "2026-02-15"})
+        self.assertEqual(first["X-Cache"], "MISS")
+        with mock.patch("analytics.views.get_orders_by_status") as compute:
+            # Parameter order does not change the entry.
+            again = self.client.get(f"{self.URL}?end=2026-02-15&start=2026-01-15")
+            compute.assert_not_called()
+        self.assertEqual(again["X-Cache"], "HIT")
+        self.assertEqual(again.json(), first.json())
+        self.assertEqual(self.client.get(self.URL, {"start": "2026-01-16"})["X-Cache"], "MISS")
+
+        # A committed fact change moves the version, so the next read recomputes.
+        fact = FactSales.objects.filter(date__full_date__range=("2026-01-15", "2026-02-15")).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            fact.total_price_after_discount += 1000
+            fact.save()
+        fresh = self.client.get(self.URL, {"start": "2026-01-15", "end": "2026-02-15"})
+        self.assertEqual(fresh["X-Cache"], "MISS")
+        self.assertNotEqual(fresh.json(), first.json())
+        self.assertEqual(result_cache.stats()["hits"], 1)
+
+
+    def test_django_backend_clear_keeps_other_entries_of_the_alias(self):
+        shared = caches["default"]
+        shared.set("sessions:unrelated", "kept")
+        backend = DjangoResultCache("default", 60)
+        backend.set("analytics:orders-by-status:v1:abc", {"total": 1})
+        self.assertEqual(backend.get("analytics:orders-by-status:v1:abc"), {"total": 1})
+
+        backend.clear()
+        self.assertIsNone(backend.get("analytics:orders-by-status:v1:abc"))
+        self.assertIsNone(DjangoResultCache("default", 60).get("analytics:orders-by-status:v1:abc"))
+        self.assertEqual(shared.get("sessions:unrelated"), "kept")
+
+class ConditionalRequestTests(SalesTestCase):
+    URL = "/api/analytics/top-users/?page_size=3"
+
+    def setUp(self):
+        self.client = APIClient()
+        result_cache.clear()
+
+    def test_matching_etag_returns_304_before_compute(self):
+        response = self.client.get(self.URL)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+
+        with mock.patch("analytics.views.TopUsersAPI.get_data") as compute:
+            for header in (etag, f"W/{etag}", f'"other", {etag}'):
+                with self.subTest(header=header):
+                    response = self.client.get(self.URL, HTTP_IF_NONE_MATCH=header)
+                    self.assertEqual(response.status_code, 304)
+                    self.assertEqual(response["ETag"], etag)
+            compute.assert_not_called()
+        self.assertEqual(self.client.get("/api/analytics/top-users/?page_size=4", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_version_bump_changes_etag(self):
+        etag = self.client.get(self.URL)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            FactSales.objects.first().save()
+        response = self.client.get(self.URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+class KeysetPaginationTests(SalesTestCase):
+    URL = "/api/analytics/fact-sales/"
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_cursor_pages_cover_every_line_once_in_order(self):
+        served = []
+        url = f"{self.URL}?pagination=cursor&page_size=7"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            page = response.json()
+            self.assertNotIn("count", page)
+            self.assertLessEqual(len(page["results"]), 7)
+            served += [(row["order_id"], row["product_id"], row["quantity"]) for row in page["results"]]
+            url = page["next"]
+        expected = list(FactSalesLine.objects.order_by("date_id", "id").values_list("order_id", "product_id", "quantity"))
+        self.assertEqual(served, expected)
+
+    def test_bad_cursor_is_rejected(self):
+        for cursor in ("not-base64!", base64.urlsafe_b64encode(b"3:x").decode(), base64.urlsafe_b64encode(b"\xff").decode()):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(self.URL, {"cursor": cursor})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {"error": "Invalid cursor."})
+
+
+class TopUsersTests(SalesTestCase):
+    URL = "/api/analytics/top-users/"
+
+    def setUp(self):
+        self.client = APIClient()
+        result_cache.clear()
+
+    def expected_ranking(self):
+        totals = FactSales.objects.values("user__username").annotate(orders=Count("id"), spent=Sum("total_price_after_discount"))
+        rows = sorted(totals, key=lambda row: -row["orders"])
+        ranking = []
+        for position, row in enumerate(rows, 1):
+            rank = ranking[-1][1] if ranking and ranking[-1][2] == row["orders"] else position
+            ranking.append((row["user__username"], rank, row["orders"], row["spent"]))
+        return ranking
+
+    def test_ranks_and_pages_come_from_sql(self):
+        expected = self.expected_ranking()
+        everything = self.client.get(self.URL, {"page_size": 100}).json()
+        self.assertEqual(everything["count"], len(expected))
+        self.assertEqual(
+            sorted((row["username"], row["rank"], row["total_orders"], row["total_spent"]) for row in everything["results"]),
+            sorted(expected),
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            page = self.client.get(self.URL, {"page_size": 3, "page": 2}).json()
+        self.assertEqual(page["results"], everything["results"][3:6])
+        # Only the requested page leaves the database, ranked by the window function.
+        ranked = [query["sql"] for query in queries if "RANK()" in query["sql"]]
+        self.assertEqual(len(ranked), 1)
+        self.assertIn("LIMIT 3 OFFSET 3", ranked[0])
+
+
+class HyperLogLogTests(SimpleTestCase):
+    def test_estimate_is_within_three_standard_errors(self):
+        ids = random.Random(7).sample(range(10**9), 10000)
+        self.assertLessEqual(abs(hll.count(hll.sketch(ids)) - 10000), 3 * hll.STANDARD_ERROR * 10000)
+
+    def test_merge_is_the_sketch_of_the_union(self):
+        rng = random.Random(11)
+        first, second = rng.sample(range(10**6), 3000), rng.sample(range(10**6), 5000)
+        merged = hll.merge([hll.to_bytes(hll.sketch(first)), hll.sketch(second)])
+        np.testing.assert_array_equal(merged, hll.sketch(first + second))
+
+    def test_encodings_round_trip_by_format_byte(self):
+        registers = hll.sketch(range(500))
+        for encoding in (hll.FORMAT_RAW, hll.FORMAT_ZLIB):
+            with self.subTest(encoding=encoding):
+                data = hll.to_bytes(registers, encoding)
+                self.assertEqual(data[0], encoding)
+                np.testing.assert_array_equal(hll.from_bytes(data), registers)
+        for data in (b"", bytes([7]) + registers.tobytes(), bytes([hll.FORMAT_RAW]) + registers.tobytes()[1:]):
+            with self.assertRaises(ValueError):
+                hll.from_bytes(data)
+
+
+class UserSketchTests(TestCase):
+    def setUp(self):
+        self.users, self.variants = create_sales()
+        sync_orders_analytics()
+
+    def stored_sketches(self):
+        return (
+            set(DailyProductUserSketch.objects.values_list("date_id", "product_id", "registers")),
+            set(DailySupplierUserSketch.objects.values_list("date_id", "supplier", "registers")),
+        )
+
+    def test_backfill_matches_a_rebuild(self):
+        synced = self.stored_sketches()
+        DailyProductUserSketch.objects.all().delete()
+        DailySupplierUserSketch.objects.all().delete()
+        import_module("analytics.migrations.0026_backfill_user_sketches").backfill_user_sketches(django_apps, None)
+        self.assertEqual(self.stored_sketches(), synced)
+
+    def test_supplier_change_moves_past_days(self):
+        product = self.variants[0].product
+        old_supplier = DimProductBase.objects.get(product_id=product.id).supplier
+        product.brand = Brand.objects.exclude(supplier__name=old_supplier).exclude(supplier=None).first()
+        product.save()
+        _create_order(self.users[0], self.variants[:1], 70, "done", random.Random(2))
+        sync_orders_analytics()
+
+        self.assertNotEqual(DimProductBase.objects.get(product_id=product.id, is_current=True).supplier, old_supplier)
+        incremental = self.stored_sketches()
+        refresh_user_sketches()
+        self.assertEqual(self.stored_sketches(), incremental)
+
+
+class SalesExportTests(SalesTestCase):
+    URL = "/api/analytics/fact-sales/export/"
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def body(self, response):
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content)
+
+    def test_every_line_is_exported_once(self):
+        expected = sorted(FactSalesLine.objects.values_list("order_item_id", flat=True))
+        rows = [json.loads(line) for line in self.body(self.client.get(self.URL)).decode().splitlines()]
+        self.assertEqual(sorted(row["order_item_id"] for row in rows), expected)
+
+        lines = list(csv.reader(io.StringIO(self.body(self.client.get(self.URL, {"file_format": "csv"})).decode())))
+        self.assertEqual(lines[0], list(EXPORT_COLUMNS))
+        self.assertEqual(sorted(int(line[1]) for line in lines[1:]), expected)
+
+        done = self.body(self.client.get(self.URL, {"status": "done"})).decode().splitlines()
+        self.assertEqual(len(done), FactSalesLine.objects.filter(status="done").count())
+        self.assertEqual(self.client.get(self.URL, {"file_format": "xml"}).status_code, 400)
+
+    def test_gzip_output_decompresses_to_the_plain_export(self):
+        # Small blocks so the body is compressed across many chunks.
+        with mock.patch("analytics.exports._BLOCK_SIZE", 512):
+            plain = self.body(self.client.get(self.URL, {"file_format": "csv"}))
+            response = self.client.get(self.URL, {"file_format": "csv"}, HTTP_ACCEPT_ENCODING="br, gzip")
+            compressed = self.body(response)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertLess(len(compressed), len(plain))
+        self.assertEqual(gzip.decompress(compressed), plain)
+
+    def test_gzip_refused_by_q_value_is_not_used(self):
+        for accept_encoding in ("gzip;q=0", "br, gzip; q=0.0", "*;q=0", "identity, *;q=0.5, gzip;q=0"):
+            with self.subTest(accept_encoding=accept_encoding):
+                response = self.client.get(self.URL, {"file_format": "csv"}, HTTP_ACCEPT_ENCODING=accept_encoding)
+                self.assertNotIn("Content-Encoding", response)
+                self.assertIn("Accept-Encoding", response["Vary"])
+                self.assertTrue(self.body(response).startswith(b"order_id,"))
+        for accept_encoding in ("gzip;q=0.5", "deflate, *"):
+            with self.subTest(accept_encoding=accept_encoding):
+                response = self.client.get(self.URL, {"file_format": "csv"}, HTTP_ACCEPT_ENCODING=accept_encoding)
+                self.assertEqual(response["Content-Encoding"], "gzip")
+
+
+@skipUnless(pa, "pyarrow is not installed")
+class SnapshotTests(SalesTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def snapshot_rows(self, table, month):
+        path = os.path.join(self.directory, table, f"month={month}", "part-0.parquet")
+        return pa.parquet.read_table(path).num_rows
+
+    def test_refresh_rewrites_only_months_with_changed_days(self):
+        report = write_snapshot(self.directory)
+        self.assertEqual(report["tables"]["fact_sales"]["written"], ["2026-01", "2026-02", "2026-03"])
+        self.assertTrue(write_snapshot(self.directory)["up_to_date"])
+
+        # A new order in April, and a status change on a January sale.
+        _create_order(self.users[0], self.variants, 95, "done", random.Random(3))
+        with self.captureOnCommitCallbacks(execute=True):
+            sync_orders_analytics()
+            fact = FactSales.objects.filter(date__full_date__month=1).first()
+            fact.status = "rejected"
+            fact.save()
+        report = write_snapshot(self.directory)
+        for table, model in (("fact_sales", FactSales), ("fact_sales_line", FactSalesLine)):
+            self.assertEqual(report["tables"][table]["written"], ["2026-01", "2026-04"])
+            self.assertEqual(report["tables"][table]["partitions"], 4)
+            for month in (1, 2, 3, 4):
+                self.assertEqual(
+                    self.snapshot_rows(table, f"2026-{month:02d}"),
+                    model.objects.filter(date__full_date__month=month).count(),
+                )
+        self.assertEqual(report["tables"]["dim_product"]["written"], [])
+
+
+class SalesCubeParityTests(SalesTestCase):
+    """The in-process cube answers the aggregate endpoints exactly like the SQL path."""
+
+    URLS = [
+        "/api/analytics/most-sold/?exact=true&page_size=100",
+        "/api/analytics/most-sold/?exact=true&page_size=5&page=2",
+        "/api/analytics/most-sold/?exact=true&day_of_week=monday",
+        "/api/analytics/most-sold/?exact=true&is_holiday=false&start=2026-01-10&end=2026-02-10",
+        "/api/analytics/most-sold/?exact=true&supplier=an",
+        "/api/analytics/most-sold/?exact=true&start=2030-01-01",
+        "/api/analytics/top-users/?page_size=100",
+        "/api/analytics/top-users/?city=tehran&page_size=100",
+        "/api/analytics/top-users/?gender=FEMALE&age_range=18-25",
+        "/api/analytics/top-users/?username=E&start=2026-02-01&page_size=2&page=2",
+        "/api/analytics/top-suppliers/?exact=true&page_size=100",
+        "/api/analytics/top-suppliers/?exact=true&supplier_name=CO&end=2026-02-15",
+        "/api/analytics/orders-by-status/",
+        "/api/analytics/orders-by-status/?start=2026-01-15&end=2026-02-15",
+    ]
+
+    def setUp(self):
+        self.client = APIClient()
+        result_cache.clear()
+        sales_cube.clear()
+
+    def _get(self, url, cube):
+        result_cache.clear()
+        with override_settings(ANALYTICS_CUBE_ENABLED=cube):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        data = response.json()
+        if isinstance(data, list):
+            data.sort(key=lambda row: json.dumps(row, sort_keys=True))
+        return data
+
+    def assertParity(self, url):
+        self.assertEqual(self._get(url, cube=True), self._get(url, cube=False), url)
+
+    def test_endpoints_match_sql(self):
+        for url in self.URLS:
+            with self.subTest(url=url):
+                self.assertParity(url)
+        self.assertEqual(sales_cube.loads, 1)
+
+    def test_refresh_reloads_only_synced_days(self):
+        sales_cube.current()
+        days_reloaded = sales_cube.days_reloaded
+
+        # A new user's order on a new day, and a re-synced status change.
+        rng = random.Random(5)
+        newcomer = User.objects.create(username="newcomer", city="Tehran", gender="female")
+        _create_order(newcomer, self.variants, 75, "done", rng)
+        changed = Order.objects.filter(status="initial").order_by('id').first()
+        Order.objects.filter(pk=changed.pk).update(status="cancel", is_synced_analytics=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            sync_orders_analytics()
+
+        sales_cube.refresh()
+        # One day per order, reloaded in both fact tables.
+        self.assertIn(sales_cube.days_reloaded - days_reloaded, range(2, 5))
+        for url in self.URLS:
+            with self.subTest(url=url):
+                self.assertParity(url)
+
+    def test_version_bump_without_fact_changes_reloads_no_day(self):
+        sales_cube.current()
+        loads, days_reloaded = sales_cube.loads, sales_cube.days_reloaded
+        with self.captureOnCommitCallbacks(execute=True):
+            simple_analysis()
+        with CaptureQueriesContext(connection) as queries:
+            sales_cube.refresh()
+        self.assertEqual((sales_cube.loads, sales_cube.days_reloaded), (loads + 1, days_reloaded))
+        self.assertFalse([query for query in queries if '"FactSalesLine"' in query["sql"]])
+
+
+class SalesQueryTests(SalesTestCase):
+    URL = "/api/analytics/query/"
+
+    def setUp(self):
+        self.client = APIClient()
+        result_cache.clear()
+        query_plans.clear()
+
+    def _query(self, **params):
+        response = self.client.get(self.URL, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_groups_match_orm(self):
+        data = self._query(
+            dimensions="supplier,status", measures="revenue,quantity,orders,distinct_users",
+            status="done,sent,cancel", start="2026-01-15", limit=1000,
+        )
+        expected = (
+            with_current_product(FactSalesLine.objects)
+            .filter(status__in=["done", "sent", "cancel"], date__full_date__gte="2026-01-15")
+            .values_list("current_product__supplier", "status")
+            .annotate(Sum("total_after_discount"), Sum("quantity"), Count("order_id", distinct=True), Count("user", distinct=True))
+        )
+        self.assertEqual(data["count"], len(expected))
+        self.assertCountEqual([tuple(row.values()) for row in data["results"]], list(expected))
+
+    def test_pages_share_one_plan(self):
+        ranked = self._query(dimensions="month_name,city", measures="revenue", limit=1000)["results"]
+        page = self._query(dimensions="month_name,city", measures="revenue", limit=2, offset=2)
+        self.assertEqual(page["results"], ranked[2:4])
+        past_end = self._query(dimensions="month_name,city", measures="revenue", offset=len(ranked))
+        self.assertEqual((past_end["count"], past_end["results"]), (len(ranked), []))
+        self.assertEqual(query_plans.stats()["misses"], 1)
+
+    def test_empty_range_has_no_groups(self):
+        for dimensions in ("", "city"):
+            with self.subTest(dimensions=dimensions):
+                data = self._query(dimensions=dimensions, measures="revenue,lines", start="2030-01-01")
+                self.assertEqual((data["count"], data["results"]), (0, []))
+        total = self._query(measures="revenue,lines")
+        self.assertEqual(total["count"], 1)
+        self.assertEqual(total["results"][0]["lines"], FactSalesLine.objects.count())
+
+    def test_rejects_malformed_requests(self):
+        for params in ({"dimensions": "city"}, {"measures": "revenue", "quarter": "first"},
+                       {"measures": "revenue", "order_by": "city"}, {"measures": "revenue", "colour": "red"}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(self.URL, params).status_code, 400)
+
+
+
+
+class ProductAttributionTests(SalesTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        result_cache.clear()
+
+    def _get(self, url, params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def _query(self, dimension):
+        rows = self._get("/api/analytics/query/", {"dimensions": dimension, "measures": "quantity", "limit": 1000})["results"]
+        return {row[dimension]: row["quantity"] for row in rows}
+
+    def _resync_product(self, product):
+        # Only products of synced orders are versioned.
+        Order.objects.filter(items__variant__product=product).update(is_synced_analytics=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            sync_orders_analytics()
+
+    def test_past_sales_follow_the_current_supplier_everywhere(self):
+        product = self.variants[0].product
+        old_supplier = product.brand.supplier.name
+        at_sale = self._query("supplier_at_sale")
+        self.assertEqual(self._query("supplier"), at_sale)
+
+        product.brand = Brand.objects.exclude(supplier__name=old_supplier).exclude(supplier=None).first()
+        product.save()
+        self._resync_product(product)
+
+        top = self._get("/api/analytics/top-suppliers/", {"exact": "true", "page_size": 100})["results"]
+        by_supplier = self._query("supplier")
+        self.assertEqual({row["supplier"]: row["total_quantity_sold"] for row in top}, by_supplier)
+        self.assertNotEqual(by_supplier, at_sale)
+        self.assertEqual(self._query("supplier_at_sale"), at_sale)
+
+    def test_category_change_moves_past_sales_in_cached_rollups(self):
+        product = Product.objects.filter(
+            category__parent__parent__isnull=False, id__in=FactSalesLine.objects.values("product_id")
+        ).first()
+        root = Category.objects.filter(parent=None).exclude(pk=product.category.parent.parent_id).first()
+        sold = FactSalesLine.objects.filter(product_id=product.id).aggregate(total=Sum("quantity"))["total"]
+        roots = {node["category"]: node["total_quantity"] for node in self._get("/api/analytics/category-rollup/", {})["children"]}
+        by_level_1 = self._query("category_level_1")
+
+        product.category = root
+        product.save()
+        self._resync_product(product)
+
+        tree = self._get("/api/analytics/category-rollup/", {})
+        self.assertEqual(
+            {node["category"]: node["total_quantity"] for node in tree["children"]}[root.name],
+            roots[root.name] + sold,
+        )
+        self.assertEqual(self._query("category_level_1")[root.name], by_level_1.get(root.name, 0) + sold)
+
+class CategoryRollupTests(SalesTestCase):
+    URL = "/api/analytics/category-rollup/"
+
+    def setUp(self):
+        self.client = APIClient()
+        result_cache.clear()
+
+    def test_every_level_matches_its_lines(self):
+        tree = self.client.get(self.URL, {"status": "done"}).json()
+
+        # Each line counts towards every category on its root-first path.
+        expected = {}
+        lines = with_current_product(FactSalesLine.objects.filter(status="done")).values_list(
+            "current_product__category_level_3", "current_product__category_level_2",
+            "current_product__category_level_1", "total_price",
+        )
+        for *levels, price in lines:
+            path = [level for level in levels if level] or [None]
+            for category in path:
+                expected[category] = expected.get(category, 0) + price
+
+        seen = {}
+        nodes = list(tree["children"])
+        while nodes:
+            node = nodes.pop()
+            seen[node["category"]] = node["total_sold_price"]
+            nodes += node["children"]
+        self.assertEqual(seen, expected)
+        self.assertEqual(tree["total_sold_price"], sum(price for *_, price in lines))
+
+    def test_drill_down_reuses_the_tree(self):
+        tree = self.client.get(self.URL).json()
+        with self.assertNumQueries(2):  # warehouse version lookups only
+            response = self.client.get(self.URL, {"category": "Home Gear"})
+        self.assertEqual(response.json(), find_category(tree, "Home Gear"))
+        self.assertEqual(self.client.get(self.URL, {"category": "Garden"}).status_code, 404)
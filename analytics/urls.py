@@ -3,11 +3,18 @@ from .views import (
                         SyncOrdersAnalyticsAPI,
                         VerifyFactSalesTotalsAPI,
                         FactSalesListAPIView,
+                        SalesExportAPI,
+                        SalesQueryAPI,
+                        CategoryRollupAPI,
                         SimpleAnalysisAPI,
                         TopUsersAPI,
                         OrdersByStatusAPI,
                         MostSoldProductsAPI,
-                        TopSuppliersAPI
+                        TopSuppliersAPI,
+                        SimpleAnalysisRunAPI,
+                        SyncJobStatusAPI,
+                        SyncRunListAPI,
+                        ResultCacheStatsAPI
                     )
 
     
@@ -16,9 +23,16 @@ urlpatterns = [
     path('sync-orders-analytics/', SyncOrdersAnalyticsAPI.as_view(), name='sync_orders_analytics'),
     path('verify-totals/', VerifyFactSalesTotalsAPI.as_view(), name='verify_fact_sales_totals'),
     path('fact-sales/', FactSalesListAPIView.as_view(), name='fact_sales_list'),
+    path('fact-sales/export/', SalesExportAPI.as_view(), name='fact_sales_export'),
     path('simple-analysis/', SimpleAnalysisAPI.as_view(), name='simple_analysis'),
+    path('simple-analysis/run/', SimpleAnalysisRunAPI.as_view(), name='simple_analysis_run'),
+    path('jobs/<uuid:job_id>/', SyncJobStatusAPI.as_view(), name='sync_job_status'),
+    path('sync-runs/', SyncRunListAPI.as_view(), name='sync_run_list'),
+    path('cache-stats/', ResultCacheStatsAPI.as_view(), name='result_cache_stats'),
     path("most-sold/", MostSoldProductsAPI.as_view()),
     path("orders-by-status/", OrdersByStatusAPI.as_view()),
     path("top-users/", TopUsersAPI.as_view()),
     path("top-suppliers/", TopSuppliersAPI.as_view(), name="top_suppliers"),
+    path("query/", SalesQueryAPI.as_view(), name="sales_query"),
+    path("category-rollup/", CategoryRollupAPI.as_view(), name="category_rollup"),
 ]
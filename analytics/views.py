@@ -1,24 +1,55 @@
+import base64
 from collections import defaultdict
 from django.utils.dateparse import parse_date
-from django.db.models import Sum, F, Count
+from django.db.models import Sum, Count, Q
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.utils.urls import replace_query_param
 from django_filters.rest_framework import DjangoFilterBackend
 
-from .models import FactSales, DimVariantOrder, DimProductBase, FactAnalytics
+from .models import (
+    FactSales,
+    FactSalesLine,
+    DimProductBase,
+    FactAnalytics,
+    SyncJob,
+    SyncRun,
+    DailyProductUserSketch,
+    DailySupplierUserSketch
+)
 from .serializers import (
-    FactSalesVariantSerializer,
+    FactSalesLineSerializer,
     FactAnalyticsSerializer,
     MostSoldProductSerializer,
     TopUserSerializer,
-    TopSupplierSerializer
+    TopSupplierSerializer,
+    SyncJobSerializer,
+    SyncRunSerializer
+)
+from .filters import (
+    FactAnalyticsFilter,
+    MostSoldProductsFilter,
+    OrdersByStatusFilter,
+    TopUsersFilter,
+    TopSuppliersFilter,
+    SupplierUserSketchFilter,
+    SalesExportFilter,
+    CategoryRollupFilter
 )
-from .filters import FactAnalyticsFilter, MostSoldProductsFilter, OrdersByStatusFilter, TopUsersFilter, TopSuppliersFilter
-from .sync_orders_analytics import sync_orders_analytics, verify_fact_sales_totals, simple_analysis
-from .services import get_orders_by_status, get_top_users, get_top_suppliers
+from .tasks import enqueue_job
+from .services import get_orders_by_status, get_top_users, get_top_suppliers, get_category_rollup, find_category
+from .result_cache import result_cache
+from .conditional import conditional_response
+from .sketches import sketch_user_counts, supplier_q
+from .exports import EXPORT_FORMAT_NDJSON, EXPORT_CONTENT_TYPES, stream_export
+from .cube import sales_cube, cube_filters
+from .query import QueryError, parse_query, run_query, query_plans
 
 
 
@@ -28,6 +59,49 @@ class StandardResultsSetPagination(PageNumberPagination):
     page_size_query_param = 'page_size'
     max_page_size = 100
 
+class KeysetPagination(StandardResultsSetPagination):
+    """
+    Forward-only cursor pagination on ``(date_id, id)``: each page seeks past
+    the last row of the previous one through the (date, id) index, so there is
+    no COUNT(*) and no OFFSET and walking every page stays linear. Cursors are
+    opaque base64 tokens of the last ``(date_id, id)`` served.
+    """
+    cursor_query_param = 'cursor'
+
+    def encode_cursor(self, row):
+        return base64.urlsafe_b64encode(f"{row.date_id}:{row.id}".encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            date_id, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+            return int(date_id), int(row_id)
+        except (ValueError, UnicodeDecodeError):
+            raise ValidationError("Invalid cursor.")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_size = self.get_page_size(request)
+        cursor = request.query_params.get(self.cursor_query_param)
+        queryset = queryset.order_by('date_id', 'id')
+        if cursor:
+            date_id, row_id = self.decode_cursor(cursor)
+            # The date_id >= bound keeps the seek an index range scan.
+            queryset = queryset.filter(date_id__gte=date_id).filter(Q(date_id__gt=date_id) | Q(id__gt=row_id))
+        # One extra row tells whether there is a next page.
+        rows = list(queryset[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        self.page = rows[:page_size]
+        self.request = request
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
 class SimpleAnalysisAPI(APIView):
     filter_backends = [DjangoFilterBackend]
     filterset_class = FactAnalyticsFilter
@@ -35,66 +109,181 @@ class SimpleAnalysisAPI(APIView):
 
     def get(self, request):
         try:
-            simple_analysis()
-            queryset = FactAnalytics.objects.select_related("date").all()
-            filter_backend = DjangoFilterBackend()
-            filtered_queryset = filter_backend.filter_queryset(request, queryset, self)
-            paginator = self.pagination_class()
-            page = paginator.paginate_queryset(filtered_queryset, request)
-            serializer = FactAnalyticsSerializer(page, many=True)
-            return paginator.get_paginated_response(serializer.data)
+            return conditional_response(request, "simple_analysis", lambda: self.get_data(request), use_cache=False)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    def get_data(self, request):
+        # FactAnalytics is maintained by the sync; reads never write.
+        queryset = FactAnalytics.objects.select_related("date").order_by("date__full_date")
+        filter_backend = DjangoFilterBackend()
+        filtered_queryset = filter_backend.filter_queryset(request, queryset, self)
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(filtered_queryset, request)
+        serializer = FactAnalyticsSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data).data
+
 class FactSalesListAPIView(APIView):
     def get(self, request):
         try:
-            fact_sales_qs = FactSales.objects.select_related('date', 'user').prefetch_related('variants')
+            return conditional_response(request, "fact_sales", lambda: self.get_data(request), use_cache=False)
+        except ValidationError as e:
+            return Response({"error": e.detail[0]}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def get_data(self, request):
+        lines_qs = (
+            FactSalesLine.objects
+            .select_related('date', 'user', 'variant', 'product_version')
+            .order_by('order_id', 'order_item_id')
+        )
+        # ?pagination=cursor (or any ?cursor=) opts into keyset paging.
+        if request.query_params.get("pagination") == "cursor" or "cursor" in request.query_params:
+            paginator = KeysetPagination()
+        else:
             paginator = StandardResultsSetPagination()
-            page = paginator.paginate_queryset(fact_sales_qs, request)
-            all_data = []
-            product_ids = set()
-            for fact in page:
-                product_ids.update(v.product_id for v in fact.variants.all())
-            products_map = {p.product_id: p for p in DimProductBase.objects.filter(product_id__in=product_ids)}
-            for fact in page:
-                for variant in fact.variants.all():
-                    variant.product = products_map.get(variant.product_id)
-                    all_data.append(FactSalesVariantSerializer(variant, context={'fact': fact}).data)
-            return paginator.get_paginated_response(all_data)
+        page = paginator.paginate_queryset(lines_qs, request)
+        serializer = FactSalesLineSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data).data
+
+class SalesExportAPI(APIView):
+    """
+    Streams every fact line matching the filters, denormalized with its date,
+    user, variant and product, as NDJSON (default) or CSV
+    (``?file_format=csv``). The body is gzip-compressed on the fly when the
+    client's ``Accept-Encoding`` accepts gzip.
+    """
+
+    @staticmethod
+    def accepts_gzip(accept_encoding):
+        # gzip is acceptable with a non-zero q-value, given explicitly or
+        # through "*"; "gzip;q=0" refuses it.
+        weights = {}
+        for entry in accept_encoding.split(","):
+            coding, *params = (part.strip() for part in entry.split(";"))
+            if not coding:
+                continue
+            weight = 1.0
+            for param in params:
+                name, _, value = param.partition("=")
+                if name.strip().lower() == "q":
+                    try:
+                        weight = float(value)
+                    except ValueError:
+                        weight = 0.0
+            weights[coding.lower()] = weight
+        return weights.get("gzip", weights.get("*", 0.0)) > 0
+
+    def get(self, request):
+        try:
+            export_format = request.query_params.get("file_format", EXPORT_FORMAT_NDJSON)
+            if export_format not in EXPORT_CONTENT_TYPES:
+                return Response(
+                    {"error": f"file_format must be one of: {', '.join(EXPORT_CONTENT_TYPES)}."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            filterset = SalesExportFilter(request.query_params, queryset=FactSalesLine.objects.all())
+            if not filterset.is_valid():
+                return Response({"error": filterset.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+            compress = self.accepts_gzip(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+            response = StreamingHttpResponse(
+                stream_export(filterset.qs, export_format, compress=compress),
+                content_type=EXPORT_CONTENT_TYPES[export_format]
+            )
+            response["Content-Disposition"] = f'attachment; filename="fact_sales.{export_format}"'
+            if compress:
+                response["Content-Encoding"] = "gzip"
+            patch_vary_headers(response, ("Accept-Encoding",))
+            return response
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 class SyncOrdersAnalyticsAPI(APIView):
     def post(self, request):
         try:
-            result = sync_orders_analytics()
-            return Response({"message": "Sync completed successfully.", "details": result}, status=status.HTTP_200_OK)
+            batch_size = request.data.get("batch_size")
+            workers = request.data.get("workers")
+            if workers and int(workers) > 1:
+                return Response(
+                    {"error": "The parallel sync only runs from the SyncOrdersAnalytics management command."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            job = enqueue_job("sync", {
+                "mode": request.data.get("mode"),
+                "batch_size": int(batch_size) if batch_size else None,
+            })
+            return Response({"message": "Sync job enqueued.", "job": SyncJobSerializer(job).data}, status=status.HTTP_202_ACCEPTED)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 class VerifyFactSalesTotalsAPI(APIView):
     def post(self, request):
         try:
-            result = verify_fact_sales_totals()
-            return Response({"message": "Verification completed.", "totals_match": result}, status=status.HTTP_200_OK)
+            job = enqueue_job("verify")
+            return Response({"message": "Verification job enqueued.", "job": SyncJobSerializer(job).data}, status=status.HTTP_202_ACCEPTED)
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class SimpleAnalysisRunAPI(APIView):
+    def post(self, request):
+        try:
+            job = enqueue_job("simple_analysis")
+            return Response({"message": "Simple analysis job enqueued.", "job": SyncJobSerializer(job).data}, status=status.HTTP_202_ACCEPTED)
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class SyncJobStatusAPI(APIView):
+    def get(self, request, job_id):
+        try:
+            job = SyncJob.objects.get(pk=job_id)
+        except SyncJob.DoesNotExist:
+            return Response({"error": "Job not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(SyncJobSerializer(job).data, status=status.HTTP_200_OK)
+
+class SyncRunListAPI(APIView):
+    pagination_class = StandardResultsSetPagination
+
+    def get(self, request):
+        try:
+            queryset = SyncRun.objects.all()
+            mode = request.query_params.get("mode")
+            if mode:
+                queryset = queryset.filter(mode=mode)
+            paginator = self.pagination_class()
+            page = paginator.paginate_queryset(queryset, request)
+            serializer = SyncRunSerializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+class ResultCacheStatsAPI(APIView):
+    def get(self, request):
+        return Response(
+            {**result_cache.stats(), "cube": sales_cube.stats(), "query_plans": query_plans.stats()},
+            status=status.HTTP_200_OK
+        )
+
 class OrdersByStatusAPI(APIView):
     filter_backends = [DjangoFilterBackend]
     filterset_class = OrdersByStatusFilter
 
     def get(self, request):
         try:
-            queryset = FactSales.objects.select_related('date', 'user')
-            filter_backend = DjangoFilterBackend()
-            filtered_queryset = filter_backend.filter_queryset(request, queryset, self)
-            data = list(get_orders_by_status(queryset=filtered_queryset))
-            return Response(data, status=status.HTTP_200_OK)
+            return conditional_response(request, "orders_by_status", lambda: self.get_data(request))
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    def get_data(self, request):
+        filters = cube_filters(self.filterset_class, request)
+        if filters is not None:
+            return sales_cube.orders_by_status(filters)
+        queryset = FactSales.objects.select_related('date', 'user')
+        filter_backend = DjangoFilterBackend()
+        filtered_queryset = filter_backend.filter_queryset(request, queryset, self)
+        return list(get_orders_by_status(queryset=filtered_queryset))
+
 class TopUsersAPI(APIView):
     filter_backends = [DjangoFilterBackend]
     filterset_class = TopUsersFilter
@@ -102,118 +291,230 @@ class TopUsersAPI(APIView):
 
     def get(self, request):
         try:
+            return conditional_response(request, "top_users", lambda: self.get_data(request))
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def get_data(self, request):
+        filters = cube_filters(self.filterset_class, request)
+        if filters is not None:
+            top_users = sales_cube.top_users(filters)
+        else:
             queryset = FactSales.objects.select_related('date', 'user')
             filter_backend = DjangoFilterBackend()
             filtered_queryset = filter_backend.filter_queryset(request, queryset, self)
-            raw_users = get_top_users(queryset=filtered_queryset)
-            data = []
-            for u in raw_users:
-                data.append({
-                    "user_id": u.get("user__user_id"),
-                    "username": u.get("user__username"),
-                    "gender": u.get("user__gender"),
-                    "city": u.get("user__city"),
-                    "registration_date": u.get("user__registration_date"),
-                    "age_range": u.get("user__age_range"),
-                    "total_orders": u.get("total_orders"),
-                    "total_spent": u.get("total_spent"),
-                })
-            paginator = self.pagination_class()
-            page = paginator.paginate_queryset(data, request)
-            serializer = TopUserSerializer(page, many=True)
-            return paginator.get_paginated_response(serializer.data)
-        except Exception as e:
-            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            top_users = get_top_users(queryset=filtered_queryset)
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(top_users, request)
+        data = []
+        for u in page:
+            data.append({
+                "rank": u.get("rank"),
+                "user_id": u.get("user__user_id"),
+                "username": u.get("user__username"),
+                "gender": u.get("user__gender"),
+                "city": u.get("user__city"),
+                "registration_date": u.get("user__registration_date"),
+                "age_range": u.get("user__age_range"),
+                "total_orders": u.get("total_orders"),
+                "total_spent": u.get("total_spent"),
+            })
+        serializer = TopUserSerializer(data, many=True)
+        return paginator.get_paginated_response(serializer.data).data
+
+def wants_exact_counts(request):
+    return request.query_params.get('exact', '').lower() in ('1', 'true', 'yes')
 
 class MostSoldProductsAPI(APIView):
+    """
+    Distinct user counts (``user_quantity`` and per-date ``users``) are merged
+    from the per-day HyperLogLog sketches (analytics.hll): standard error
+    ~1.6%, ~95% of counts within +-3.3%, tens of users within one or two.
+    ``?exact=true`` counts them with COUNT(DISTINCT) over the fact lines;
+    so does the in-process cube (analytics.cube) when it is enabled.
+    """
     filter_backends = [DjangoFilterBackend]
     filterset_class = MostSoldProductsFilter
     pagination_class = StandardResultsSetPagination
 
     def get(self, request):
         try:
-            queryset = FactSales.objects.prefetch_related('variants', 'date')
+            return conditional_response(request, "most_sold", lambda: self.get_data(request))
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def get_data(self, request):
+        filters = cube_filters(self.filterset_class, request)
+        if filters is not None:
+            exact = True
+            product_sales = sales_cube.product_sales(filters)
+        else:
+            queryset = FactSalesLine.objects.all()
             filter_backend = DjangoFilterBackend()
             filtered_queryset = filter_backend.filter_queryset(request, queryset, self)
-            variant_sales = (
-                DimVariantOrder.objects
-                .filter(factsales__in=filtered_queryset)
+            exact = wants_exact_counts(request)
+            distinct_users = {'users': Count('user', distinct=True)} if exact else {}
+            product_sales = (
+                filtered_queryset
                 .values('product_id')
                 .annotate(
                     total_quantity_sold=Sum('quantity'),
-                    total_sold_price=Sum(F('quantity') * F('unit_price')),
-                    user_quantity=Count('factsales__user', distinct=True)
+                    total_sold_price=Sum('total_price'),
+                    **distinct_users
                 )
-                .order_by('-total_quantity_sold')
+                .order_by('-total_quantity_sold', 'product_id')
             )
-            product_ids = [v['product_id'] for v in variant_sales if v['product_id'] is not None]
-            products_map = {p.product_id: p for p in DimProductBase.objects.filter(product_id__in=product_ids)}
+        # Only the current page's products are looked up and broken down per
+        # date, over the same filtered lines the totals came from.
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(product_sales, request)
+        product_ids = [v['product_id'] for v in page]
+        products_map = {p.product_id: p for p in DimProductBase.objects.filter(product_id__in=product_ids, is_current=True)}
+        if filters is not None:
+            per_date_agg = sales_cube.product_dates(filters, product_ids)
+        else:
             per_date_agg = (
-                FactSales.objects
-                .filter(variants__product_id__in=product_ids)
-                .values('variants__product_id', 'date__full_date')
+                filtered_queryset
+                .filter(product_id__in=product_ids)
+                .values('product_id', 'date__full_date')
                 .annotate(
-                    quantity=Sum('variants__quantity'),
-                    users=Count('user', distinct=True)
+                    quantity=Sum('quantity'),
+                    **distinct_users
                 )
                 .order_by('date__full_date')
             )
-            per_date_map = defaultdict(list)
-            for item in per_date_agg:
-                per_date_map[item['variants__product_id']].append({
-                    "date": item['date__full_date'],
-                    "quantity": item['quantity'],
-                    "users": item['users']
-                })
-            data = []
-            for idx, v in enumerate(variant_sales, start=1):
-                product = products_map.get(v['product_id'])
-                per_date_list = per_date_map.get(v['product_id'], [])
-                data.append({
-                    "rank": idx,
-                    "product_id": product.product_id if product else v['product_id'],
-                    "product_name": product.name if product else "Unknown",
-                    "brand": product.brand if product else None,
-                    "supplier": product.supplier if product else None,
-                    "category_level_1": product.category_level_1 if product else None,
-                    "category_level_2": product.category_level_2 if product else None,
-                    "category_level_3": product.category_level_3 if product else None,
-                    "rating": product.rating if product else None,
-                    "price": product.price if product else None,
-                    "expire_date": product.expire_date if product else None,
-                    "is_available": product.is_available if product else None,
-                    "is_exciting": product.is_exciting if product else None,
-                    "free_shipping": product.free_shipping if product else None,
-                    "has_gift": product.has_gift if product else None,
-                    "is_budget_friendly": product.is_budget_friendly if product else None,
-                    "total_quantity_sold": v['total_quantity_sold'],
-                    "total_sold_price": v['total_sold_price'],
-                    "user_quantity": v['user_quantity'],
-                    "per_date": per_date_list,
-                })
-            paginator = self.pagination_class()
-            page = paginator.paginate_queryset(data, request)
-            serializer = MostSoldProductSerializer(page, many=True)
-            return paginator.get_paginated_response(serializer.data)
-        except Exception as e:
-            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        if not exact:
+            # The same filters (all on date / product) select the sketches.
+            sketches = self.filterset_class(
+                request.query_params, queryset=DailyProductUserSketch.objects.filter(product_id__in=product_ids)
+            ).qs
+            product_users = sketch_user_counts(sketches, 'product_id')
+            date_users = sketch_user_counts(sketches, 'product_id', 'date__full_date')
+            for v in page:
+                v['users'] = product_users.get(v['product_id'], 0)
+        per_date_map = defaultdict(list)
+        for item in per_date_agg:
+            per_date_map[item['product_id']].append({
+                "date": item['date__full_date'],
+                "quantity": item['quantity'],
+                "users": item['users'] if exact else date_users.get((item['product_id'], item['date__full_date']), 0)
+            })
+        data = []
+        for idx, v in enumerate(page, start=paginator.page.start_index()):
+            product = products_map.get(v['product_id'])
+            per_date_list = per_date_map.get(v['product_id'], [])
+            data.append({
+                "rank": idx,
+                "product_id": product.product_id if product else v['product_id'],
+                "product_name": product.name if product else "Unknown",
+                "brand": product.brand if product else None,
+                "supplier": product.supplier if product else None,
+                "category_level_1": product.category_level_1 if product else None,
+                "category_level_2": product.category_level_2 if product else None,
+                "category_level_3": product.category_level_3 if product else None,
+                "rating": product.rating if product else None,
+                "price": product.price if product else None,
+                "expire_date": product.expire_date if product else None,
+                "is_available": product.is_available if product else None,
+                "is_exciting": product.is_exciting if product else None,
+                "free_shipping": product.free_shipping if product else None,
+                "has_gift": product.has_gift if product else None,
+                "is_budget_friendly": product.is_budget_friendly if product else None,
+                "total_quantity_sold": v['total_quantity_sold'],
+                "total_sold_price": v['total_sold_price'],
+                "user_quantity": v['users'],
+                "per_date": per_date_list,
+            })
+        serializer = MostSoldProductSerializer(data, many=True)
+        return paginator.get_paginated_response(serializer.data).data
 
 class TopSuppliersAPI(APIView):
+    # ``user_quantity`` comes from the per-day supplier sketches unless
+    # ``?exact=true`` (same error bounds as MostSoldProductsAPI).
     filter_backends = [DjangoFilterBackend]
     filterset_class = TopSuppliersFilter
     pagination_class = StandardResultsSetPagination  # Use your custom pagination
 
     def get(self, request):
         try:
-            queryset = FactSales.objects.prefetch_related('variants', 'date', 'user')
+            return conditional_response(request, "top_suppliers", lambda: self.get_data(request))
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def get_data(self, request):
+        filters = cube_filters(self.filterset_class, request)
+        if filters is not None:
+            exact = True
+            supplier_data = sales_cube.top_suppliers(filters)
+        else:
+            queryset = FactSalesLine.objects.all()
             filtered_queryset = DjangoFilterBackend().filter_queryset(request, queryset, self)
+            exact = wants_exact_counts(request)
+            supplier_data = get_top_suppliers(queryset=filtered_queryset, distinct_users=exact)
 
-            supplier_data = get_top_suppliers(queryset=filtered_queryset)
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(supplier_data, request, view=self)  # pages are sliced in SQL
+        if not exact:
+            sketches = SupplierUserSketchFilter(
+                request.query_params,
+                queryset=DailySupplierUserSketch.objects.filter(supplier_q(v['supplier'] for v in page))
+            ).qs
+            supplier_users = sketch_user_counts(sketches, 'supplier')
+            for v in page:
+                v['user_quantity'] = supplier_users.get(v['supplier'], 0)
+        serializer = TopSupplierSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data).data
 
-            paginator = self.pagination_class()
-            page = paginator.paginate_queryset(supplier_data, request, view=self)  # pass view=self
-            serializer = TopSupplierSerializer(page, many=True)
-            return paginator.get_paginated_response(serializer.data)
+class SalesQueryAPI(APIView):
+    """
+    Slice-and-dice over the sales lines: any combination of dimensions,
+    measures and dimension filters, ordered and paged, answered by one SQL
+    statement (see ``analytics.query.parse_query`` for the parameters).
+    """
+
+    def get(self, request):
+        try:
+            query = parse_query(request.query_params)
+            return conditional_response(request, "query", lambda: run_query(query))
+        except QueryError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class CategoryRollupAPI(APIView):
+    """
+    Sales rolled up the category tree: every leaf, child and root category
+    plus the grand total, from one GROUP BY ROLLUP query. ``?category=<name>``
+    drills down to that category's subtree, cut from the cached tree of the
+    same filters instead of querying again.
+    """
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = CategoryRollupFilter
 
+    def get(self, request):
+        try:
+            return conditional_response(request, "category_rollup", lambda: self.get_data(request))
+        except ValidationError as e:
+            return Response({"error": e.detail}, status=status.HTTP_400_BAD_REQUEST)
+        except NotFound as e:
+            return Response({"error": e.detail}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def get_data(self, request):
+        tree, _ = result_cache.get_or_compute(
+            "category_rollup_tree", request, lambda: self.get_tree(request), ignore=("category",)
+        )
+        category = request.query_params.get("category")
+        if not category:
+            return tree
+        node = find_category(tree, category)
+        if node is None:
+            raise NotFound(f"No sales in category '{category}'.")
+        return node
+
+    def get_tree(self, request):
+        queryset = FactSalesLine.objects.all()
+        filtered_queryset = DjangoFilterBackend().filter_queryset(request, queryset, self)
+        return get_category_rollup(queryset=filtered_queryset)
+
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0014_orderitemvariantinvoicequantity'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['updated_at', 'id'], name='order_updated_at_id_idx'),
+        ),
+    ]
@@ -1,5 +1,4 @@
-import jdatetime
-
+from django.conf import settings
 from django.db import models
 from django.db.models import Sum
 from django.core.exceptions import ValidationError
@@ -7,7 +6,8 @@ from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 
 from products.models import Variant, VariantInvoiceQuantity
-from analytics.models import DimVariantOrder, DimDate, FactSales
+from analytics.models import FactSales, FactSalesLine
+from analytics.dim_dates import get_date_id
 from .constants import ORDER_STATUS_CHOICES
 
 
@@ -31,6 +31,9 @@ class Order(models.Model):
         ordering = ["-created_at"]
         verbose_name = "Order"
         verbose_name_plural = "Orders"
+        indexes = [
+            models.Index(fields=["updated_at", "id"], name="order_updated_at_id_idx"),
+        ]
 
     def clean(self):
         old_status = None
@@ -79,7 +82,7 @@ class Order(models.Model):
                     )
                     remaining_qty -= deducted
 
-        if getattr(self, "skip_analytics", False):
+        if getattr(self, "skip_analytics", False) or not settings.ANALYTICS_INLINE_ORDER_SYNC:
             return
 
         try:
@@ -89,41 +92,10 @@ class Order(models.Model):
 
         if fact_sale:
             fact_sale.status = self.status
-            if fact_sale.date is None:
-                try:
-                    dim_date = DimDate.objects.get(full_date=self.created_at.date())
-                except DimDate.DoesNotExist:
-                    j = jdatetime.date.fromgregorian(date=self.created_at.date())
-                    dim_date = DimDate.objects.create(
-                        full_date=self.created_at.date(),
-                        jalali_date=f"{j.year}-{j.month:02d}-{j.day:02d}",
-                        day_of_week=j.strftime("%A"),
-                        month_name=j.strftime("%B"),
-                        quarter=(1 if j.month <= 3 else 2 if j.month <= 6 else 3 if j.month <= 9 else 4),
-                        is_holiday=(j.weekday() == 6)
-                    )
-                fact_sale.date = dim_date
-
-            fact_sale.variants.clear()
-            for item in self.items.select_related("variant").all():
-                if not item.variant:
-                    continue
-                dim_variant, created = DimVariantOrder.objects.get_or_create(
-                    variant_id=item.variant.id,
-                    defaults={
-                        "variant_sku": item.variant.sku,
-                        "product_id": item.variant.product.id,
-                        "color": item.variant.color,
-                        "size": item.variant.size,
-                        "quantity": item.quantity,
-                        "unit_price": item.unit_price,
-                        "discount_percent": item.discount_percent,
-                        "total_price": item.total_price,
-                        "total_after_discount": item.total_after_discount,
-                    }
-                )
-                fact_sale.variants.add(dim_variant)
+            if fact_sale.date_id is None:
+                fact_sale.date_id = get_date_id(self.created_at.date())
             fact_sale.save()
+            FactSalesLine.objects.filter(order_id=self.pk).update(status=self.status)
         else:
             self.is_synced_analytics = False
 